@@ -1,5 +1,7 @@
+from django import forms
 from django.contrib import admin
-from django.http import HttpResponse
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import path
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -7,17 +9,85 @@ from django.utils.html import format_html
 import os
 import tempfile
 from datetime import datetime
-from .models import Warehouse, MaterialType, Supplier, Customer, Inventory, StockIn, StockOut, StockTransfer
+from .models import Warehouse, MaterialType, Supplier, Customer, Inventory, StockIn, StockOut, StockOutAllocation, StockTransfer
 from .excel_utils import (
     create_stock_in_template, create_stock_out_template, 
     import_stock_in_excel, import_stock_out_excel,
     export_inventory_to_excel, create_stock_transfer_template,
     import_stock_transfer_excel
 )
-from .utils import gregorian_to_persian_str, gregorian_to_persian_datetime_str
+from .allocation import InsufficientStockError, available_quantity, issuable_quantity
+from .admin_autocomplete import AutocompleteFilterMediaMixin, AutocompleteListFilter, NormalizedNameSearchMixin
+from .pagination import EstimatedCountPaginator
+from .utils import (
+    JALALI_MONTHS, filter_jalali_period, gregorian_to_persian_str, gregorian_to_persian_datetime_str,
+    jalali_years, persian_dates,
+)
+
+
+class JalaliPeriodListFilter(admin.ListFilter):
+    """
+    سلسله‌مراتب سال ← ماه شمسی روی ستون‌های ایندکس شده jalali_year و jalali_month
+    فهرست سال‌ها از کوچک‌ترین و بزرگ‌ترین سال (دو جستجوی ایندکس) ساخته می‌شود.
+    """
+    title = 'تاریخ شمسی'
+    year_parameter = 'jalali_year'
+    month_parameter = 'jalali_month'
+    
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        for name in self.expected_parameters():
+            if name in params:
+                self.used_parameters[name] = params.pop(name)[-1]
+        self.years = jalali_years(model._default_manager.all())
+    
+    def value(self, name):
+        try:
+            return int(self.used_parameters[name])
+        except (KeyError, ValueError):
+            return None
+    
+    def has_output(self):
+        return bool(self.years)
+    
+    def expected_parameters(self):
+        return [self.year_parameter, self.month_parameter]
+    
+    def queryset(self, request, queryset):
+        if not self.used_parameters:
+            return queryset
+        year, month = self.value(self.year_parameter), self.value(self.month_parameter)
+        if year is None or (self.month_parameter in self.used_parameters and not 1 <= (month or 0) <= 12):
+            raise IncorrectLookupParameters
+        return filter_jalali_period(queryset, year, month)
+    
+    def choices(self, changelist):
+        year, month = self.value(self.year_parameter), self.value(self.month_parameter)
+        yield {
+            'selected': year is None,
+            'query_string': changelist.get_query_string(remove=self.expected_parameters()),
+            'display': 'همه',
+        }
+        for option in self.years:
+            yield {
+                'selected': option == year and month is None,
+                'query_string': changelist.get_query_string({self.year_parameter: option}, [self.month_parameter]),
+                'display': str(option),
+            }
+            if option != year:
+                continue
+            for number, name in JALALI_MONTHS:
+                yield {
+                    'selected': number == month,
+                    'query_string': changelist.get_query_string(
+                        {self.year_parameter: option, self.month_parameter: number}
+                    ),
+                    'display': f'— {name} {option}',
+                }
+
 
 @admin.register(Warehouse)
-class WarehouseAdmin(admin.ModelAdmin):
+class WarehouseAdmin(NormalizedNameSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'code', 'manager', 'phone', 'is_active', 'persian_created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'code', 'manager', 'phone']
@@ -29,13 +99,13 @@ class WarehouseAdmin(admin.ModelAdmin):
     persian_created_at.short_description = 'تاریخ ایجاد (شمسی)'
 
 @admin.register(MaterialType)
-class MaterialTypeAdmin(admin.ModelAdmin):
+class MaterialTypeAdmin(NormalizedNameSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'unit', 'description']
     search_fields = ['name']
     list_filter = ['unit']
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(NormalizedNameSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'contact_person', 'phone', 'address', 'persian_created_at']
     search_fields = ['name', 'contact_person', 'phone']
     list_filter = ['created_at']
@@ -45,7 +115,7 @@ class SupplierAdmin(admin.ModelAdmin):
     persian_created_at.short_description = 'تاریخ ایجاد (شمسی)'
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(NormalizedNameSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'contact_person', 'phone', 'address', 'persian_created_at']
     search_fields = ['name', 'contact_person', 'phone']
     list_filter = ['created_at']
@@ -55,14 +125,34 @@ class CustomerAdmin(admin.ModelAdmin):
     persian_created_at.short_description = 'تاریخ ایجاد (شمسی)'
 
 @admin.register(Inventory)
-class InventoryAdmin(admin.ModelAdmin):
-    list_display = ['warehouse', 'material_type', 'supplier', 'current_quantity', 'unit_display', 'persian_last_updated']
-    list_filter = ['warehouse', 'material_type', 'supplier', 'last_updated']
+class InventoryAdmin(AutocompleteFilterMediaMixin, admin.ModelAdmin):
+    list_display = ['warehouse', 'material_type', 'supplier', 'on_hand_display', 'unit_display', 'on_hand_value_display', 'is_hot', 'persian_last_updated']
+    list_filter = [
+        ('warehouse', AutocompleteListFilter), ('material_type', AutocompleteListFilter),
+        ('supplier', AutocompleteListFilter), 'is_hot', 'last_updated',
+    ]
     search_fields = ['warehouse__name', 'material_type__name', 'supplier__name']
-    readonly_fields = ['last_updated']
-    actions = ['export_inventory_excel', 'filter_by_supplier']
+    list_select_related = ['warehouse', 'material_type', 'supplier']
+    # تعداد تخمینی در جدول‌های بزرگ و بدون COUNT(*) دوم برای کل جدول
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ['stock_value', 'last_updated']
+    actions = ['export_inventory_excel', 'filter_by_supplier', 'mark_hot', 'unmark_hot']
     ordering = ['warehouse__name', 'material_type__name', 'supplier__name']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_balance()
+    
+    def on_hand_display(self, obj):
+        return obj.on_hand
+    on_hand_display.short_description = 'موجودی فعلی'
+    on_hand_display.admin_order_field = 'on_hand'
+    
+    def on_hand_value_display(self, obj):
+        return obj.on_hand_value
+    on_hand_value_display.short_description = 'ارزش موجودی'
+    on_hand_value_display.admin_order_field = 'on_hand_value'
+    
     def persian_last_updated(self, obj):
         return gregorian_to_persian_datetime_str(obj.last_updated, "%Y/%m/%d %H:%M")
     persian_last_updated.short_description = 'آخرین بروزرسانی (شمسی)'
@@ -92,14 +182,34 @@ class InventoryAdmin(admin.ModelAdmin):
         return queryset
     
     filter_by_supplier.short_description = "فیلتر بر اساس هویت کالا"
+    
+    def mark_hot(self, request, queryset):
+        """ثبت‌های ردیف‌های انتخاب شده از این پس در خانه‌های شمارنده نوشته می‌شوند"""
+        updated = queryset.update(is_hot=True)
+        messages.success(request, f'{updated} ردیف موجودی پرتردد شد')
+    
+    mark_hot.short_description = "پرتردد کردن (شمارنده تفکیک شده)"
+    
+    def unmark_hot(self, request, queryset):
+        """بازگشت ردیف‌ها به ثبت مستقیم؛ خانه‌های باقی‌مانده با فشرده‌سازی بعدی جمع می‌شوند"""
+        updated = queryset.update(is_hot=False)
+        messages.success(request, f'{updated} ردیف موجودی از حالت پرتردد خارج شد')
+    
+    unmark_hot.short_description = "خارج کردن از حالت پرتردد"
 
 @admin.register(StockIn)
-class StockInAdmin(admin.ModelAdmin):
+class StockInAdmin(AutocompleteFilterMediaMixin, admin.ModelAdmin):
     list_display = ['warehouse', 'material_type', 'supplier', 'customer', 'quantity', 'unit_price', 'total_price', 'persian_manual_date', 'persian_created_at']
-    list_filter = ['warehouse', 'material_type', 'supplier', 'customer', 'created_at', 'manual_date']
+    list_filter = [
+        ('warehouse', AutocompleteListFilter), ('material_type', AutocompleteListFilter),
+        ('supplier', AutocompleteListFilter), ('customer', AutocompleteListFilter), JalaliPeriodListFilter,
+        'created_at', 'manual_date',
+    ]
     search_fields = ['warehouse__name', 'material_type__name', 'supplier__name', 'customer__name', 'invoice_number']
+    list_select_related = ['warehouse', 'material_type', 'supplier', 'customer']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ['total_price', 'created_at']
-    date_hierarchy = 'created_at'
     actions = ['export_stock_in_excel']
     
     def persian_manual_date(self, obj):
@@ -194,8 +304,10 @@ class StockInAdmin(admin.ModelAdmin):
                 cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
                 cell.alignment = Alignment(horizontal="center", vertical="center")
             
-            # داده‌ها
-            for row, stock_in in enumerate(queryset, 2):
+            # داده‌ها - تاریخ‌ها یک‌جا تبدیل می‌شوند (هر روز یک بار)
+            stock_ins = list(queryset)
+            manual_dates = persian_dates([stock_in.manual_date for stock_in in stock_ins])
+            for row, (stock_in, manual_date) in enumerate(zip(stock_ins, manual_dates), 2):
                 ws.cell(row=row, column=1, value=stock_in.warehouse.name if stock_in.warehouse else "")
                 ws.cell(row=row, column=2, value=stock_in.material_type.name if stock_in.material_type else "")
                 ws.cell(row=row, column=3, value=stock_in.supplier.name if stock_in.supplier else "")
@@ -204,7 +316,7 @@ class StockInAdmin(admin.ModelAdmin):
                 ws.cell(row=row, column=6, value=stock_in.unit_price or 0)
                 ws.cell(row=row, column=7, value=stock_in.total_price or 0)
                 ws.cell(row=row, column=8, value=stock_in.invoice_number or "")
-                ws.cell(row=row, column=9, value=gregorian_to_persian_str(stock_in.manual_date, "%Y/%m/%d") if stock_in.manual_date else "")
+                ws.cell(row=row, column=9, value=manual_date)
                 ws.cell(row=row, column=10, value=stock_in.notes or "")
             
             # ذخیره فایل
@@ -224,13 +336,93 @@ class StockInAdmin(admin.ModelAdmin):
     
     export_stock_in_excel.short_description = "صدور ورودی‌های انتخاب شده به Excel"
 
+class StockOutAllocationInline(admin.TabularInline):
+    """سطرهای تخصیص FIFO خروجی به لات‌ها (فقط خواندنی)"""
+    model = StockOutAllocation
+    fields = ['supplier', 'inventory', 'quantity', 'cost']
+    readonly_fields = ['supplier', 'inventory', 'quantity', 'cost']
+    extra = 0
+    can_delete = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'supplier', 'inventory__warehouse', 'inventory__material_type', 'inventory__supplier'
+        )
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        # فقط نمایشی: ادمین فرم‌های سطرها را هنگام ذخیره خروجی اعتبارسنجی نمی‌کند (بدون کوئری به ازای هر سطر)
+        return False
+
+class StockOutAdminForm(forms.ModelForm):
+    """فرم خروجی با بررسی موجودی پیش از ذخیره تا کمبود موجودی خطای فرم باشد نه خطای 500"""
+
+    class Meta:
+        model = StockOut
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        warehouse = cleaned_data.get('warehouse')
+        material_type = cleaned_data.get('material_type')
+        quantity = cleaned_data.get('quantity') or 0
+        if warehouse and material_type and quantity > 0:
+            available = issuable_quantity(warehouse, material_type, cleaned_data.get('supplier'), self.instance)
+            if quantity > available:
+                raise forms.ValidationError(str(InsufficientStockError(quantity, available)))
+        return cleaned_data
+
+
+class StockTransferAdminForm(forms.ModelForm):
+    """فرم انتقال با بررسی موجودی انبار مبدا پیش از ذخیره"""
+
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        source_warehouse = cleaned_data.get('source_warehouse')
+        material_type = cleaned_data.get('material_type')
+        quantity = cleaned_data.get('quantity') or 0
+        if source_warehouse and material_type and quantity > 0:
+            available = available_quantity(source_warehouse, material_type)
+            if quantity > available:
+                raise forms.ValidationError(str(InsufficientStockError(quantity, available)))
+        return cleaned_data
+
+
+class InsufficientStockAdminMixin:
+    """
+    اگر موجودی بین اعتبارسنجی فرم و ذخیره توسط ثبت هم‌زمان دیگری کم شود، تراکنش صفحه
+    برگشت می‌خورد و به جای خطای 500 پیام خطا روی همان صفحه نمایش داده می‌شود.
+    """
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except InsufficientStockError as e:
+            messages.error(request, str(e))
+            return HttpResponseRedirect(request.get_full_path())
+
+
 @admin.register(StockOut)
-class StockOutAdmin(admin.ModelAdmin):
-    list_display = ['warehouse', 'material_type', 'customer', 'supplier', 'quantity', 'unit_price', 'total_price', 'persian_manual_date', 'persian_created_at']
-    list_filter = ['warehouse', 'material_type', 'customer', 'supplier', 'created_at', 'manual_date']
+class StockOutAdmin(InsufficientStockAdminMixin, AutocompleteFilterMediaMixin, admin.ModelAdmin):
+    form = StockOutAdminForm
+    inlines = [StockOutAllocationInline]
+    list_display = ['warehouse', 'material_type', 'customer', 'supplier', 'quantity', 'unit_price', 'total_price', 'cost_of_goods', 'persian_manual_date', 'persian_created_at']
+    list_filter = [
+        ('warehouse', AutocompleteListFilter), ('material_type', AutocompleteListFilter),
+        ('customer', AutocompleteListFilter), ('supplier', AutocompleteListFilter), JalaliPeriodListFilter,
+        'created_at', 'manual_date',
+    ]
     search_fields = ['warehouse__name', 'material_type__name', 'customer__name', 'supplier__name', 'invoice_number']
-    readonly_fields = ['total_price', 'created_at']
-    date_hierarchy = 'created_at'
+    list_select_related = ['warehouse', 'material_type', 'customer', 'supplier']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ['total_price', 'cost_of_goods', 'created_at']
     actions = ['export_stock_out_excel']
     
     def persian_manual_date(self, obj):
@@ -325,8 +517,10 @@ class StockOutAdmin(admin.ModelAdmin):
                 cell.fill = PatternFill(start_color="C5504B", end_color="C5504B", fill_type="solid")
                 cell.alignment = Alignment(horizontal="center", vertical="center")
             
-            # داده‌ها
-            for row, stock_out in enumerate(queryset, 2):
+            # داده‌ها - تاریخ‌ها یک‌جا تبدیل می‌شوند (هر روز یک بار)
+            stock_outs = list(queryset)
+            manual_dates = persian_dates([stock_out.manual_date for stock_out in stock_outs])
+            for row, (stock_out, manual_date) in enumerate(zip(stock_outs, manual_dates), 2):
                 ws.cell(row=row, column=1, value=stock_out.warehouse.name if stock_out.warehouse else "")
                 ws.cell(row=row, column=2, value=stock_out.material_type.name if stock_out.material_type else "")
                 ws.cell(row=row, column=3, value=stock_out.customer.name if stock_out.customer else "")
@@ -335,7 +529,7 @@ class StockOutAdmin(admin.ModelAdmin):
                 ws.cell(row=row, column=6, value=stock_out.unit_price or 0)
                 ws.cell(row=row, column=7, value=stock_out.total_price or 0)
                 ws.cell(row=row, column=8, value=stock_out.invoice_number or "")
-                ws.cell(row=row, column=9, value=gregorian_to_persian_str(stock_out.manual_date, "%Y/%m/%d") if stock_out.manual_date else "")
+                ws.cell(row=row, column=9, value=manual_date)
                 ws.cell(row=row, column=10, value=stock_out.notes or "")
             
             # ذخیره فایل
@@ -356,12 +550,18 @@ class StockOutAdmin(admin.ModelAdmin):
     export_stock_out_excel.short_description = "صدور خروجی‌های انتخاب شده به Excel"
 
 @admin.register(StockTransfer)
-class StockTransferAdmin(admin.ModelAdmin):
+class StockTransferAdmin(InsufficientStockAdminMixin, AutocompleteFilterMediaMixin, admin.ModelAdmin):
+    form = StockTransferAdminForm
     list_display = ['source_warehouse', 'destination_warehouse', 'material_type', 'quantity', 'created_by', 'persian_created_at']
-    list_filter = ['source_warehouse', 'destination_warehouse', 'created_at', 'material_type']
+    list_filter = [
+        ('source_warehouse', AutocompleteListFilter), ('destination_warehouse', AutocompleteListFilter),
+        JalaliPeriodListFilter, 'created_at', ('material_type', AutocompleteListFilter),
+    ]
     search_fields = ['source_warehouse__name', 'destination_warehouse__name', 'material_type__name', 'notes']
+    list_select_related = ['source_warehouse', 'destination_warehouse', 'material_type', 'created_by']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ['created_by', 'created_at']
-    date_hierarchy = 'created_at'
     actions = ['export_stock_transfer_excel']
     
     def persian_created_at(self, obj):
@@ -457,14 +657,16 @@ class StockTransferAdmin(admin.ModelAdmin):
                 ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
             
             # اضافه کردن داده‌ها
-            for row, transfer in enumerate(queryset, 2):
+            transfers = list(queryset)
+            created_dates = persian_dates([transfer.created_at for transfer in transfers], "%Y/%m/%d %H:%M")
+            for row, (transfer, created_date) in enumerate(zip(transfers, created_dates), 2):
                 ws.cell(row=row, column=1, value=transfer.source_warehouse.name)
                 ws.cell(row=row, column=2, value=transfer.destination_warehouse.name)
                 ws.cell(row=row, column=3, value=transfer.material_type.name)
                 ws.cell(row=row, column=4, value=transfer.quantity or 0)
                 ws.cell(row=row, column=5, value=transfer.notes)
                 ws.cell(row=row, column=6, value=transfer.created_by.username)
-                ws.cell(row=row, column=7, value=gregorian_to_persian_datetime_str(transfer.created_at, "%Y/%m/%d %H:%M"))
+                ws.cell(row=row, column=7, value=created_date)
             
             # ذخیره فایل
             filename = f"انتقالات_انبار_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
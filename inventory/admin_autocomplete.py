@@ -0,0 +1,86 @@
+"""
+فیلترهای کلید خارجی ادمین با جستجوی خودکار
+
+فیلتر پیش‌فرض جنگو همه ردیف‌های جدول مرتبط (مثلاً ۳۰ هزار مشتری) را در ستون کناری
+صفحه فهرست چاپ می‌کند. AutocompleteListFilter فقط گزینه انتخاب شده را می‌خواند و
+گزینه‌ها را هنگام تایپ از نمای تکمیل خودکار ادمین (admin:autocomplete) با select2 می‌گیرد؛
+پارامتر فیلتر در آدرس همان پارامتر فیلتر پیش‌فرض (field__id__exact و field__isnull) است.
+
+نمای تکمیل خودکار برای ادمین‌های دارای NormalizedNameSearchMixin به جای icontains روی
+همه search_fields، بازه پیشوندی روی ایندکس (normalized_name، id) را جستجو می‌کند.
+"""
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from .autocomplete import filter_prefix
+from .search import normalize_text
+
+
+class AutocompleteListFilter(admin.RelatedFieldListFilter):
+    """فیلتر کلید خارجی با یک فیلد جستجوی خودکار به جای فهرست همه گزینه‌ها"""
+
+    template = 'admin/inventory/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        """فقط ردیف انتخاب شده (برای نمایش نام آن) خوانده می‌شود"""
+        if not self.lookup_val:
+            return []
+        try:
+            return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+        except (ValueError, ValidationError):
+            return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        """«همه»، فیلد جستجو و در صورت وجود گزینه «خالی»"""
+        choices = list(super().choices(changelist))
+        everything, empty = choices[0], choices[1 + len(self.lookup_choices):]
+        selected = self.lookup_choices[0] if self.lookup_choices else None
+        yield everything
+        yield {
+            'autocomplete': True,
+            'url': reverse('admin:autocomplete', current_app=self.admin_site.name),
+            'app_label': self.field.model._meta.app_label,
+            'model_name': self.field.model._meta.model_name,
+            'field_name': self.field.name,
+            'lookup_kwarg': self.lookup_kwarg,
+            'query_string': everything['query_string'],
+            'value': selected[0] if selected else '',
+            'display': selected[1] if selected else '',
+        }
+        yield from empty
+
+
+class AutocompleteFilterMediaMixin:
+    """اسکریپت‌های select2 ادمین برای صفحه‌های فهرست دارای AutocompleteListFilter"""
+
+    @property
+    def media(self):
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(js=['admin/js/autocomplete_filter.js'])
+        )
+
+
+class NormalizedNameSearchMixin:
+    """
+    جستجوی نمای تکمیل خودکار ادمین با پیشوند normalized_name به ترتیب (normalized_name، id)
+    جستجوی صفحه فهرست همان search_fields باقی می‌ماند.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        match = request.resolver_match
+        if match is None or match.url_name != 'autocomplete':
+            return super().get_search_results(request, queryset, search_term)
+        queryset = filter_prefix(queryset, normalize_text(search_term))
+        return queryset.order_by('normalized_name', 'pk'), False
@@ -0,0 +1,163 @@
+"""
+گزارش سن موجودی هر لات (انبار، کالا، هویت کالا)
+
+موجودی هر لات بر اساس سن ورود به چند بازه (۰ تا ۳۰، ۳۱ تا ۹۰، ۹۱ تا ۱۸۰ و بیش از ۱۸۰ روز)
+تقسیم می‌شود. دفتر لات‌ها (ورودی‌ها، سطرهای تخصیص خروجی‌ها و خروجی‌های قدیمی بدون تخصیص)
+با یک کوئری UNION به ترتیب (انبار، کالا، Supplier، روز) و به صورت جریانی خوانده می‌شود و
+برداشت‌ها به روش FIFO از قدیمی‌ترین ورودی‌های باز همان لات کم می‌شوند؛ در حافظه فقط ورودی‌های
+باز لات جاری نگه داشته می‌شود، نه کل تاریخچه.
+
+انتقال بین انبارها سطر تخصیص ندارد، پس در پایان هر لات ورودی‌های باز با موجودی واقعی لات
+تطبیق داده می‌شوند: مازاد از قدیمی‌ترین ورودی‌ها کم می‌شود (همان ترتیب FIFO برداشت) و کمبود
+(موجودی آمده با انتقال یا بدون ورودی ثبت شده) در ستون «بدون سابقه ورود» می‌آید.
+"""
+from collections import deque
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Inventory, MaterialType, StockIn, StockOut, StockOutAllocation, Supplier, Warehouse
+from .rollup import day_expression
+from .utils import business_timezone
+
+# (حداکثر سن بر حسب روز، عنوان) هر بازه؛ بازه آخر بدون سقف
+AGING_BUCKETS = (
+    (30, '۰ تا ۳۰ روز'),
+    (90, '۳۱ تا ۹۰ روز'),
+    (180, '۹۱ تا ۱۸۰ روز'),
+    (None, 'بیش از ۱۸۰ روز'),
+)
+
+# ستون‌های هر سطر دفتر لات‌ها
+LEDGER_FIELDS = ('lot_warehouse', 'lot_material', 'lot_supplier', 'lot_day', 'lot_quantity')
+
+# تعداد سطرهای دفتر در هر بار خواندن از cursor
+LEDGER_CHUNK_SIZE = 2000
+
+
+def ledger_entries(warehouse_id=None, material_type_id=None):
+    """
+    دفتر لات‌ها به ترتیب (انبار، کالا، Supplier، روز)؛ هر سطر (انبار، کالا، Supplier، روز، مقدار)
+    ورودی‌ها مثبت و برداشت‌ها منفی‌اند و در یک روز ورودی پیش از برداشت می‌آید.
+    """
+    receipts = StockIn.objects.filter(warehouse__isnull=False).annotate(
+        lot_warehouse=F('warehouse_id'), lot_material=F('material_type_id'), lot_supplier=F('supplier_id'),
+        lot_day=day_expression(), lot_quantity=Coalesce('quantity', 0),
+    )
+    issues = StockOutAllocation.objects.filter(inventory__warehouse__isnull=False).annotate(
+        lot_warehouse=F('inventory__warehouse_id'), lot_material=F('inventory__material_type_id'),
+        lot_supplier=F('inventory__supplier_id'), lot_day=day_expression('stock_out__'), lot_quantity=-F('quantity'),
+    )
+    legacy = StockOut.objects.filter(warehouse__isnull=False, allocations__isnull=True).annotate(
+        lot_warehouse=F('warehouse_id'), lot_material=F('material_type_id'), lot_supplier=F('supplier_id'),
+        lot_day=day_expression(), lot_quantity=-Coalesce('quantity', 0),
+    )
+    parts = []
+    for movements in (receipts, issues, legacy):
+        if warehouse_id:
+            movements = movements.filter(lot_warehouse=warehouse_id)
+        if material_type_id:
+            movements = movements.filter(lot_material=material_type_id)
+        parts.append(movements.order_by().values_list(*LEDGER_FIELDS))
+    return parts[0].union(*parts[1:], all=True).order_by(
+        'lot_warehouse', 'lot_material', 'lot_supplier', 'lot_day', '-lot_quantity',
+    )
+
+
+def lot_balances(warehouse_id=None, material_type_id=None):
+    """{(انبار، کالا، Supplier): موجودی} لات‌های دارای موجودی"""
+    lots = Inventory.objects.filter(warehouse__isnull=False)
+    if warehouse_id:
+        lots = lots.filter(warehouse_id=warehouse_id)
+    if material_type_id:
+        lots = lots.filter(material_type_id=material_type_id)
+    balances = {}
+    for *key, on_hand in lots.with_balance().filter(on_hand__gt=0).values_list(
+            'warehouse_id', 'material_type_id', 'supplier_id', 'on_hand'):
+        balances[tuple(key)] = balances.get(tuple(key), 0) + on_hand
+    return balances
+
+
+def age_bucket(age):
+    """شماره بازه سن (روز)"""
+    for index, (limit, _) in enumerate(AGING_BUCKETS):
+        if limit is None or age <= limit:
+            return index
+
+
+def consume(layers, quantity):
+    """کم کردن مقدار از قدیمی‌ترین ورودی‌های باز (FIFO)؛ برداشت بیش از ورودی‌ها نادیده گرفته می‌شود"""
+    while quantity > 0 and layers:
+        taken = min(quantity, layers[0][1])
+        layers[0][1] -= taken
+        quantity -= taken
+        if not layers[0][1]:
+            layers.popleft()
+
+
+def lot_aging(layers, on_hand, as_of):
+    """تقسیم موجودی یک لات بین بازه‌های سن پس از تطبیق ورودی‌های باز با موجودی واقعی"""
+    recorded = sum(quantity for _, quantity in layers)
+    consume(layers, recorded - on_hand)
+    buckets = [0] * len(AGING_BUCKETS)
+    for day, quantity in layers:
+        buckets[age_bucket((as_of - day).days)] += quantity
+    return {
+        'on_hand': on_hand,
+        'buckets': buckets,
+        'unknown': max(on_hand - recorded, 0),
+        'oldest_day': layers[0][0] if layers else None,
+    }
+
+
+def stock_aging(as_of=None, warehouse_id=None, material_type_id=None):
+    """
+    سن موجودی لات‌ها در روز as_of (پیش‌فرض امروز در منطقه زمانی کسب‌وکار)، اختیاری برای یک انبار یا یک کالا
+    خروجی: [{'warehouse', 'material', 'unit', 'supplier', 'on_hand', 'buckets', 'unknown', 'oldest_day'}]
+    """
+    as_of = as_of or timezone.localdate(timezone=business_timezone())
+    balances = lot_balances(warehouse_id, material_type_id)
+    lots = {}
+
+    def close(key, layers):
+        on_hand = balances.pop(key, 0)
+        if on_hand > 0:
+            lots[key] = lot_aging(layers, on_hand, as_of)
+
+    current, layers = None, deque()
+    for warehouse, material, supplier, day, quantity in ledger_entries(warehouse_id, material_type_id).iterator(
+            chunk_size=LEDGER_CHUNK_SIZE):
+        key = (warehouse, material, supplier)
+        if key != current:
+            if current is not None:
+                close(current, layers)
+            current, layers = key, deque()
+        if quantity > 0:
+            layers.append([day, quantity])
+        else:
+            consume(layers, -quantity)
+    if current is not None:
+        close(current, layers)
+    # لات‌های دارای موجودی بدون هیچ ورودی یا برداشت ثبت شده (فقط انتقال)
+    for key in list(balances):
+        close(key, deque())
+
+    warehouses = dict(Warehouse.objects.filter(pk__in={key[0] for key in lots}).values_list('pk', 'name'))
+    materials = {
+        pk: (name, unit)
+        for pk, name, unit in MaterialType.objects.filter(pk__in={key[1] for key in lots}).values_list('pk', 'name', 'unit')
+    }
+    suppliers = dict(Supplier.objects.filter(pk__in={key[2] for key in lots} - {None}).values_list('pk', 'name'))
+    report = [
+        {
+            'warehouse': warehouses.get(key[0], ''),
+            'material': materials[key[1]][0],
+            'unit': materials[key[1]][1],
+            'supplier': suppliers.get(key[2], 'بدون هویت'),
+            **aging,
+        }
+        for key, aging in lots.items()
+    ]
+    report.sort(key=lambda row: (row['warehouse'], row['material'], row['supplier']))
+    return report
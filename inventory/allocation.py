@@ -0,0 +1,131 @@
+"""
+تخصیص خروجی انبار به لات‌های هویت کالا (Supplier) به روش FIFO
+
+هر ردیف Inventory برای یک (انبار، نام کالا، هویت کالا) یک لات است. ردیف لات
+هنگام اولین ورود همان Supplier ساخته می‌شود، پس ترتیب id همان ترتیب قدیمی‌ترین
+ورود است. کل تخصیص با یک کوئری خواندن لات‌ها، یک UPDATE و یک INSERT انجام می‌شود.
+"""
+from collections import namedtuple
+
+from django.db.models import Sum
+
+from .models import Inventory, StockOutAllocation
+
+
+AllocationLine = namedtuple('AllocationLine', ['inventory_id', 'supplier_id', 'quantity', 'cost'])
+
+
+class InsufficientStockError(Exception):
+    """موجودی کافی برای خروجی وجود ندارد"""
+
+    def __init__(self, requested, available):
+        self.requested = requested
+        self.available = available
+        super().__init__(f"موجودی ناکافی (موجودی: {available}, درخواستی: {requested})")
+
+
+def plan_fifo_allocation(lots, quantity):
+    """
+    تقسیم مقدار خروجی بین لات‌ها به ترتیب FIFO
+    lots: دنباله‌ای از (inventory_id, supplier_id, available) به ترتیب قدیمی‌ترین ورود
+    خروجی: لیست AllocationLine بدون بهای تمام‌شده
+    """
+    plan = []
+    remaining = quantity
+    available_total = 0
+    for inventory_id, supplier_id, available in lots:
+        available = available or 0
+        available_total += available
+        if remaining <= 0 or available <= 0:
+            continue
+        take = min(available, remaining)
+        plan.append(AllocationLine(inventory_id, supplier_id, take, 0))
+        remaining -= take
+
+    if remaining > 0:
+        raise InsufficientStockError(quantity, available_total)
+    return plan
+
+
+def candidate_lots(warehouse_id, material_type_id, supplier_id=None, for_update=False):
+    """
+    لات‌های دارای موجودی یک کالا در انبار به ترتیب قدیمی‌ترین ورود، با on_hand و on_hand_value
+    for_update: لات‌ها ابتدا در یک کوئری جداگانه قفل می‌شوند و موجودی پس از قفل خوانده
+    می‌شود تا تغییرات خانه‌های شمارنده ثبت‌های هم‌زمانِ تمام شده هم دیده شوند.
+    """
+    lots = Inventory.objects.filter(warehouse_id=warehouse_id, material_type_id=material_type_id)
+    if supplier_id:
+        lots = lots.filter(supplier_id=supplier_id)
+    if for_update:
+        list(lots.select_for_update().values_list('id', flat=True))
+    return lots.with_balance().filter(on_hand__gt=0).order_by('id')
+
+
+def available_quantity(warehouse, material_type, supplier=None):
+    """جمع موجودی قابل خروج یک کالا در انبار (همه لات‌ها یا لات یک Supplier)"""
+    lots = Inventory.objects.filter(warehouse=warehouse, material_type=material_type)
+    if supplier:
+        lots = lots.filter(supplier=supplier)
+    return lots.with_balance().filter(on_hand__gt=0).aggregate(total=Sum('on_hand'))['total'] or 0
+
+
+def issuable_quantity(warehouse, material_type, supplier=None, stock_out=None):
+    """
+    مقدار قابل خروج برای ذخیره یک خروجی؛ در ویرایش، مقداری که خود خروجی از لات‌های
+    همان (انبار، کالا، Supplier) برداشته و پیش از تخصیص دوباره برمی‌گردد هم حساب می‌شود.
+    """
+    available = available_quantity(warehouse, material_type, supplier)
+    if stock_out is None or stock_out.pk is None:
+        return available
+
+    allocations = StockOutAllocation.objects.filter(
+        stock_out_id=stock_out.pk, inventory__warehouse=warehouse, inventory__material_type=material_type,
+    )
+    if supplier:
+        allocations = allocations.filter(inventory__supplier=supplier)
+    if allocations.exists():
+        return available + (allocations.aggregate(total=Sum('quantity'))['total'] or 0)
+
+    # خروجی قدیمی بدون سطر تخصیص به لات (انبار، کالا، Supplier) خودش برمی‌گردد
+    previous = type(stock_out).objects.filter(pk=stock_out.pk).values(
+        'warehouse_id', 'material_type_id', 'supplier_id', 'quantity',
+    ).first()
+    if (
+        previous and previous['warehouse_id'] == getattr(warehouse, 'pk', warehouse)
+        and previous['material_type_id'] == getattr(material_type, 'pk', material_type)
+        and (not supplier or previous['supplier_id'] == getattr(supplier, 'pk', supplier))
+        and not StockOutAllocation.objects.filter(stock_out_id=stock_out.pk).exists()
+    ):
+        return available + (previous['quantity'] or 0)
+    return available
+
+
+def stock_availability(material_type_ids, warehouse_id=None, supplier_id=None):
+    """
+    موجودی چند کالا به تفکیک انبار و هویت کالا با یک کوئری روی لات‌ها
+    خروجی: {material_type_id: {'total', 'warehouses': [...], 'suppliers': [...]}}؛
+    کالای بدون موجودی با total صفر و فهرست‌های خالی برگردانده می‌شود.
+    """
+    result = {
+        material_id: {'total': 0, 'warehouses': {}, 'suppliers': {}}
+        for material_id in material_type_ids
+    }
+    lots = Inventory.objects.filter(material_type_id__in=result.keys())
+    if warehouse_id:
+        lots = lots.filter(warehouse_id=warehouse_id)
+    if supplier_id:
+        lots = lots.filter(supplier_id=supplier_id)
+    rows = lots.with_balance().filter(on_hand__gt=0).values_list(
+        'material_type_id', 'warehouse_id', 'warehouse__name', 'supplier_id', 'supplier__name', 'on_hand'
+    )
+    for material_id, warehouse, warehouse_name, supplier, supplier_name, quantity in rows:
+        entry = result[material_id]
+        entry['total'] += quantity
+        for group, pk, name in (('warehouses', warehouse, warehouse_name), ('suppliers', supplier, supplier_name)):
+            line = entry[group].setdefault(pk, {'id': pk, 'name': name, 'quantity': 0})
+            line['quantity'] += quantity
+
+    for entry in result.values():
+        entry['warehouses'] = list(entry['warehouses'].values())
+        entry['suppliers'] = list(entry['suppliers'].values())
+    return result
@@ -0,0 +1,99 @@
+"""
+تکمیل خودکار اطلاعات پایه (نام کالا، هویت کالا، مشتری، انبار)
+
+جستجو پیشوندی روی normalized_name به صورت بازه (>= پیشوند و < پیشوند + بزرگ‌ترین نویسه)
+است تا ایندکس (normalized_name، id) استفاده شود؛ صفحه بعد با توکن امضا شده از آخرین
+ردیف ادامه می‌دهد.
+
+هر جدول یک نسخه (شماره نسل در caching) دارد که با ذخیره یا حذف هر ردیف عوض می‌شود؛
+ETag پاسخ از همین نسخه و پارامترهای درخواست ساخته می‌شود، پس تا تغییر جدول، مرورگر
+و پراکسی با If-None-Match پاسخ 304 می‌گیرند.
+"""
+import hashlib
+
+from django.core import signing
+from django.db.models import Q
+
+from .caching import generation
+from .models import Customer, MaterialType, Supplier, Warehouse
+from .search import normalize_text
+
+TOKEN_SALT = 'inventory.autocomplete'
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# بزرگ‌ترین نویسه یونیکد؛ هر رشته‌ای که با پیشوند شروع شود از پیشوند + این نویسه کوچک‌تر است
+PREFIX_END = '\U0010ffff'
+
+# نام پاسخ ← (مدل، فیلدهای خروجی، شرط ثابت)
+SOURCES = {
+    'materials': (MaterialType, ('id', 'name'), Q()),
+    'suppliers': (Supplier, ('id', 'name'), Q()),
+    'customers': (Customer, ('id', 'name'), Q()),
+    'warehouses': (Warehouse, ('id', 'name', 'code'), Q(is_active=True)),
+}
+
+
+def table_namespace(model):
+    """فضای نام نسخه جدول در caching"""
+    return f'table:{model._meta.model_name}'
+
+
+def table_version(model):
+    return generation(table_namespace(model))
+
+
+def request_params(request):
+    """خروجی: (پیشوند نرمال شده، تعداد، توکن)"""
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    limit = min(max(limit, 1), MAX_LIMIT)
+    return normalize_text(request.GET.get('q', '')), limit, request.GET.get('cursor') or ''
+
+
+def etag(source, request):
+    """ETag پاسخ: نسخه جدول و پارامترهای درخواست"""
+    model = SOURCES[source][0]
+    prefix, limit, cursor = request_params(request)
+    params = hashlib.sha1(f'{prefix}\x00{limit}\x00{cursor}'.encode()).hexdigest()[:16]
+    return f'{source}-{table_version(model)}-{params}'
+
+
+def filter_prefix(queryset, prefix):
+    """ردیف‌هایی که normalized_name آن‌ها با پیشوند (نرمال شده) شروع می‌شود؛ بازه روی ایندکس"""
+    if not prefix:
+        return queryset
+    return queryset.filter(normalized_name__gte=prefix, normalized_name__lt=prefix + PREFIX_END)
+
+
+def decode_cursor(token):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+        return str(data['n']), int(data['i'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def lookup(source, prefix='', limit=DEFAULT_LIMIT, cursor=''):
+    """
+    یک صفحه از ردیف‌های منطبق به ترتیب نام نرمال شده
+    خروجی: (فهرست دیکشنری‌ها، توکن صفحه بعد یا None)
+    """
+    model, fields, condition = SOURCES[source]
+    rows = filter_prefix(model.objects.filter(condition), prefix)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        name, pk = position
+        rows = rows.filter(normalized_name__gte=name).filter(Q(normalized_name__gt=name) | Q(pk__gt=pk))
+
+    page = list(rows.order_by('normalized_name', 'pk').values('normalized_name', *fields)[:limit + 1])
+    next_token = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_token = signing.dumps({'n': page[-1]['normalized_name'], 'i': page[-1]['id']}, salt=TOKEN_SALT)
+    for row in page:
+        del row['normalized_name']
+    return page, next_token
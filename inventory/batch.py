@@ -0,0 +1,335 @@
+"""
+ثبت دسته‌ای حرکات انبار
+
+یک دسته از ورودی، خروجی و انتقال (مثلاً قبض‌های باسکول) ابتدا در حافظه و روی یک
+تصویر از موجودی لات‌ها اعتبارسنجی و شبیه‌سازی می‌شود و سپس در یک تراکنش با
+bulk_create و UPDATE تجمیعی ثبت می‌شود؛ یا همه حرکات ثبت می‌شوند یا هیچ‌کدام.
+تعداد کوئری‌ها به اندازه دسته بستگی ندارد.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, When
+
+from .allocation import InsufficientStockError, plan_fifo_allocation
+from .caching import AVAILABILITY, DASHBOARD, LEDGER, invalidate
+from .models import (
+    CostLayer, Customer, Inventory, MaterialType, StockIn, StockOut,
+    StockOutAllocation, StockTransfer, Supplier, Warehouse
+)
+from .posting import add_delta, apply_inventory_deltas
+from .rollup import apply_rollup_deltas, record_stock_in, record_stock_out
+from .changefeed import record_changes
+from .search import index_objects
+from .utils import parse_persian_date
+from .valuation import FIFO, LayerState, LotState, valuation_method
+
+
+MOVEMENT_TYPES = ('in', 'out', 'transfer')
+
+
+class BatchValidationError(Exception):
+    """خطاهای اعتبارسنجی دسته؛ errors لیست {'index', 'message'} است"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} حرکت نامعتبر")
+
+
+class _Lot:
+    """لات در حین شبیه‌سازی دسته؛ inventory_id برای لات‌های جدید None است"""
+    __slots__ = ('inventory_id', 'supplier_id', 'state', 'initial')
+
+    def __init__(self, inventory_id, supplier_id, state):
+        self.inventory_id = inventory_id
+        self.supplier_id = supplier_id
+        self.state = state
+        self.initial = (state.quantity, state.value)
+
+
+def _parse_int(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def parse_movement(raw):
+    """تبدیل یک حرکت JSON به دیکشنری تمیز؛ در صورت خطا ValueError با پیام فارسی"""
+    if not isinstance(raw, dict):
+        raise ValueError("حرکت باید یک شیء JSON باشد")
+
+    kind = raw.get('type')
+    if kind not in MOVEMENT_TYPES:
+        raise ValueError("نوع حرکت باید یکی از in، out یا transfer باشد")
+
+    movement = {'type': kind}
+    for field in ('warehouse', 'material_type', 'supplier', 'customer', 'quantity', 'unit_price',
+                  'source_warehouse', 'destination_warehouse'):
+        try:
+            movement[field] = _parse_int(raw.get(field))
+        except (TypeError, ValueError):
+            raise ValueError(f"مقدار '{field}' باید عدد صحیح باشد")
+
+    if not movement['material_type']:
+        raise ValueError("نام کالا (material_type) الزامی است")
+    if not movement['quantity'] or movement['quantity'] <= 0:
+        raise ValueError("مقدار باید عدد مثبت باشد")
+    if movement['unit_price'] is not None and movement['unit_price'] < 0:
+        raise ValueError("قیمت واحد نمی‌تواند منفی باشد")
+
+    if kind == 'in' and not (movement['warehouse'] and movement['supplier']):
+        raise ValueError("برای ورودی، انبار و هویت کالا الزامی است")
+    if kind == 'out' and not (movement['warehouse'] and movement['customer']):
+        raise ValueError("برای خروجی، انبار و مشتری الزامی است")
+    if kind == 'transfer' and not (movement['source_warehouse'] or movement['destination_warehouse']):
+        raise ValueError("برای انتقال، انبار مبدا یا مقصد الزامی است")
+
+    movement['invoice_number'] = str(raw.get('invoice_number') or '')[:50]
+    movement['notes'] = str(raw.get('notes') or '')
+    movement['manual_date'] = None
+    if raw.get('manual_date'):
+        movement['manual_date'] = parse_persian_date(raw['manual_date'])
+        if movement['manual_date'] is None:
+            raise ValueError("تاریخ دستی نامعتبر است")
+    return movement
+
+
+def _check_references(movements, errors):
+    """بررسی وجود شناسه‌های ارجاع شده با یک کوئری برای هر جدول"""
+    references = {
+        Warehouse: ('warehouse', 'source_warehouse', 'destination_warehouse'),
+        MaterialType: ('material_type',),
+        Supplier: ('supplier',),
+        Customer: ('customer',),
+    }
+    for model, fields in references.items():
+        wanted = {m[f] for _, m in movements for f in fields if m[f]}
+        if not wanted:
+            continue
+        existing = set(model.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+        for index, movement in movements:
+            missing = [f for f in fields if movement[f] and movement[f] not in existing]
+            if missing:
+                errors.append({'index': index, 'message': f"{model._meta.verbose_name} با شناسه {movement[missing[0]]} یافت نشد"})
+
+
+def _load_lots(movements, fifo):
+    """تصویر قفل شده لات‌های درگیر در دسته با دو کوئری (و یک کوئری لایه‌ها در روش FIFO)"""
+    warehouse_ids, material_ids = set(), set()
+    for _, m in movements:
+        warehouse_ids.update(w for w in (m['warehouse'], m['source_warehouse'], m['destination_warehouse']) if w)
+        material_ids.add(m['material_type'])
+
+    lots = {}
+    order = defaultdict(list)
+    involved = Inventory.objects.filter(warehouse_id__in=warehouse_ids, material_type_id__in=material_ids)
+    # قفل در کوئری جداگانه تا موجودی خوانده شده شامل خانه‌های شمارنده ثبت‌های هم‌زمان باشد
+    list(involved.select_for_update().values_list('id', flat=True))
+    rows = involved.with_balance().order_by('id').values_list(
+        'id', 'warehouse_id', 'material_type_id', 'supplier_id', 'on_hand', 'on_hand_value')
+    for pk, warehouse_id, material_type_id, supplier_id, quantity, value in rows:
+        key = (warehouse_id, material_type_id, supplier_id)
+        if key in lots:
+            continue
+        lots[key] = _Lot(pk, supplier_id, LotState(quantity, value, fifo=fifo))
+        order[(warehouse_id, material_type_id)].append(key)
+
+    if fifo and lots:
+        by_pk = {lot.inventory_id: lot for lot in lots.values()}
+        for layer in CostLayer.objects.filter(
+            inventory_id__in=by_pk.keys(), remaining_quantity__gt=0
+        ).order_by('id').values('id', 'inventory_id', 'remaining_quantity', 'unit_cost'):
+            by_pk[layer['inventory_id']].state.layers.append(
+                LayerState(layer['remaining_quantity'], layer['unit_cost'], pk=layer['id'])
+            )
+    return lots, order
+
+
+def post_movement_batch(raw_movements, user):
+    """
+    اعتبارسنجی و ثبت اتمیک یک دسته حرکت
+    در صورت وجود هر خطا BatchValidationError برمی‌گردد و چیزی ثبت نمی‌شود.
+    """
+    max_size = getattr(settings, 'MOVEMENT_BATCH_MAX_SIZE', 5000)
+    if not isinstance(raw_movements, list) or not raw_movements:
+        raise BatchValidationError([{'index': None, 'message': "لیست حرکات خالی یا نامعتبر است"}])
+    if len(raw_movements) > max_size:
+        raise BatchValidationError([{'index': None, 'message': f"حداکثر {max_size} حرکت در هر دسته مجاز است"}])
+
+    errors = []
+    movements = []
+    for index, raw in enumerate(raw_movements):
+        try:
+            movements.append((index, parse_movement(raw)))
+        except ValueError as e:
+            errors.append({'index': index, 'message': str(e)})
+    if errors:
+        raise BatchValidationError(errors)
+
+    fifo = valuation_method() == FIFO
+    with transaction.atomic():
+        _check_references(movements, errors)
+        if errors:
+            raise BatchValidationError(errors)
+
+        lots, order = _load_lots(movements, fifo)
+
+        def lot_for(warehouse_id, material_type_id, supplier_id):
+            key = (warehouse_id, material_type_id, supplier_id)
+            if key not in lots:
+                lots[key] = _Lot(None, supplier_id, LotState(fifo=fifo))
+                order[(warehouse_id, material_type_id)].append(key)
+            return lots[key]
+
+        def issue(index, warehouse_id, material_type_id, quantity, supplier_id=None):
+            keys = [k for k in order[(warehouse_id, material_type_id)]
+                    if supplier_id is None or k[2] == supplier_id]
+            try:
+                plan = plan_fifo_allocation([(k, k[2], lots[k].state.quantity) for k in keys], quantity)
+            except InsufficientStockError as e:
+                errors.append({'index': index, 'message': str(e)})
+                return None
+            taken = []
+            for line in plan:
+                cost, chunks = lots[line.inventory_id].state.issue(line.quantity)
+                taken.append((lots[line.inventory_id], line.quantity, cost, chunks))
+            return taken
+
+        stock_ins, stock_outs, transfers = [], [], []
+        allocations = []
+        new_layers = []
+        for index, m in movements:
+            if m['type'] == 'in':
+                stock_in = StockIn(
+                    warehouse_id=m['warehouse'], material_type_id=m['material_type'],
+                    supplier_id=m['supplier'], customer_id=m['customer'],
+                    quantity=m['quantity'], unit_price=m['unit_price'],
+                    total_price=m['quantity'] * m['unit_price'] if m['unit_price'] else None,
+                    invoice_number=m['invoice_number'], notes=m['notes'],
+                    created_by=user, manual_date=m['manual_date'],
+                )
+                stock_ins.append(stock_in)
+                target = lot_for(m['warehouse'], m['material_type'], m['supplier'])
+                target.state.receive(m['quantity'], m['unit_price'] or 0, stock_in)
+
+            elif m['type'] == 'out':
+                taken = issue(index, m['warehouse'], m['material_type'], m['quantity'], m['supplier'])
+                if taken is None:
+                    continue
+                stock_out = StockOut(
+                    warehouse_id=m['warehouse'], material_type_id=m['material_type'],
+                    supplier_id=m['supplier'], customer_id=m['customer'],
+                    quantity=m['quantity'], unit_price=m['unit_price'],
+                    total_price=m['quantity'] * m['unit_price'] if m['unit_price'] else None,
+                    invoice_number=m['invoice_number'], notes=m['notes'],
+                    created_by=user, manual_date=m['manual_date'],
+                    cost_of_goods=sum(cost for _, _, cost, _ in taken),
+                )
+                stock_outs.append(stock_out)
+                allocations.extend((stock_out, source, quantity, cost) for source, quantity, cost, _ in taken)
+
+            else:
+                if m['source_warehouse']:
+                    taken = issue(index, m['source_warehouse'], m['material_type'], m['quantity'])
+                    if taken is None:
+                        continue
+                else:
+                    taken = [(None, m['quantity'], 0, [])]
+                if m['destination_warehouse']:
+                    for source, quantity, cost, chunks in taken:
+                        supplier_id = source.supplier_id if source else None
+                        lot_for(m['destination_warehouse'], m['material_type'], supplier_id).state.receive_issued(
+                            quantity, cost, chunks)
+                transfers.append(StockTransfer(
+                    source_warehouse_id=m['source_warehouse'],
+                    destination_warehouse_id=m['destination_warehouse'],
+                    material_type_id=m['material_type'], quantity=m['quantity'],
+                    notes=m['notes'], created_by=user,
+                ))
+
+        if errors:
+            raise BatchValidationError(errors)
+
+        # لات‌های جدید با وضعیت نهایی ساخته می‌شوند؛ لات‌های موجود فقط تغییر خالص را می‌گیرند
+        deltas = {}
+        for lot in lots.values():
+            if lot.inventory_id is not None:
+                add_delta(deltas, lot.inventory_id, lot.state.quantity - lot.initial[0], lot.state.value - lot.initial[1])
+        apply_inventory_deltas(deltas)
+
+        new_lots = [(key, lot) for key, lot in lots.items() if lot.inventory_id is None]
+        created = Inventory.objects.bulk_create([
+            Inventory(warehouse_id=key[0], material_type_id=key[1], supplier_id=key[2],
+                      current_quantity=lot.state.quantity, stock_value=lot.state.value)
+            for key, lot in new_lots
+        ])
+        for (_, lot), inventory in zip(new_lots, created):
+            lot.inventory_id = inventory.pk
+
+        # bulk_create متد save را صدا نمی‌زند
+        for movement in (*stock_ins, *stock_outs, *transfers):
+            movement.fill_jalali_period()
+        StockIn.objects.bulk_create(stock_ins)
+        StockOut.objects.bulk_create(stock_outs)
+        StockTransfer.objects.bulk_create(transfers)
+        StockOutAllocation.objects.bulk_create([
+            StockOutAllocation(stock_out=stock_out, inventory_id=source.inventory_id,
+                               supplier_id=source.supplier_id, quantity=quantity, cost=cost)
+            for stock_out, source, quantity, cost in allocations
+        ])
+
+        rollup = {}
+        for stock_in in stock_ins:
+            record_stock_in(stock_in, rollup)
+        lines = defaultdict(list)
+        for stock_out, source, quantity, cost in allocations:
+            lines[id(stock_out)].append((source.supplier_id, quantity, cost))
+        for stock_out in stock_outs:
+            record_stock_out(stock_out, lines[id(stock_out)], rollup)
+        apply_rollup_deltas(rollup)
+
+        # bulk_create سیگنال post_save ندارد
+        index_objects('stockin', [obj.pk for obj in stock_ins])
+        index_objects('stockout', [obj.pk for obj in stock_outs])
+        index_objects('inventory', [obj.pk for obj in created])
+        record_changes('stockin', [obj.pk for obj in stock_ins])
+        record_changes('stockout', [obj.pk for obj in stock_outs])
+        record_changes('stocktransfer', [obj.pk for obj in transfers])
+        record_changes('inventory', [obj.pk for obj in created])
+        # لات‌های جدید با bulk_create ساخته می‌شوند و از apply_inventory_deltas نمی‌گذرند
+        if stock_ins or stock_outs or transfers:
+            invalidate(DASHBOARD, AVAILABILITY, LEDGER)
+
+        if fifo:
+            consumed = {}
+            for lot in lots.values():
+                for layer in lot.state.layers:
+                    if layer.pk is not None and layer.remaining != layer.original:
+                        consumed[layer.pk] = layer.remaining
+                    elif layer.pk is None and layer.remaining > 0:
+                        new_layers.append(CostLayer(
+                            inventory_id=lot.inventory_id,
+                            stock_in=layer.source,
+                            quantity=layer.original,
+                            remaining_quantity=layer.remaining,
+                            unit_cost=layer.unit_cost,
+                        ))
+            if consumed:
+                CostLayer.objects.filter(pk__in=consumed.keys()).update(
+                    remaining_quantity=Case(
+                        *[When(pk=pk, then=quantity) for pk, quantity in consumed.items()],
+                        output_field=IntegerField(),
+                    )
+                )
+            CostLayer.objects.bulk_create(new_layers)
+
+    return {
+        'stock_in': [obj.pk for obj in stock_ins],
+        'stock_out': [obj.pk for obj in stock_outs],
+        'transfer': [obj.pk for obj in transfers],
+    }
@@ -0,0 +1,92 @@
+"""
+کش نتایج پرهزینه با باطل‌سازی رویدادمحور
+
+هر فضای نام (مثلاً داشبورد) یک شماره نسل در کش دارد که جزء کلید همه مقادیرش است.
+ثبت حرکات و تغییر اطلاعات پایه با invalidate پس از commit تراکنش شماره نسل را عوض
+می‌کنند، پس مقادیر قبلی دیگر خوانده نمی‌شوند و نیازی به پیدا کردن و حذف آن‌ها نیست.
+
+پس از باطل‌سازی فقط یک پردازش (با قفل cache.add) مقدار را دوباره محاسبه می‌کند و بقیه
+تا آماده شدن آن، آخرین مقدار محاسبه شده را می‌گیرند.
+
+برای چند پردازش (gunicorn و غیره) CACHES باید کش مشترک (Redis یا Memcached) باشد؛
+LocMemCache برای هر پردازش جداست.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+DASHBOARD = 'dashboard'
+AVAILABILITY = 'availability'
+# نسخه کل دفتر انبار (حرکات، موجودی و اطلاعات پایه) برای ETag صفحات
+LEDGER = 'ledger'
+
+# مدت اعتبار قفل محاسبه دوباره (ثانیه)
+LOCK_TIMEOUT = 30
+
+# فاصله بررسی آماده شدن مقدار توسط پردازش دیگر (ثانیه)
+POLL_INTERVAL = 0.05
+
+
+def period_namespace(year, month):
+    """فضای نام مقادیر وابسته به حرکات یک ماه شمسی (خلاصه خرید و فروش)"""
+    return f'period:{year}:{month}'
+
+
+def _generation_key(namespace):
+    return f'inventory:{namespace}:generation'
+
+
+def generation(namespace):
+    """شماره نسل فعلی یک فضای نام"""
+    # مقدار اولیه از زمان گرفته می‌شود تا پس از حذف کلید از کش، نسل‌های قدیمی تکرار نشوند
+    return cache.get_or_set(_generation_key(namespace), time.time_ns(), None)
+
+
+def _bump(namespace):
+    try:
+        cache.incr(_generation_key(namespace))
+    except ValueError:
+        cache.set(_generation_key(namespace), time.time_ns(), None)
+
+
+def invalidate(*namespaces):
+    """باطل کردن مقادیر کش شده پس از commit تراکنش جاری (یا فوراً بیرون از تراکنش)"""
+    for namespace in namespaces:
+        transaction.on_commit(lambda namespace=namespace: _bump(namespace))
+
+
+def get_or_compute(namespace, name, compute, timeout):
+    """
+    خواندن مقدار از کش یا محاسبه آن با جلوگیری از هجوم هم‌زمان (stampede)
+    compute: تابع بدون آرگومان؛ مقدار None کش نمی‌شود
+    """
+    key = f'inventory:{namespace}:{generation(namespace)}:{name}'
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    stale_key = f'inventory:{namespace}:last:{name}'
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, timeout)
+                cache.set(stale_key, value, None)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    # پردازش دیگری در حال محاسبه است - آخرین مقدار قبلی یا صبر تا آماده شدن
+    stale = cache.get(stale_key)
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
@@ -0,0 +1,198 @@
+"""
+خوراک تغییرات افزایشی برای همگام‌سازی پایانه‌های شعب
+
+هر ذخیره یا حذف حرکت، تغییر موجودی لات و تغییر اطلاعات پایه یک ردیف ChangeLogEntry
+اضافه می‌کند (فقط درج، بدون بروزرسانی). پایانه با توکن آخرین شماره‌ای که گرفته درخواست
+می‌دهد و فقط ردیف‌های تغییر کرده بعد از آن را با وضعیت فعلی‌شان دریافت می‌کند؛ خواندن
+صفحه یک پیمایش محدود روی کلید اصلی است.
+
+شماره‌ها هنگام درج گرفته می‌شوند ولی تراکنش‌ها ممکن است به ترتیب دیگری commit شوند؛
+ردیفی با شماره کوچک‌تر که هنوز commit نشده در صفحه خوانده شده جای خالی (شکاف) می‌گذارد.
+توکن علاوه بر آخرین شماره، شکاف‌های باز را هم نگه می‌دارد و هر درخواست ردیف‌های داخل
+آن‌ها را هم می‌خواند تا ردیف دیر commit شده جا نماند؛ ردیف‌های تازه بدون هیچ تأخیری
+ارسال می‌شوند. شماره‌ای که تراکنشش rollback شده هرگز پر نمی‌شود، پس شکاف پس از
+CHANGE_FEED_GAP_SECONDS (بیشتر از طولانی‌ترین تراکنش) بسته می‌شود.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    ChangeLogEntry, Customer, Inventory, MaterialType, StockIn, StockOut, StockTransfer, Supplier, Warehouse,
+)
+
+TOKEN_SALT = 'inventory.changefeed'
+
+# حداکثر شکاف باز در یک توکن؛ قدیمی‌ترین‌ها زودتر بسته می‌شوند
+MAX_GAPS = 100
+
+# شروع همگام‌سازی: شکاف‌های این تعداد شماره آخر باز نگه داشته می‌شوند
+RESET_WINDOW = 1000
+
+# نوع ← (QuerySet پایه، فیلدهای خروجی)
+FEED_SOURCES = {
+    'warehouse': (Warehouse.objects.all(), ('id', 'name', 'code', 'is_active')),
+    'materialtype': (MaterialType.objects.all(), ('id', 'name', 'unit')),
+    'supplier': (Supplier.objects.all(), ('id', 'name', 'phone')),
+    'customer': (Customer.objects.all(), ('id', 'name', 'phone')),
+    'inventory': (Inventory.objects.with_balance(),
+                  ('id', 'warehouse_id', 'material_type_id', 'supplier_id', 'on_hand', 'on_hand_value')),
+    'stockin': (StockIn.objects.all(),
+                ('id', 'warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', 'quantity',
+                 'unit_price', 'total_price', 'invoice_number', 'manual_date', 'created_at')),
+    'stockout': (StockOut.objects.all(),
+                 ('id', 'warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', 'quantity',
+                  'unit_price', 'total_price', 'invoice_number', 'manual_date', 'created_at')),
+    'stocktransfer': (StockTransfer.objects.all(),
+                      ('id', 'source_warehouse_id', 'destination_warehouse_id', 'material_type_id',
+                       'quantity', 'created_at')),
+}
+
+
+def record_changes(kind, pks, action='save'):
+    """افزودن ردیف‌های خوراک برای چند ردیف از یک نوع با یک INSERT"""
+    now = timezone.now()
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(kind=kind, object_id=pk, action=action, created_at=now) for pk in pks
+    ])
+
+
+def encode_cursor(sequence, gaps=()):
+    """توکن امضا شده؛ بدون شکاف همان شماره است (سازگار با توکن‌های قبلی)"""
+    if not gaps:
+        return signing.dumps(sequence, salt=TOKEN_SALT)
+    return signing.dumps([sequence, [list(gap) for gap in gaps]], salt=TOKEN_SALT)
+
+
+def decode_cursor(token):
+    """(آخرین شماره، شکاف‌ها) یا None برای توکن نامعتبر؛ هر شکاف (از، تا، زمان دیده شدن)"""
+    try:
+        value = signing.loads(token, salt=TOKEN_SALT)
+        if isinstance(value, list):
+            sequence, gaps = value
+            return int(sequence), [(int(low), int(high), int(seen)) for low, high, seen in gaps]
+        return int(value), []
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def gap_seconds():
+    return getattr(settings, 'CHANGE_FEED_GAP_SECONDS', 300)
+
+
+def pending_entries(entries, after, gaps):
+    """ردیف‌های بعد از after یا داخل شکاف‌های باز"""
+    condition = Q(pk__gt=after)
+    for low, high, _ in gaps:
+        condition |= Q(pk__range=(low, high))
+    return entries.filter(condition)
+
+
+def advance(after, gaps, sequences, now=None):
+    """
+    موقعیت بعدی خواننده پس از دیدن شماره‌های sequences (مرتب) از pending_entries
+    شماره‌های ندیده شده بین after و بزرگ‌ترین شماره دیده شده شکاف تازه می‌شوند و
+    شماره‌های دیده شده از شکاف‌های قبلی برداشته می‌شوند.
+    """
+    now = int(time.time()) if now is None else now
+    ranges = [gap for gap in gaps if now - gap[2] <= gap_seconds()]
+    if sequences and sequences[-1] > after:
+        ranges.append((after + 1, sequences[-1], now))
+        after = sequences[-1]
+
+    open_gaps = []
+    for low, high, seen in ranges:
+        start = low
+        for sequence in sequences[bisect_left(sequences, low):bisect_right(sequences, high)]:
+            if sequence > start:
+                open_gaps.append((start, sequence - 1, seen))
+            start = sequence + 1
+        if start <= high:
+            open_gaps.append((start, high, seen))
+    open_gaps.sort(key=lambda gap: gap[2])
+    return after, sorted(open_gaps[-MAX_GAPS:])
+
+
+def feed_position():
+    """آخرین شماره خوراک با شکاف‌های باز RESET_WINDOW شماره آخر (شروع خواندن از حالا)"""
+    last = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last is None:
+        return 0, []
+    oldest = ChangeLogEntry.objects.order_by('pk').values_list('pk', flat=True).first()
+    start = max(last - RESET_WINDOW, oldest - 1)
+    sequences = list(ChangeLogEntry.objects.filter(pk__gt=start).order_by('pk').values_list('pk', flat=True))
+    return advance(start, [], sequences)
+
+
+def reset_page():
+    """شروع همگام‌سازی: پایانه باید فهرست‌ها را کامل بگیرد و از این توکن ادامه دهد"""
+    return {'reset': True, 'cursor': encode_cursor(*feed_position()), 'changes': [], 'has_more': False}
+
+
+def changes_since(token, limit):
+    """
+    یک صفحه از تغییرات بعد از توکن
+    خروجی: {'reset', 'cursor', 'changes': [{'kind', 'id', 'action', 'data'}], 'has_more'}
+    برای توکن خالی، نامعتبر یا قدیمی‌تر از ردیف‌های نگه‌داشته شده reset برابر True است.
+    """
+    cursor = decode_cursor(token) if token else None
+    if cursor is None:
+        return reset_page()
+    after, gaps = cursor
+    oldest = ChangeLogEntry.objects.order_by('pk').values_list('pk', flat=True).first()
+    if oldest is not None and after < oldest - 1:
+        return reset_page()
+
+    entries = list(
+        pending_entries(ChangeLogEntry.objects.all(), after, gaps).order_by('pk')
+        .values_list('pk', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # فقط آخرین تغییر هر ردیف در این صفحه
+    latest = {}
+    for sequence, kind, object_id, action in entries:
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = action
+
+    wanted = {}
+    for (kind, object_id), action in latest.items():
+        if action == 'save' and kind in FEED_SOURCES:
+            wanted.setdefault(kind, []).append(object_id)
+    rows = {}
+    for kind, ids in wanted.items():
+        queryset, fields = FEED_SOURCES[kind]
+        for row in queryset.filter(pk__in=ids).values(*fields):
+            rows[(kind, row['id'])] = row
+
+    changes = []
+    for (kind, object_id), action in latest.items():
+        data = rows.get((kind, object_id))
+        if action == 'save' and data is None:
+            # پس از ثبت تغییر حذف شده است؛ ردیف حذف آن در ادامه خوراک می‌آید
+            action = 'delete'
+        changes.append({'kind': kind, 'id': object_id, 'action': action, 'data': data})
+
+    return {
+        'reset': False,
+        'cursor': encode_cursor(*advance(after, gaps, [entry[0] for entry in entries])),
+        'changes': changes,
+        'has_more': has_more,
+    }
+
+
+def prune_changes(days):
+    """حذف ردیف‌های قدیمی‌تر از days روز؛ پایانه‌هایی که عقب‌تر بمانند reset می‌گیرند"""
+    cutoff = timezone.now() - timedelta(days=days)
+    # آخرین ردیف همیشه می‌ماند تا عقب ماندن پایانه‌ها از روی کوچک‌ترین شماره تشخیص داده شود
+    last = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last is None:
+        return 0
+    deleted, _ = ChangeLogEntry.objects.filter(created_at__lt=cutoff, pk__lt=last).delete()
+    return deleted
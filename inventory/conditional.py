@@ -0,0 +1,50 @@
+"""
+درخواست شرطی (If-None-Match) برای صفحات فهرست و APIهای موجودی
+
+نسخه دفتر انبار (LEDGER در caching) با هر ثبت حرکت، تغییر موجودی یا تغییر اطلاعات پایه
+پس از commit عوض می‌شود. ETag صفحه از این نسخه، کاربر و توکن CSRF ساخته می‌شود؛ تا
+نسخه عوض نشده، درخواست تکراری (مثلاً نمایشگرهای انبار که مدام صفحه را بارگذاری می‌کنند)
+پیش از هر کوئری و رندر قالب پاسخ 304 می‌گیرد.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .caching import LEDGER, generation
+
+
+def has_pending_messages(request):
+    """پیام‌های نمایش داده نشده (messages) در کوکی یا نشست؛ صفحه باید دوباره ساخته شود"""
+    if request.COOKIES.get(getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages')):
+        return True
+    session = getattr(request, 'session', None)
+    return session is not None and '_messages' in session
+
+
+def ledger_etag(request, *args, **kwargs):
+    """ETag صفحه برای کاربر جاری؛ None یعنی بدون پاسخ شرطی"""
+    if not request.user.is_authenticated or has_pending_messages(request):
+        return None
+    # توکن CSRF فرم‌های داخل صفحه پس از ورود دوباره عوض می‌شود
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    stamp = f'{generation(LEDGER)}:{request.user.pk}:{csrf}'
+    return hashlib.sha1(stamp.encode()).hexdigest()[:20]
+
+
+def ledger_conditional(view):
+    """
+    پاسخ 304 برای درخواست GET با ETag برابر نسخه فعلی دفتر
+    پاسخ‌ها private و no-cache هستند: مرورگر نگه می‌دارد ولی هر بار با ETag اعتبارسنجی می‌کند.
+    """
+    conditional_view = condition(etag_func=ledger_etag)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
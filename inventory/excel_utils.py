@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
@@ -5,9 +6,27 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 from datetime import datetime, date
 from django.contrib.auth.models import User
 from .models import MaterialType, Supplier, Customer, StockIn, StockOut, Inventory, StockTransfer, Warehouse
-from .utils import gregorian_to_persian_str, gregorian_to_persian_datetime_str, parse_persian_date
+from .utils import gregorian_to_persian_str, gregorian_to_persian_datetime_str, parse_persian_dates, persian_dates
+from .allocation import InsufficientStockError
+from .posting import save_stock_out_optimistic
 import os
 
+
+INVALID_DATE_MESSAGE = "تاریخ نامعتبر - قالب درست 1404/01/26 یا 2025-04-15 است"
+
+
+def column_dates(df, *columns):
+    """
+    تاریخ همه ردیف‌ها در یک پردازش برداری؛ از اولین ستون موجود و پر هر ردیف
+    خروجی: (سری datetime.date یا None، سری بولی تاریخ‌های پر ولی نامعتبر) هم‌ایندکس با df
+    """
+    values = pd.Series(None, index=df.index, dtype=object)
+    for column in reversed(columns):
+        if column in df.columns:
+            values = df[column].astype(object).where(df[column].notna(), values)
+    return parse_persian_dates(values)
+
+
 def create_unified_stock_template():
     """ایجاد قالب Excel یکپارچه برای ورودی و خروجی انبار"""
     wb = openpyxl.Workbook()
@@ -104,7 +123,12 @@ def import_unified_stock_excel(file_path, user):
             results["errors"].append(f"ستون‌های موجود: {', '.join(df.columns)}")
             return results
         
+        manual_dates, invalid_dates = column_dates(df, found_columns['تاریخ (YYYY-MM-DD)'])
+
         for index, row in df.iterrows():
+            if invalid_dates[index]:
+                results["errors"].append(f"ردیف {index + 2}: {INVALID_DATE_MESSAGE}")
+                continue
             try:
                 # دریافت نوع عملیات
                 operation_type = str(row[found_columns['نوع عملیات']]).strip()
@@ -136,10 +160,7 @@ def import_unified_stock_excel(file_path, user):
                 notes = str(row[found_columns['یادداشت‌ها']]).strip() if pd.notna(row[found_columns['یادداشت‌ها']]) else ""
                 
                 # تبدیل تاریخ - پشتیبانی از تاریخ‌های فارسی و میلادی
-                manual_date = None
-                if pd.notna(row[found_columns['تاریخ (YYYY-MM-DD)']]):
-                    date_value = row[found_columns['تاریخ (YYYY-MM-DD)']]
-                    manual_date = parse_persian_date(date_value)
+                manual_date = manual_dates[index]
                 
                 # دریافت انبار
                 warehouse_name = str(row[found_columns['انبار']]).strip() if 'انبار' in found_columns and pd.notna(row[found_columns['انبار']]) else "انبار اصلی"
@@ -167,14 +188,7 @@ def import_unified_stock_excel(file_path, user):
                         manual_date=manual_date
                     )
                     
-                    # بروزرسانی موجودی
-                    inventory, created = Inventory.objects.get_or_create(
-                        warehouse=warehouse,
-                        material_type=material_type,
-                        defaults={'current_quantity': 0}
-                    )
-                    inventory.current_quantity += quantity
-                    inventory.save()
+                    # موجودی لات همین Supplier در save بروزرسانی می‌شود
                     
                     results["success"].append(f"ردیف {index + 2}: ✅ ورودی {material_name} با موفقیت ثبت شد")
                     
@@ -184,18 +198,9 @@ def import_unified_stock_excel(file_path, user):
                         name=supplier_customer_name
                     )
                     
-                    # بررسی موجودی
-                    try:
-                        inventory = Inventory.objects.get(warehouse=warehouse, material_type=material_type)
-                        if inventory.current_quantity < quantity:
-                            results["errors"].append(f"ردیف {index + 2}: ❌ موجودی ناکافی برای {material_name} در انبار {warehouse.name} (موجودی: {inventory.current_quantity}, درخواستی: {quantity})")
-                            continue
-                    except Inventory.DoesNotExist:
-                        results["errors"].append(f"ردیف {index + 2}: ❌ موجودی برای {material_name} در انبار {warehouse.name} یافت نشد")
-                        continue
-                    
-                    # ایجاد رکورد خروجی
-                    stock_out = StockOut.objects.create(
+                    # ایجاد رکورد خروجی - بررسی جمع همه لات‌های Supplier در این انبار و کم شدن
+                    # موجودی به روش FIFO با UPDATE شرطی روی نسخه لات‌ها
+                    stock_out = StockOut(
                         warehouse=warehouse,
                         material_type=material_type,
                         customer=customer,
@@ -206,10 +211,11 @@ def import_unified_stock_excel(file_path, user):
                         created_by=user,
                         manual_date=manual_date
                     )
-                    
-                    # بروزرسانی موجودی
-                    inventory.current_quantity -= quantity
-                    inventory.save()
+                    try:
+                        save_stock_out_optimistic(stock_out)
+                    except InsufficientStockError as e:
+                        results["errors"].append(f"ردیف {index + 2}: ❌ موجودی ناکافی برای {material_name} در انبار {warehouse.name} (موجودی: {e.available}, درخواستی: {quantity})")
+                        continue
                     
                     results["success"].append(f"ردیف {index + 2}: ✅ خروجی {material_name} با موفقیت ثبت شد")
                 
@@ -325,7 +331,12 @@ def import_stock_in_excel(file_path, user):
         df = pd.read_excel(file_path)
         results = {"success": [], "errors": []}
         
+        manual_dates, invalid_dates = column_dates(df, 'تاریخ ورود (YYYY-MM-DD)', 'تاریخ (YYYY-MM-DD)')
+
         for index, row in df.iterrows():
+            if invalid_dates[index]:
+                results["errors"].append(f"ردیف {index + 2}: {INVALID_DATE_MESSAGE}")
+                continue
             try:
                 # دریافت انبار
                 warehouse_name = str(row['انبار']).strip() if 'انبار' in df.columns and pd.notna(row['انبار']) else "انبار اصلی"
@@ -379,13 +390,7 @@ def import_stock_in_excel(file_path, user):
                 notes = str(row['یادداشت‌ها']).strip() if pd.notna(row['یادداشت‌ها']) else ""
                 
                 # تبدیل تاریخ - پشتیبانی از تاریخ‌های فارسی و میلادی
-                manual_date = None
-                if 'تاریخ ورود (YYYY-MM-DD)' in row and pd.notna(row['تاریخ ورود (YYYY-MM-DD)']):
-                    date_value = row['تاریخ ورود (YYYY-MM-DD)']
-                    manual_date = parse_persian_date(date_value)
-                elif 'تاریخ (YYYY-MM-DD)' in row and pd.notna(row['تاریخ (YYYY-MM-DD)']):
-                    date_value = row['تاریخ (YYYY-MM-DD)']
-                    manual_date = parse_persian_date(date_value)
+                manual_date = manual_dates[index]
                 
                 # ایجاد رکورد ورودی
                 stock_in = StockIn.objects.create(
@@ -417,7 +422,12 @@ def import_stock_out_excel(file_path, user):
         df = pd.read_excel(file_path)
         results = {"success": [], "errors": []}
         
+        manual_dates, invalid_dates = column_dates(df, 'تاریخ خروج (YYYY-MM-DD)', 'تاریخ (YYYY-MM-DD)')
+
         for index, row in df.iterrows():
+            if invalid_dates[index]:
+                results["errors"].append(f"ردیف {index + 2}: {INVALID_DATE_MESSAGE}")
+                continue
             try:
                 # دریافت انبار
                 warehouse_name = str(row['انبار']).strip() if 'انبار' in df.columns and pd.notna(row['انبار']) else "انبار اصلی"
@@ -469,41 +479,12 @@ def import_stock_out_excel(file_path, user):
                 notes = str(row['یادداشت‌ها']).strip() if pd.notna(row['یادداشت‌ها']) else ""
                 
                 # تبدیل تاریخ - پشتیبانی از تاریخ‌های فارسی و میلادی
-                manual_date = None
-                if 'تاریخ خروج (YYYY-MM-DD)' in row and pd.notna(row['تاریخ خروج (YYYY-MM-DD)']):
-                    date_value = row['تاریخ خروج (YYYY-MM-DD)']
-                    manual_date = parse_persian_date(date_value)
-                elif 'تاریخ (YYYY-MM-DD)' in row and pd.notna(row['تاریخ (YYYY-MM-DD)']):
-                    date_value = row['تاریخ (YYYY-MM-DD)']
-                    manual_date = parse_persian_date(date_value)
-                
-                # بررسی موجودی - بر اساس supplier
-                try:
-                    if supplier:
-                        # اگر supplier مشخص باشد، موجودی آن supplier بررسی می‌شود
-                        inventory = Inventory.objects.get(
-                            warehouse=warehouse, 
-                            material_type=material_type,
-                            supplier=supplier
-                        )
-                    else:
-                        # اگر supplier مشخص نباشد، موجودی کلی بررسی می‌شود
-                        inventory = Inventory.objects.get(
-                            warehouse=warehouse, 
-                            material_type=material_type
-                        )
-                    
-                    if inventory.current_quantity < quantity:
-                        supplier_info = f" از {supplier.name}" if supplier else ""
-                        results["errors"].append(f"ردیف {index + 2}: موجودی ناکافی برای {material_name}{supplier_info} در انبار {warehouse.name} (موجودی: {inventory.current_quantity}, درخواستی: {quantity})")
-                        continue
-                except Inventory.DoesNotExist:
-                    supplier_info = f" از {supplier.name}" if supplier else ""
-                    results["errors"].append(f"ردیف {index + 2}: موجودی برای {material_name}{supplier_info} در انبار {warehouse.name} یافت نشد")
-                    continue
+                manual_date = manual_dates[index]
                 
-                # ایجاد رکورد خروجی
-                stock_out = StockOut.objects.create(
+                # ایجاد رکورد خروجی - بررسی و کم کردن موجودی با یک UPDATE شرطی روی نسخه لات‌ها،
+                # پس ثبت‌های هم‌زمان نمی‌توانند موجودی را منفی کنند
+                # اگر supplier مشخص نباشد، خروجی به روش FIFO بین لات‌ها تقسیم می‌شود
+                stock_out = StockOut(
                     warehouse=warehouse,
                     material_type=material_type,
                     customer=customer,
@@ -515,6 +496,12 @@ def import_stock_out_excel(file_path, user):
                     created_by=user,
                     manual_date=manual_date
                 )
+                try:
+                    save_stock_out_optimistic(stock_out)
+                except InsufficientStockError as e:
+                    supplier_info = f" از {supplier.name}" if supplier else ""
+                    results["errors"].append(f"ردیف {index + 2}: موجودی ناکافی برای {material_name}{supplier_info} در انبار {warehouse.name} (موجودی: {e.available}, درخواستی: {quantity})")
+                    continue
                 
                 results["success"].append(f"ردیف {index + 2}: خروجی {material_name} با موفقیت ثبت شد")
                 
@@ -686,15 +673,16 @@ def export_inventory_to_excel():
         ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
     
     # اضافه کردن داده‌ها - تفکیک بر اساس Supplier
-    inventories = Inventory.objects.all().select_related('warehouse', 'material_type', 'supplier').order_by('warehouse__name', 'material_type__name', 'supplier__name')
+    inventories = list(Inventory.objects.with_balance().select_related('warehouse', 'material_type', 'supplier').order_by('warehouse__name', 'material_type__name', 'supplier__name'))
+    updated_dates = persian_dates([inventory.last_updated for inventory in inventories], "%Y/%m/%d %H:%M")
     
-    for row, inventory in enumerate(inventories, 2):
+    for row, (inventory, updated_date) in enumerate(zip(inventories, updated_dates), 2):
         ws.cell(row=row, column=1, value=inventory.warehouse.name if inventory.warehouse else "")
         ws.cell(row=row, column=2, value=inventory.material_type.name if inventory.material_type else "")
         ws.cell(row=row, column=3, value=inventory.supplier.name if inventory.supplier else "بدون هویت")
         ws.cell(row=row, column=4, value=inventory.material_type.unit if inventory.material_type else "")
-        ws.cell(row=row, column=5, value=inventory.current_quantity or 0)
-        ws.cell(row=row, column=6, value=gregorian_to_persian_datetime_str(inventory.last_updated, "%Y/%m/%d %H:%M") if inventory.last_updated else "")
+        ws.cell(row=row, column=5, value=inventory.on_hand or 0)
+        ws.cell(row=row, column=6, value=updated_date)
     
     # ذخیره فایل
     filename = f"موجودی_انبار_تفکیک_بر_اساس_هویت_کالا_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -702,3 +690,43 @@ def export_inventory_to_excel():
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     wb.save(filepath)
     return filepath
+
+
+def export_monthly_report_to_excel(report):
+    """صدور گزارش ماهانه شمسی (خروجی reports.monthly_movements) به فایل Excel"""
+    # حالت فقط-نوشتنی: ردیف‌ها بدون نگه داشتن همه خانه‌ها در حافظه نوشته می‌شوند
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(f"گزارش ماهانه {report['year']}")
+
+    labels = [label for _, label in report['fields']]
+    headers = ["انبار", "نام کالا", "واحد اندازه‌گیری"]
+    headers += [f"{month_name} - {label}" for _, month_name in report['months'] for label in labels]
+    headers += [f"جمع سال - {label}" for label in labels]
+
+    column_widths = [20, 25, 15] + [18] * (len(headers) - 3)
+    for col, width in enumerate(column_widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
+
+    header_cells = []
+    for header in headers:
+        cell = openpyxl.cell.WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # هر ردیف: ۱۲ ماه × مقادیر و سپس جمع سال
+    matrix = report['matrix']
+    cells = np.concatenate([matrix.reshape(len(matrix), -1), matrix.sum(axis=1)], axis=1)
+    for row, values in zip(report['rows'], cells.tolist()):
+        ws.append([row['warehouse'], row['material'], row['unit'], *values])
+    totals = np.concatenate([matrix.sum(axis=0).reshape(-1), matrix.sum(axis=(0, 1))])
+    ws.append(["جمع کل", "", "", *totals.tolist()])
+
+    # ذخیره فایل
+    filename = f"گزارش_ماهانه_{report['year']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    filepath = os.path.join("media", "excel_reports", filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    wb.save(filepath)
+    return filepath
@@ -0,0 +1,181 @@
+"""
+پخش زنده تغییرات موجودی لات‌ها (Server-Sent Events)
+
+هر پردازش ASGI یک پخش‌کننده دارد: تا وقتی حداقل یک نمایشگر وصل است، یک وظیفه
+پس‌زمینه هر LIVE_POLL_INTERVAL ثانیه ردیف‌های جدید خوراک تغییرات (kind=inventory) را با
+یک کوئری می‌خواند، موجودی لات‌های تغییر کرده را با یک کوئری دیگر می‌گیرد و به صف همه
+نمایشگرهای همان انبار می‌فرستد. پس هزینه پایگاه داده به تعداد پردازش‌ها بستگی دارد نه
+تعداد نمایشگرها.
+
+زیر WSGI (gunicorn همگام، runserver) پاسخ جریانی کل worker را نگه می‌دارد و بافر
+می‌شود؛ آن‌جا هر درخواست فقط یک دور خواندن از موقعیت Last-Event-ID است (long_poll_body)
+و بلافاصله بسته می‌شود. EventSource پس از retry دوباره وصل می‌شود؛ اشتراک بین
+نمایشگرها فقط زیر ASGI است.
+"""
+import asyncio
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from .changefeed import advance, decode_cursor, encode_cursor, feed_position, pending_entries
+from .models import ChangeLogEntry, Inventory
+
+
+def poll_interval():
+    return getattr(settings, 'LIVE_POLL_INTERVAL', 2)
+
+
+class InventoryBroadcaster:
+    """پخش‌کننده یک حلقه رویداد؛ مشترک‌ها صف asyncio با فیلتر انبار هستند"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.task = None
+        self.last_seen = None
+        self.gaps = []
+        self.sent = {}
+
+    def subscribe(self, warehouse_id=None):
+        """ثبت یک نمایشگر؛ warehouse_id خالی یعنی همه انبارها"""
+        queue = asyncio.Queue(maxsize=getattr(settings, 'LIVE_QUEUE_SIZE', 500))
+        self.subscribers[queue] = warehouse_id
+        if self.task is None or self.task.done():
+            # پس از دوره بی‌نمایشگر از موقعیت فعلی خوراک شروع می‌شود نه آخرین دور قبلی
+            self.last_seen = None
+            self.gaps = []
+            self.sent = {}
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.pop(queue, None)
+
+    async def run(self):
+        while self.subscribers:
+            try:
+                changes = await sync_to_async(self.poll)()
+            except DatabaseError:
+                # خطای گذرای پایگاه داده؛ دور بعد دوباره تلاش می‌شود
+                changes = []
+            for change in changes:
+                self.publish(change)
+            await asyncio.sleep(poll_interval())
+        self.task = None
+
+    def publish(self, change):
+        for queue, warehouse_id in list(self.subscribers.items()):
+            if warehouse_id is not None and warehouse_id != change['warehouse']:
+                continue
+            if queue.full():
+                # نمایشگر کند: قدیمی‌ترین رویداد کنار گذاشته می‌شود
+                queue.get_nowait()
+            queue.put_nowait(change)
+
+    def poll(self):
+        """
+        خواندن تغییرات موجودی از آخرین دور (اجرا در thread)
+        موجودی تکراری دوباره فرستاده نمی‌شود.
+        """
+        if self.last_seen is None:
+            self.last_seen, self.gaps = feed_position()
+            return []
+        changes, self.last_seen, self.gaps = read_balances(self.last_seen, self.gaps)
+        fresh = []
+        for change in changes:
+            balance = (change['on_hand'], change['on_hand_value'])
+            if self.sent.get(change['inventory']) == balance:
+                continue
+            self.sent[change['inventory']] = balance
+            fresh.append(change)
+        return fresh
+
+
+def page_size():
+    return getattr(settings, 'CHANGE_FEED_MAX_PAGE_SIZE', 1000)
+
+
+def read_balances(after, gaps):
+    """
+    موجودی فعلی لات‌هایی که بعد از موقعیت (after، gaps) در خوراک تغییرات آمده‌اند
+    مثل خوراک تغییرات، شکاف شماره‌های هنوز commit نشده باز می‌ماند و دور بعد دوباره
+    خوانده می‌شود تا تراکنشی که دیرتر commit شده جا نماند. خوراک در صفحه‌های
+    CHANGE_FEED_MAX_PAGE_SIZE ردیفی خوانده می‌شود تا موقعیت قدیمی کل جدول را یک‌جا نخواند؛
+    هر لات فقط یک بار در خروجی می‌آید.
+    خروجی: (تغییرات، after، gaps)
+    """
+    limit = page_size()
+    changes = {}
+    while True:
+        # شکاف‌ها روی همه نوع‌ها حساب می‌شوند؛ نوع در پایتون فیلتر می‌شود
+        rows = list(
+            pending_entries(ChangeLogEntry.objects.all(), after, gaps).order_by('pk')
+            .values_list('pk', 'kind', 'object_id')[:limit]
+        )
+        after, gaps = advance(after, gaps, [pk for pk, _, _ in rows])
+        lot_ids = {object_id for _, kind, object_id in rows if kind == 'inventory'} - changes.keys()
+        if lot_ids:
+            lots = Inventory.objects.with_balance().filter(pk__in=lot_ids).values_list(
+                'pk', 'warehouse_id', 'material_type_id', 'supplier_id', 'on_hand', 'on_hand_value'
+            )
+            for pk, warehouse_id, material_type_id, supplier_id, on_hand, on_hand_value in lots:
+                changes[pk] = {
+                    'inventory': pk,
+                    'warehouse': warehouse_id,
+                    'material_type': material_type_id,
+                    'supplier': supplier_id,
+                    'on_hand': on_hand,
+                    'on_hand_value': on_hand_value,
+                }
+        if len(rows) < limit:
+            return list(changes.values()), after, gaps
+
+
+def is_pruned(after):
+    """موقعیتی که ردیف‌های بعد از آن پاک شده‌اند (prune_change_feed)؛ باید از حالا شروع کند"""
+    oldest = ChangeLogEntry.objects.order_by('pk').values_list('pk', flat=True).first()
+    return oldest is not None and after < oldest - 1
+
+
+def long_poll_body(last_event_id, warehouse_id=None):
+    """
+    بدنه SSE یک پاسخ کوتاه زیر WSGI: تغییرات بعد از Last-Event-ID و در پایان شناسه
+    رویداد (توکن خوراک) که EventSource در اتصال بعدی برمی‌گرداند
+    اولین اتصال، شناسه نامعتبر یا شناسه قدیمی‌تر از ردیف‌های نگه‌داشته شده فقط موقعیت
+    فعلی خوراک را می‌گیرد.
+    """
+    cursor = decode_cursor(last_event_id) if last_event_id else None
+    if cursor is None or is_pruned(cursor[0]):
+        changes = []
+        after, gaps = feed_position()
+    else:
+        changes, after, gaps = read_balances(*cursor)
+    parts = [f'retry: {int(poll_interval() * 1000)}\n\n']
+    for change in changes:
+        if warehouse_id is None or change['warehouse'] == warehouse_id:
+            parts.append(sse_event('balance', json.dumps(change)))
+    # رویداد بدون data فقط شناسه آخرین رویداد مرورگر را عوض می‌کند
+    parts.append(f'id: {encode_cursor(after, gaps)}\n\n')
+    return ''.join(parts)
+
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def broadcaster():
+    """پخش‌کننده حلقه رویداد جاری"""
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = InventoryBroadcaster()
+    return _broadcasters[loop]
+
+
+def sse_event(event, data, event_id=None):
+    """قالب یک رویداد SSE"""
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,141 @@
+"""
+محاسبه ارزش موجودی و بهای تمام‌شده برای سوابق موجود
+
+همه ورودی‌ها، خروجی‌ها و انتقال‌ها به ترتیب ثبت در یک گذر مرتب خوانده می‌شوند و
+ارزش هر لات، بهای هر خروجی و سطرهای تخصیص آن و (در روش FIFO) لایه‌های باز
+دوباره ساخته می‌شوند. مقدار موجودی (current_quantity) تغییر نمی‌کند.
+"""
+import heapq
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import CostLayer, Inventory, StockIn, StockOut, StockOutAllocation, StockTransfer
+from inventory.posting import compact_inventory_counters
+from inventory.valuation import FIFO, LotState, valuation_method
+
+
+class Command(BaseCommand):
+    help = 'محاسبه ارزش موجودی و بهای تمام‌شده سوابق موجود در یک گذر مرتب'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='تعداد ردیف در هر bulk_update')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fifo = valuation_method() == FIFO
+        # ارزش خانه‌های شمارنده باید پیش از بازنویسی stock_value در ردیف اصلی باشد
+        compact_inventory_counters()
+
+        lots = defaultdict(lambda: LotState(fifo=fifo))
+        # ترتیب لات‌های هر (انبار، کالا) بر اساس اولین ورود
+        lot_order = defaultdict(list)
+
+        allocations = defaultdict(list)
+        for allocation in StockOutAllocation.objects.order_by('id').values('id', 'stock_out_id', 'supplier_id', 'quantity').iterator():
+            allocations[allocation['stock_out_id']].append(allocation)
+
+        def lot(warehouse_id, material_type_id, supplier_id):
+            key = (warehouse_id, material_type_id, supplier_id)
+            if key not in lots:
+                lot_order[(warehouse_id, material_type_id)].append(supplier_id)
+            return lots[key]
+
+        def fifo_issue(warehouse_id, material_type_id, quantity):
+            """برداشت FIFO از لات‌های (انبار، کالا)؛ خروجی: [(supplier_id, مقدار، بها، تکه‌ها)]"""
+            taken = []
+            for supplier_id in lot_order[(warehouse_id, material_type_id)]:
+                if quantity <= 0:
+                    break
+                source = lots[(warehouse_id, material_type_id, supplier_id)]
+                take = min(max(source.quantity, 0), quantity)
+                if take <= 0:
+                    continue
+                cost, chunks = source.issue(take)
+                taken.append((supplier_id, take, cost, chunks))
+                quantity -= take
+            return taken
+
+        def ordered(queryset, kind, fields):
+            return ((row['created_at'], kind, row['id'], row) for row in
+                    queryset.order_by('created_at', 'id').values('id', 'created_at', *fields).iterator())
+
+        movements = heapq.merge(
+            ordered(StockIn.objects.filter(warehouse__isnull=False), 0,
+                    ['warehouse_id', 'material_type_id', 'supplier_id', 'quantity', 'unit_price']),
+            ordered(StockTransfer.objects.all(), 1,
+                    ['source_warehouse_id', 'destination_warehouse_id', 'material_type_id', 'quantity']),
+            ordered(StockOut.objects.filter(warehouse__isnull=False), 2,
+                    ['warehouse_id', 'material_type_id', 'supplier_id', 'quantity']),
+        )
+
+        stock_out_costs = []
+        allocation_costs = []
+        count = 0
+        for _, kind, _, row in movements:
+            count += 1
+            quantity = row['quantity'] or 0
+            if quantity <= 0:
+                continue
+
+            if kind == 0:
+                lot(row['warehouse_id'], row['material_type_id'], row['supplier_id']).receive(
+                    quantity, row['unit_price'] or 0, row['id'])
+
+            elif kind == 1:
+                if row['source_warehouse_id']:
+                    taken = fifo_issue(row['source_warehouse_id'], row['material_type_id'], quantity)
+                else:
+                    taken = [(None, quantity, 0, [(quantity, 0)])]
+                if row['destination_warehouse_id']:
+                    for supplier_id, take, cost, chunks in taken:
+                        lot(row['destination_warehouse_id'], row['material_type_id'], supplier_id).receive_issued(take, cost, chunks)
+
+            else:
+                total_cost = 0
+                lines = allocations.get(row['id'])
+                if lines:
+                    for line in lines:
+                        source = lot(row['warehouse_id'], row['material_type_id'], line['supplier_id'])
+                        cost, _ = source.issue(line['quantity'])
+                        allocation_costs.append(StockOutAllocation(pk=line['id'], cost=cost))
+                        total_cost += cost
+                elif row['supplier_id']:
+                    cost, _ = lot(row['warehouse_id'], row['material_type_id'], row['supplier_id']).issue(quantity)
+                    total_cost += cost
+                else:
+                    total_cost += sum(cost for _, _, cost, _ in fifo_issue(row['warehouse_id'], row['material_type_id'], quantity))
+                stock_out_costs.append(StockOut(pk=row['id'], cost_of_goods=total_cost))
+
+        inventories = []
+        layers = []
+        for inventory in Inventory.objects.only('id', 'warehouse_id', 'material_type_id', 'supplier_id', 'current_quantity').iterator():
+            state = lots.get((inventory.warehouse_id, inventory.material_type_id, inventory.supplier_id))
+            on_hand = inventory.current_quantity or 0
+            if state is None or on_hand <= 0:
+                inventory.stock_value = 0
+            elif state.quantity == on_hand:
+                inventory.stock_value = state.value
+            else:
+                # موجودی شمارش دستی با سوابق نمی‌خواند - ارزش به بهای میانگین
+                inventory.stock_value = state.value * on_hand // state.quantity if state.quantity > 0 else 0
+            inventories.append(inventory)
+            if fifo and state is not None:
+                layers.extend(
+                    CostLayer(inventory_id=inventory.pk, stock_in_id=layer.source, quantity=layer.remaining,
+                              remaining_quantity=layer.remaining, unit_cost=layer.unit_cost)
+                    for layer in state.open_layers()
+                )
+
+        with transaction.atomic():
+            StockOut.objects.bulk_update(stock_out_costs, ['cost_of_goods'], batch_size=batch_size)
+            StockOutAllocation.objects.bulk_update(allocation_costs, ['cost'], batch_size=batch_size)
+            Inventory.objects.bulk_update(inventories, ['stock_value'], batch_size=batch_size)
+            if fifo:
+                CostLayer.objects.all().delete()
+                CostLayer.objects.bulk_create(layers, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} حرکت بازپخش شد؛ {len(stock_out_costs)} خروجی و {len(inventories)} لات بروزرسانی شد."
+        ))
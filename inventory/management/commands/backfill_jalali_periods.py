@@ -0,0 +1,27 @@
+"""
+پر کردن سال و ماه شمسی (jalali_year، jalali_month) ورودی‌ها، خروجی‌ها، انتقال‌ها و جمع روزانه
+
+ردیف‌ها به ترتیب id در دسته‌های محدود خوانده می‌شوند و ردیف‌های هم‌ماه هر دسته با یک
+UPDATE پر می‌شوند؛ جمع روزانه با یک UPDATE برای هر روز. پیش‌فرض فقط ردیف‌های خالی است؛ با --all همه ردیف‌ها دوباره محاسبه
+می‌شوند (مثلاً پس از تغییر BUSINESS_TIME_ZONE).
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.models import DailyMovementRollup, StockIn, StockOut, StockTransfer
+from inventory.utils import backfill_jalali_periods, backfill_rollup_jalali_periods
+
+
+class Command(BaseCommand):
+    help = 'پر کردن ستون‌های سال و ماه شمسی حرکات انبار از تاریخ دستی یا تاریخ ثبت'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='تعداد ردیف در هر دسته')
+        parser.add_argument('--all', action='store_true', help='محاسبه دوباره همه ردیف‌ها، نه فقط ردیف‌های خالی')
+
+    def handle(self, *args, **options):
+        for model in (StockIn, StockOut, StockTransfer):
+            updated = backfill_jalali_periods(model, max(options['batch_size'], 1), only_missing=not options['all'])
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {updated} ردیف")
+        updated = backfill_rollup_jalali_periods(DailyMovementRollup, only_missing=not options['all'])
+        self.stdout.write(f"{DailyMovementRollup._meta.verbose_name_plural}: {updated} ردیف")
+        self.stdout.write(self.style.SUCCESS('سال و ماه شمسی حرکات پر شد'))
@@ -0,0 +1,52 @@
+"""
+مقایسه فیلتر بازه تاریخ قدیم و جدید روی فهرست ورودی‌ها و خروجی‌ها
+
+قدیم: created_at__date (ستون داخل تابع تبدیل تاریخ - ایندکس استفاده نمی‌شود)
+جدید: بازه نیم‌باز ساده روی created_at یا manual_date که با ایندکس پیمایش می‌شود.
+برای هر کدام طرح اجرای پایگاه داده (EXPLAIN) و زمان میانگین اجرا چاپ می‌شود.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import StockIn, StockOut
+from inventory.utils import day_range_bounds, filter_date_range
+
+
+class Command(BaseCommand):
+    help = 'مقایسه طرح اجرا و زمان فیلتر بازه تاریخ قدیم (created_at__date) و جدید (بازه ایندکس شده)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', required=True, help='تاریخ شروع شمسی (مثلاً 1403/01/01)')
+        parser.add_argument('--to', dest='end', required=True, help='تاریخ پایان شمسی (شامل)')
+        parser.add_argument('--repeat', type=int, default=20, help='تعداد اجرای هر کوئری برای زمان‌سنجی')
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        start_date, end_exclusive, _, _ = day_range_bounds(start, end)
+        if not start_date or not end_exclusive:
+            raise CommandError('تاریخ شروع یا پایان نامعتبر است')
+
+        for model in (StockIn, StockOut):
+            queryset = model.objects.order_by('-created_at', '-pk')
+            variants = [
+                ('قدیم: created_at__date', queryset.filter(
+                    created_at__date__gte=start_date, created_at__date__lt=end_exclusive)),
+                ('جدید: created_at', filter_date_range(queryset, start, end, 'created')),
+                ('جدید: manual_date', filter_date_range(queryset, start, end, 'manual')),
+                ('جدید: تاریخ کاری', filter_date_range(queryset, start, end, 'business')),
+            ]
+            self.stdout.write(self.style.MIGRATE_HEADING(model._meta.verbose_name_plural))
+            for label, variant in variants:
+                count, elapsed = self.measure(variant[:20], options['repeat'])
+                self.stdout.write(f"{label}: {count} ردیف، میانگین {elapsed * 1000:.2f} میلی‌ثانیه")
+                for line in variant[:20].explain().splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def measure(self, queryset, repeat):
+        """خروجی: (تعداد ردیف، میانگین زمان اجرا به ثانیه)"""
+        count = 0
+        started = time.perf_counter()
+        for _ in range(max(repeat, 1)):
+            count = len(list(queryset.all()))
+        return count, (time.perf_counter() - started) / max(repeat, 1)
@@ -0,0 +1,93 @@
+"""
+سنجش توان ثبت هم‌زمان روی یک کالای پرتردد
+
+برای هر تعداد کارگر (thread) تعدادی ورودی روی یک لات ثبت می‌شود؛ یک بار با ردیف
+عادی (همه ثبت‌ها روی یک قفل ردیف صف می‌کشند) و یک بار با شمارنده تفکیک شده (is_hot).
+hold-ms کار باقی‌مانده درخواست پس از ثبت و پیش از commit را شبیه‌سازی می‌کند.
+
+نتیجه معنادار فقط روی PostgreSQL است؛ SQLite کل پایگاه داده را برای نوشتن قفل می‌کند.
+"""
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from inventory.models import Inventory, MaterialType, StockIn, Supplier, Warehouse
+from inventory.posting import compact_inventory_counters
+
+
+class Command(BaseCommand):
+    help = 'مقایسه توان ثبت هم‌زمان روی یک لات با و بدون شمارنده تفکیک شده'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,8', help='تعداد کارگرها، جدا شده با ویرگول')
+        parser.add_argument('--postings', type=int, default=200, help='تعداد ثبت هر کارگر')
+        parser.add_argument('--hold-ms', type=float, default=5, help='مکث داخل تراکنش پس از ثبت (میلی‌ثانیه)')
+        parser.add_argument('--user', help='نام کاربری ثبت کننده (پیش‌فرض: اولین مدیر)')
+
+    def handle(self, *args, **options):
+        workers = [int(w) for w in options['workers'].split(',') if w.strip()]
+        postings = options['postings']
+        hold = options['hold_ms'] / 1000
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(is_superuser=True)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('کاربری برای ثبت ورودی‌ها یافت نشد')
+
+        tag = uuid.uuid4().hex[:8]
+        warehouse = Warehouse.objects.create(name=f"benchmark {tag}", code=f"bench-{tag}")
+        material = MaterialType.objects.create(name=f"benchmark {tag}")
+        supplier = Supplier.objects.create(name=f"benchmark {tag}")
+        inventory = Inventory.objects.create(warehouse=warehouse, material_type=material, supplier=supplier)
+
+        try:
+            self.stdout.write(f"{'کارگر':>6} {'عادی (ثبت/ثانیه)':>20} {'تفکیک شده (ثبت/ثانیه)':>24} {'خطا':>6}")
+            for count in workers:
+                results = []
+                for hot in (False, True):
+                    Inventory.objects.filter(pk=inventory.pk).update(is_hot=hot)
+                    results.append(self.run(count, postings, hold, user, warehouse, material, supplier))
+                compact_inventory_counters()
+                failures = sum(failed for _, failed in results)
+                self.stdout.write(f"{count:>6} {results[0][0]:>20.1f} {results[1][0]:>24.1f} {failures:>6}")
+
+            expected = 2 * postings * sum(workers)
+            on_hand = Inventory.objects.with_balance().get(pk=inventory.pk).on_hand
+            self.stdout.write(f"موجودی نهایی {on_hand} (مورد انتظار {expected} منهای ثبت‌های ناموفق)")
+        finally:
+            warehouse.delete()
+            material.delete()
+            supplier.delete()
+
+    def run(self, count, postings, hold, user, warehouse, material, supplier):
+        """اجرای هم‌زمان ثبت‌ها؛ خروجی: (ثبت موفق در ثانیه، تعداد ناموفق)"""
+        failed = []
+
+        def worker():
+            errors = 0
+            try:
+                for _ in range(postings):
+                    try:
+                        with transaction.atomic():
+                            StockIn(warehouse=warehouse, material_type=material, supplier=supplier,
+                                    quantity=1, unit_price=1000, created_by=user).save()
+                            if hold:
+                                time.sleep(hold)
+                    except OperationalError:
+                        errors += 1
+            finally:
+                failed.append(errors)
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        failures = sum(failed)
+        return (count * postings - failures) / elapsed, failures
@@ -0,0 +1,42 @@
+"""
+مقایسه جستجوی قدیم (OR چند icontains روی جدول‌های پیوندی) با نمایه تمام‌متن
+
+برای هر فهرست زمان میانگین گرفتن صفحه اول نتایج و طرح اجرای پایگاه داده چاپ می‌شود.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from inventory.models import Inventory, StockIn, StockOut
+from inventory.search import search
+
+
+class Command(BaseCommand):
+    help = 'مقایسه زمان جستجوی icontains و نمایه تمام‌متن'
+
+    def add_arguments(self, parser):
+        parser.add_argument('query', help='عبارت جستجو')
+        parser.add_argument('--repeat', type=int, default=20, help='تعداد اجرای هر کوئری')
+
+    def handle(self, *args, **options):
+        text, repeat = options['query'], max(options['repeat'], 1)
+        lists = [
+            (StockIn.objects.order_by('-created_at', '-pk'),
+             Q(material_type__name__icontains=text) | Q(supplier__name__icontains=text) | Q(invoice_number__icontains=text)),
+            (StockOut.objects.order_by('-created_at', '-pk'),
+             Q(material_type__name__icontains=text) | Q(customer__name__icontains=text) | Q(invoice_number__icontains=text)),
+            (Inventory.objects.order_by('material_type__name'),
+             Q(material_type__name__icontains=text) | Q(material_type__description__icontains=text)),
+        ]
+        for queryset, old_filter in lists:
+            self.stdout.write(self.style.MIGRATE_HEADING(queryset.model._meta.verbose_name_plural))
+            for label, variant in (('icontains', queryset.filter(old_filter)), ('نمایه', search(queryset, text))):
+                page = variant[:20]
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    count = len(list(page.all()))
+                elapsed = (time.perf_counter() - started) / repeat
+                self.stdout.write(f"{label}: {count} ردیف، میانگین {elapsed * 1000:.2f} میلی‌ثانیه")
+                for line in page.explain().splitlines():
+                    self.stdout.write(f"    {line}")
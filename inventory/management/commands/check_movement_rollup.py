@@ -0,0 +1,47 @@
+"""
+بررسی همخوانی جدول جمع روزانه حرکات با ورودی‌ها و خروجی‌ها
+
+جمع‌های هر (روز، انبار، کالا، هویت کالا، مشتری) یک بار از جدول‌های حرکات و یک بار از
+جدول جمع روزانه محاسبه و مقایسه می‌شوند. در صورت اختلاف، فرمان با خطا تمام می‌شود.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import DailyMovementRollup, StockIn, StockOut
+from inventory.rollup import ROLLUP_FIELDS, in_day_range, ledger_rollup, stored_rollup
+
+from .rebuild_movement_rollup import day_range_options
+
+
+class Command(BaseCommand):
+    help = 'مقایسه جمع روزانه حرکات با جدول‌های ورودی و خروجی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', help='از روز (مثلاً 1403/01/01)')
+        parser.add_argument('--to', help='تا روز (شامل)')
+        parser.add_argument('--limit', type=int, default=20, help='حداکثر تعداد اختلاف نمایش داده شده')
+
+    def handle(self, *args, **options):
+        start, end = day_range_options(options)
+        expected = ledger_rollup(in_day_range(StockIn.objects.all(), start, end),
+                                 in_day_range(StockOut.objects.all(), start, end))
+        rows = DailyMovementRollup.objects.all()
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+        stored = stored_rollup(rows)
+
+        zero = [0] * len(ROLLUP_FIELDS)
+        mismatches = [
+            (key, expected.get(key, zero), stored.get(key, zero))
+            for key in expected.keys() | stored.keys()
+            if expected.get(key, zero) != stored.get(key, zero)
+        ]
+        mismatches.sort(key=lambda m: (m[0][0], str(m[0][1:])))
+        for key, ledger, table in mismatches[:options['limit']]:
+            diff = ', '.join(f"{field}: {a} != {b}" for field, a, b in zip(ROLLUP_FIELDS, ledger, table) if a != b)
+            self.stdout.write(f"{key[0]} انبار={key[1]} کالا={key[2]} هویت={key[3]} مشتری={key[4]}: {diff}")
+
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} کلید با حرکات همخوانی ندارد؛ rebuild_movement_rollup را اجرا کنید.")
+        self.stdout.write(self.style.SUCCESS(f"{len(expected)} کلید جمع روزانه با حرکات همخوانی دارد."))
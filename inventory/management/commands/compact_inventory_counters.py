@@ -0,0 +1,28 @@
+"""
+فشرده‌سازی خانه‌های شمارنده ردیف‌های موجودی پرتردد
+
+ثبت‌های ردیف‌های is_hot به جای ردیف اصلی در InventoryDelta نوشته می‌شوند. این فرمان
+را دوره‌ای (مثلاً هر دقیقه با cron) اجرا کنید تا جمع خانه‌ها به ردیف اصلی منتقل شود.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.posting import compact_inventory_counters
+
+
+class Command(BaseCommand):
+    help = 'انتقال جمع خانه‌های شمارنده موجودی پرتردد به ردیف‌های اصلی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='اجرای پیوسته با این فاصله (ثانیه)؛ صفر یعنی یک بار')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            updated = compact_inventory_counters()
+            self.stdout.write(self.style.SUCCESS(f"{updated} ردیف موجودی فشرده شد."))
+            if interval <= 0:
+                break
+            time.sleep(interval)
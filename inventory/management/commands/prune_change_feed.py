@@ -0,0 +1,20 @@
+"""
+حذف ردیف‌های قدیمی خوراک تغییرات
+
+پایانه‌هایی که بیش از این مدت همگام نشده‌اند در درخواست بعدی reset می‌گیرند و فهرست‌ها
+را کامل دریافت می‌کنند.
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.changefeed import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'حذف ردیف‌های خوراک تغییرات قدیمی‌تر از چند روز'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='نگهداری تغییرات چند روز اخیر (پیش‌فرض ۳۰)')
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'{deleted} ردیف خوراک تغییرات حذف شد'))
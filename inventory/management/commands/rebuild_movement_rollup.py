@@ -0,0 +1,58 @@
+"""
+بازسازی جدول جمع روزانه حرکات از روی ورودی‌ها و خروجی‌ها
+
+بدون بازه کل جدول و با --from/--to فقط روزهای همان بازه بازسازی می‌شوند (مثلاً برای
+جبران دوره‌ای پس از ورود مستقیم داده به پایگاه داده). تاریخ‌ها شمسی (1403/01/01) یا
+میلادی (2024-03-20). خانه‌های (slot) هر کلید در خانه صفر جمع می‌شوند.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.models import DailyMovementRollup, StockIn, StockOut
+from inventory.rollup import ROLLUP_BATCH_SIZE, in_day_range, ledger_rollup, rollup_row
+from inventory.utils import parse_persian_date
+
+
+def day_range_options(options):
+    """خواندن --from و --to؛ خروجی: (start, end)"""
+    days = []
+    for name in ('from', 'to'):
+        value = options.get(name)
+        day = None
+        if value:
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                day = parse_persian_date(value)
+            if day is None:
+                raise CommandError(f"تاریخ نامعتبر: {value}")
+        days.append(day)
+    return tuple(days)
+
+
+class Command(BaseCommand):
+    help = 'بازسازی جمع روزانه حرکات انبار از جدول‌های ورودی و خروجی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', help='از روز (مثلاً 1403/01/01)')
+        parser.add_argument('--to', help='تا روز (شامل)')
+
+    def handle(self, *args, **options):
+        start, end = day_range_options(options)
+        totals = ledger_rollup(in_day_range(StockIn.objects.all(), start, end),
+                               in_day_range(StockOut.objects.all(), start, end))
+
+        rows = DailyMovementRollup.objects.all()
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+        with transaction.atomic():
+            deleted, _ = rows.delete()
+            created = DailyMovementRollup.objects.bulk_create([
+                rollup_row(key, values) for key, values in totals.items() if any(values)
+            ], batch_size=ROLLUP_BATCH_SIZE)
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ردیف قبلی حذف و {len(created)} ردیف جمع روزانه ساخته شد."))
@@ -0,0 +1,21 @@
+"""
+بازسازی نمایه جستجو (SearchEntry و جدول FTS5 در SQLite) از جدول‌های اصلی
+
+پس از اجرای مهاجرت نمایه جستجو یک بار لازم است؛ بعد از آن سیگنال‌ها و ثبت‌های گروهی
+نمایه را همگام نگه می‌دارند.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'بازسازی نمایه جستجوی تمام‌متن ورودی‌ها، خروجی‌ها و موجودی'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = rebuild_index()
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count} ردیف")
+        self.stdout.write(self.style.SUCCESS('نمایه جستجو بازسازی شد'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventory_supplier_stockin_customer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockOutAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='مقدار تخصیص')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='inventory.inventory', verbose_name='لات موجودی')),
+                ('stock_out', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='inventory.stockout', verbose_name='خروجی انبار')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.supplier', verbose_name='هویت کالا')),
+            ],
+            options={
+                'verbose_name': 'تخصیص خروجی',
+                'verbose_name_plural': 'تخصیص\u200cهای خروجی',
+            },
+        ),
+    ]
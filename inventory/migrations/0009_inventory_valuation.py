@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stockoutallocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='stock_value',
+            field=models.BigIntegerField(default=0, verbose_name='ارزش موجودی'),
+        ),
+        migrations.AddField(
+            model_name='stockout',
+            name='cost_of_goods',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='بهای تمام\u200cشده'),
+        ),
+        migrations.AddField(
+            model_name='stockoutallocation',
+            name='cost',
+            field=models.BigIntegerField(default=0, verbose_name='بهای تمام\u200cشده'),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='مقدار اولیه')),
+                ('remaining_quantity', models.IntegerField(verbose_name='مقدار باقی\u200cمانده')),
+                ('unit_cost', models.IntegerField(default=0, verbose_name='بهای واحد')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.inventory', verbose_name='لات موجودی')),
+                ('stock_in', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.stockin', verbose_name='ورودی انبار')),
+            ],
+            options={
+                'verbose_name': 'لایه بهای FIFO',
+                'verbose_name_plural': 'لایه\u200cهای بهای FIFO',
+                'indexes': [models.Index(fields=['inventory', 'remaining_quantity'], name='costlayer_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_inventory_valuation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='is_hot',
+            field=models.BooleanField(default=False, verbose_name='پرتردد (شمارنده تفکیک شده)'),
+        ),
+        migrations.CreateModel(
+            name='InventoryDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='شماره خانه')),
+                ('quantity', models.IntegerField(default=0, verbose_name='تغییر مقدار')),
+                ('value', models.BigIntegerField(default=0, verbose_name='تغییر ارزش')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delta_slots', to='inventory.inventory', verbose_name='موجودی')),
+            ],
+            options={
+                'verbose_name': 'خانه شمارنده موجودی',
+                'verbose_name_plural': 'خانه\u200cهای شمارنده موجودی',
+                'unique_together': {('inventory', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_inventory_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('quantity_in', models.BigIntegerField(default=0, verbose_name='مقدار ورودی')),
+                ('quantity_out', models.BigIntegerField(default=0, verbose_name='مقدار خروجی')),
+                ('value_in', models.BigIntegerField(default=0, verbose_name='ارزش ورودی')),
+                ('value_out', models.BigIntegerField(default=0, verbose_name='ارزش فروش خروجی')),
+                ('cost_out', models.BigIntegerField(default=0, verbose_name='بهای تمام\u200cشده خروجی')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.customer', verbose_name='مشتری')),
+                ('material_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.materialtype', verbose_name='نام کالا')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.supplier', verbose_name='هویت کالا')),
+                ('warehouse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.warehouse', verbose_name='انبار')),
+            ],
+            options={
+                'verbose_name': 'جمع روزانه حرکات',
+                'verbose_name_plural': 'جمع روزانه حرکات',
+                'indexes': [models.Index(fields=['day', 'material_type'], name='rollup_day_material_idx')],
+            },
+        ),
+    ]
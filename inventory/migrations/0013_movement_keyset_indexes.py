@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_daily_movement_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['created_at', 'id'], name='stockin_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['created_at', 'id'], name='stockout_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_movement_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['manual_date'], name='stockin_manual_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['manual_date'], name='stockout_manual_date_idx'),
+        ),
+    ]
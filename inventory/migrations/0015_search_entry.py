@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+# SQLite: جدول FTS5 با محتوای خارجی که با تریگرها همگام می‌ماند
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE inventory_searchentry_fts USING fts5(
+        body, content='inventory_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )""",
+    """CREATE TRIGGER inventory_searchentry_ai AFTER INSERT ON inventory_searchentry BEGIN
+        INSERT INTO inventory_searchentry_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER inventory_searchentry_ad AFTER DELETE ON inventory_searchentry BEGIN
+        INSERT INTO inventory_searchentry_fts(inventory_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER inventory_searchentry_au AFTER UPDATE ON inventory_searchentry BEGIN
+        INSERT INTO inventory_searchentry_fts(inventory_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO inventory_searchentry_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS inventory_searchentry_au',
+    'DROP TRIGGER IF EXISTS inventory_searchentry_ad',
+    'DROP TRIGGER IF EXISTS inventory_searchentry_ai',
+    'DROP TABLE IF EXISTS inventory_searchentry_fts',
+]
+
+# PostgreSQL: ایندکس GIN روی tsvector همان متن (جستجوی پیشوندی با :*)
+POSTGRES_FORWARD = [
+    "CREATE INDEX inventory_searchentry_tsv_idx ON inventory_searchentry USING gin (to_tsvector('simple', body))",
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS inventory_searchentry_tsv_idx',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_movement_manual_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='نوع')),
+                ('object_id', models.BigIntegerField(verbose_name='شناسه ردیف')),
+                ('body', models.TextField(verbose_name='متن جستجو')),
+            ],
+            options={
+                'verbose_name': 'نمایه جستجو',
+                'verbose_name_plural': 'نمایه جستجو',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:42
+
+import re
+
+from django.db import migrations, models
+
+
+# همان inventory.search.normalize_text در زمان این مهاجرت؛ کپی شده تا مهاجرت به کد برنامه وابسته نباشد
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', '‌': ' ', '‍': None, 'ـ': None,
+    **{chr(code): None for code in range(0x064B, 0x0653)},  # اعراب
+    **{persian: str(i) for i, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(i) for i, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+
+WORD = re.compile(r'\w+')
+
+
+def normalize_text(*values):
+    text = ' '.join(str(value) for value in values if value)
+    return ' '.join(WORD.findall(text.translate(CHARACTER_MAP).lower()))
+
+
+def fill_normalized_names(apps, schema_editor):
+    for model_name in ('Warehouse', 'MaterialType', 'Supplier', 'Customer'):
+        model = apps.get_model('inventory', model_name)
+        rows = [row for row in model.objects.only('id', 'name')]
+        for row in rows:
+            row.normalized_name = normalize_text(row.name)[:200]
+        model.objects.bulk_update(rows, ['normalized_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_search_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='نام نرمال شده'),
+        ),
+        migrations.AddField(
+            model_name='materialtype',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='نام نرمال شده'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='نام نرمال شده'),
+        ),
+        migrations.AddField(
+            model_name='warehouse',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='نام نرمال شده'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['normalized_name', 'id'], name='customer_normalized_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialtype',
+            index=models.Index(fields=['normalized_name', 'id'], name='materialtype_normalized_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['normalized_name', 'id'], name='supplier_normalized_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warehouse',
+            index=models.Index(fields=['normalized_name', 'id'], name='warehouse_normalized_idx'),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_normalized_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='نوع')),
+                ('object_id', models.BigIntegerField(verbose_name='شناسه ردیف')),
+                ('action', models.CharField(choices=[('save', 'ذخیره'), ('delete', 'حذف')], default='save', max_length=6, verbose_name='عملیات')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='زمان تغییر')),
+            ],
+            options={
+                'verbose_name': 'تغییر',
+                'verbose_name_plural': 'خوراک تغییرات',
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:04
+
+from zoneinfo import ZoneInfo
+
+import jdatetime
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def fill_jalali_periods(apps, schema_editor):
+    """
+    سال و ماه شمسی ردیف‌های موجود در دورهای کلید اصلی؛ ردیف‌های یک ماه در هر دور با یک UPDATE
+    منطق inventory.utils.jalali_period (تاریخ دستی، وگرنه روز created_at در منطقه زمانی
+    کسب‌وکار) کپی شده تا این مهاجرت به کد برنامه وابسته نباشد.
+    """
+    tz = ZoneInfo(getattr(settings, 'BUSINESS_TIME_ZONE', 'Asia/Tehran'))
+    days = {}
+
+    def period(manual_date, created_at):
+        if manual_date:
+            day = manual_date
+        elif timezone.is_aware(created_at):
+            day = created_at.astimezone(tz).date()
+        else:
+            day = created_at.date()
+        if day not in days:
+            jalali = jdatetime.date.fromgregorian(date=day)
+            days[day] = (jalali.year, jalali.month)
+        return days[day]
+
+    for model_name in ('StockIn', 'StockOut', 'StockTransfer'):
+        model = apps.get_model('inventory', model_name)
+        fields = ['pk', 'created_at']
+        has_manual_date = any(field.name == 'manual_date' for field in model._meta.get_fields())
+        if has_manual_date:
+            fields.append('manual_date')
+        last_pk = 0
+        while True:
+            batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(*fields)[:BATCH_SIZE])
+            if not batch:
+                break
+            periods = {}
+            for row in batch:
+                manual_date = row[2] if has_manual_date else None
+                periods.setdefault(period(manual_date, row[1] or timezone.now()), []).append(row[0])
+            for (year, month), pks in periods.items():
+                model.objects.filter(pk__in=pks).update(jalali_year=year, jalali_month=month)
+            last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockin',
+            name='jalali_month',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='ماه شمسی'),
+        ),
+        migrations.AddField(
+            model_name='stockin',
+            name='jalali_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='سال شمسی'),
+        ),
+        migrations.AddField(
+            model_name='stockout',
+            name='jalali_month',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='ماه شمسی'),
+        ),
+        migrations.AddField(
+            model_name='stockout',
+            name='jalali_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='سال شمسی'),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='jalali_month',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='ماه شمسی'),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='jalali_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='سال شمسی'),
+        ),
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='stockin_jalali_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='stockout_jalali_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransfer',
+            index=models.Index(fields=['jalali_year', 'jalali_month'], name='transfer_jalali_period_idx'),
+        ),
+        migrations.RunPython(fill_jalali_periods, migrations.RunPython.noop),
+    ]
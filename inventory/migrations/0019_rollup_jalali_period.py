@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:15
+
+import jdatetime
+from django.db import migrations, models
+
+
+def fill_rollup_jalali_periods(apps, schema_editor):
+    """سال و ماه شمسی ردیف‌های جمع روزانه با یک UPDATE به ازای هر روز (مستقل از کد برنامه)"""
+    DailyMovementRollup = apps.get_model('inventory', 'DailyMovementRollup')
+    for day in list(DailyMovementRollup.objects.order_by().values_list('day', flat=True).distinct()):
+        jalali = jdatetime.date.fromgregorian(date=day)
+        DailyMovementRollup.objects.filter(day=day).update(jalali_year=jalali.year, jalali_month=jalali.month)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_jalali_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailymovementrollup',
+            name='jalali_month',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='ماه شمسی'),
+        ),
+        migrations.AddField(
+            model_name='dailymovementrollup',
+            name='jalali_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='سال شمسی'),
+        ),
+        migrations.AddIndex(
+            model_name='dailymovementrollup',
+            index=models.Index(fields=['jalali_year', 'material_type', 'warehouse', 'jalali_month'], name='rollup_jalali_period_idx'),
+        ),
+        migrations.RunPython(fill_rollup_jalali_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_rollup_jalali_period'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockin',
+            name='stockin_jalali_period_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stockout',
+            name='stockout_jalali_period_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['jalali_year', 'jalali_month', 'supplier'], name='stockin_period_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['jalali_year', 'jalali_month', 'customer'], name='stockout_period_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:04
+
+from zoneinfo import ZoneInfo
+
+import jdatetime
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def rebuild_rollup(apps, schema_editor):
+    """
+    بازسازی جمع روزانه با روز تاریخ ثبت در منطقه زمانی کسب‌وکار (قبلاً UTC)
+    همه ردیف‌ها در خانه صفر ساخته می‌شوند؛ منطق با inventory.rollup یکی است ولی
+    مستقل از کد برنامه نوشته شده تا با تغییر آن کد این مهاجرت عوض نشود.
+    """
+    DailyMovementRollup = apps.get_model('inventory', 'DailyMovementRollup')
+    StockIn = apps.get_model('inventory', 'StockIn')
+    StockOut = apps.get_model('inventory', 'StockOut')
+    StockOutAllocation = apps.get_model('inventory', 'StockOutAllocation')
+    tz = ZoneInfo(getattr(settings, 'BUSINESS_TIME_ZONE', 'Asia/Tehran'))
+
+    def day(prefix=''):
+        return Coalesce(f'{prefix}manual_date', TruncDate(f'{prefix}created_at', tzinfo=tz))
+
+    totals = {}
+
+    def add(key, quantity_in=0, quantity_out=0, value_in=0, value_out=0, cost_out=0):
+        current = totals.setdefault(key, [0, 0, 0, 0, 0])
+        for i, amount in enumerate((quantity_in, quantity_out, value_in, value_out, cost_out)):
+            current[i] += amount or 0
+
+    for r in (
+        StockIn.objects.values('warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', day=day())
+        .annotate(
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_value=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+        )
+        .order_by()
+    ):
+        add((r['day'], r['warehouse_id'], r['material_type_id'], r['supplier_id'], r['customer_id']),
+            quantity_in=r['total_quantity'], value_in=r['total_value'])
+
+    for r in (
+        StockOutAllocation.objects
+        .values('supplier_id', day=day('stock_out__'), warehouse=F('stock_out__warehouse_id'),
+                material=F('stock_out__material_type_id'), buyer=F('stock_out__customer_id'))
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * Coalesce('stock_out__unit_price', 0), output_field=BigIntegerField()),
+            total_cost=Sum('cost'),
+        )
+        .order_by()
+    ):
+        add((r['day'], r['warehouse'], r['material'], r['supplier_id'], r['buyer']),
+            quantity_out=r['total_quantity'], value_out=r['total_value'], cost_out=r['total_cost'])
+
+    for r in (
+        StockOut.objects.filter(allocations__isnull=True)
+        .values('warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', day=day())
+        .annotate(
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_value=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+            total_cost=Sum(Coalesce('cost_of_goods', 0)),
+        )
+        .order_by()
+    ):
+        add((r['day'], r['warehouse_id'], r['material_type_id'], r['supplier_id'], r['customer_id']),
+            quantity_out=r['total_quantity'], value_out=r['total_value'], cost_out=r['total_cost'])
+
+    periods = {}
+    rows = []
+    for key, values in totals.items():
+        if not any(values):
+            continue
+        if key[0] not in periods:
+            jalali = jdatetime.date.fromgregorian(date=key[0])
+            periods[key[0]] = (jalali.year, jalali.month)
+        rows.append(DailyMovementRollup(
+            day=key[0], warehouse_id=key[1], material_type_id=key[2], supplier_id=key[3], customer_id=key[4],
+            quantity_in=values[0], quantity_out=values[1], value_in=values[2], value_out=values[3],
+            cost_out=values[4], jalali_year=periods[key[0]][0], jalali_month=periods[key[0]][1],
+        ))
+    DailyMovementRollup.objects.all().delete()
+    DailyMovementRollup.objects.bulk_create(rows, batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_counterparty_period_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailymovementrollup',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='شماره خانه'),
+        ),
+        migrations.RunPython(rebuild_rollup, migrations.RunPython.noop),
+    ]
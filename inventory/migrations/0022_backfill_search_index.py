@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:40
+
+import re
+
+from django.db import migrations
+
+
+# نوع ← (مدل، فیلدهای متن جستجو) همان inventory.search.SEARCH_FIELDS در زمان این مهاجرت
+SEARCH_FIELDS = {
+    'stockin': ('StockIn', ('material_type__name', 'supplier__name', 'customer__name', 'invoice_number')),
+    'stockout': ('StockOut', ('material_type__name', 'customer__name', 'supplier__name', 'invoice_number')),
+    'inventory': ('Inventory', ('material_type__name', 'material_type__description', 'supplier__name')),
+}
+
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', '‌': ' ', '‍': None, 'ـ': None,
+    **{chr(code): None for code in range(0x064B, 0x0653)},  # اعراب
+    **{persian: str(i) for i, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(i) for i, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+
+WORD = re.compile(r'\w+')
+
+BATCH_SIZE = 1000
+
+
+def normalize_text(*values):
+    text = ' '.join(str(value) for value in values if value)
+    return ' '.join(WORD.findall(text.translate(CHARACTER_MAP).lower()))
+
+
+def backfill_search_index(apps, schema_editor):
+    """
+    نمایه ردیف‌هایی که پیش از 0015 ثبت شده‌اند و SearchEntry ندارند، در دورهای ۱۰۰۰ ردیفی
+    منطق نرمال‌سازی از inventory.search کپی شده تا این مهاجرت به کد برنامه وابسته نباشد.
+    """
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+    for kind, (model_name, fields) in SEARCH_FIELDS.items():
+        model = apps.get_model('inventory', model_name)
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *fields)[:BATCH_SIZE])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            existing = set(SearchEntry.objects.filter(
+                kind=kind, object_id__in=[row[0] for row in rows],
+            ).values_list('object_id', flat=True))
+            SearchEntry.objects.bulk_create([
+                SearchEntry(kind=kind, object_id=pk, body=normalize_text(*values))
+                for pk, *values in rows if pk not in existing
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_rollup_business_day_slots'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
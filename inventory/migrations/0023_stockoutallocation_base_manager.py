@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:15
+
+import django.db.models.manager
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_backfill_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='stockoutallocation',
+            options={'base_manager_name': 'with_supplier', 'verbose_name': 'تخصیص خروجی', 'verbose_name_plural': 'تخصیص\u200cهای خروجی'},
+        ),
+        migrations.AlterModelManagers(
+            name='stockoutallocation',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('with_supplier', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,9 +1,48 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 # مدل‌های انبار آهن
 
-class Warehouse(models.Model):
+class NormalizedNameMixin(models.Model):
+    """نام نرمال شده (حروف عربی/فارسی یکسان، بدون نیم‌فاصله و اعراب) برای جستجوی پیشوندی با ایندکس"""
+    normalized_name = models.CharField(max_length=200, blank=True, editable=False, verbose_name="نام نرمال شده")
+    
+    def save(self, *args, **kwargs):
+        from .search import normalize_text
+        
+        self.normalized_name = normalize_text(self.name)[:200]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        abstract = True
+
+class JalaliPeriodMixin(models.Model):
+    """سال و ماه شمسی حرکت (تاریخ دستی یا روز کاری تاریخ ثبت) برای گروه‌بندی و فیلتر با ایندکس"""
+    jalali_year = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="سال شمسی")
+    jalali_month = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="ماه شمسی")
+    
+    def fill_jalali_period(self):
+        """برای ثبت‌های گروهی (bulk_create) که save فراخوانی نمی‌شود هم استفاده می‌شود"""
+        from .utils import jalali_period
+        
+        self.jalali_year, self.jalali_month = jalali_period(getattr(self, 'manual_date', None), self.created_at)
+    
+    def save(self, *args, **kwargs):
+        self.fill_jalali_period()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'jalali_year', 'jalali_month'}
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        abstract = True
+
+class Warehouse(NormalizedNameMixin):
     """مدل انبار"""
     name = models.CharField(max_length=100, verbose_name="نام انبار")
     code = models.CharField(max_length=20, unique=True, verbose_name="کد انبار")
@@ -20,8 +59,9 @@ class Warehouse(models.Model):
         verbose_name = "انبار"
         verbose_name_plural = "انبارها"
         ordering = ['name']
+        indexes = [models.Index(fields=['normalized_name', 'id'], name='warehouse_normalized_idx')]
 
-class MaterialType(models.Model):
+class MaterialType(NormalizedNameMixin):
     """نام کالا (مثل میلگرد، ورق، نبشی و غیره)"""
     name = models.CharField(max_length=100, verbose_name="نام کالا")
     description = models.TextField(blank=True, verbose_name="توضیحات")
@@ -33,8 +73,9 @@ class MaterialType(models.Model):
     class Meta:
         verbose_name = "نام کالا"
         verbose_name_plural = "نام‌های کالا"
+        indexes = [models.Index(fields=['normalized_name', 'id'], name='materialtype_normalized_idx')]
 
-class Supplier(models.Model):
+class Supplier(NormalizedNameMixin):
     """هویت کالا"""
     name = models.CharField(max_length=200, verbose_name="هویت کالا")
     contact_person = models.CharField(max_length=100, blank=True, verbose_name="شخص رابط")
@@ -48,8 +89,9 @@ class Supplier(models.Model):
     class Meta:
         verbose_name = "هویت کالا"
         verbose_name_plural = "هویت‌های کالا"
+        indexes = [models.Index(fields=['normalized_name', 'id'], name='supplier_normalized_idx')]
 
-class Customer(models.Model):
+class Customer(NormalizedNameMixin):
     """مشتریان"""
     name = models.CharField(max_length=200, verbose_name="نام مشتری")
     contact_person = models.CharField(max_length=100, blank=True, verbose_name="شخص رابط")
@@ -63,6 +105,22 @@ class Customer(models.Model):
     class Meta:
         verbose_name = "مشتری"
         verbose_name_plural = "مشتریان"
+        indexes = [models.Index(fields=['normalized_name', 'id'], name='customer_normalized_idx')]
+
+class InventoryQuerySet(models.QuerySet):
+    def with_balance(self):
+        """
+        افزودن on_hand و on_hand_value: موجودی و ارزش ردیف اصلی به اضافه جمع خانه‌های
+        شمارنده تفکیک شده (InventoryDelta) که هنوز فشرده نشده‌اند
+        """
+        slots = InventoryDelta.objects.filter(inventory=models.OuterRef('pk')).values('inventory')
+        return self.annotate(
+            on_hand=Coalesce('current_quantity', 0) + Coalesce(
+                models.Subquery(slots.annotate(total=models.Sum('quantity')).values('total')), 0),
+            on_hand_value=Coalesce('stock_value', 0) + Coalesce(
+                models.Subquery(slots.annotate(total=models.Sum('value')).values('total')), 0,
+                output_field=models.BigIntegerField()),
+        )
 
 class Inventory(models.Model):
     """موجودی انبار"""
@@ -70,8 +128,21 @@ class Inventory(models.Model):
     material_type = models.ForeignKey(MaterialType, on_delete=models.CASCADE, verbose_name="نوع ماده")
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, blank=True, null=True, verbose_name="هویت کالا (Supplier)")
     current_quantity = models.IntegerField(default=0, blank=True, null=True, verbose_name="موجودی فعلی")
+    stock_value = models.BigIntegerField(default=0, verbose_name="ارزش موجودی")
+    is_hot = models.BooleanField(default=False, verbose_name="پرتردد (شمارنده تفکیک شده)")
+    version = models.PositiveIntegerField(default=0, verbose_name="نسخه")
     last_updated = models.DateTimeField(auto_now=True, verbose_name="آخرین بروزرسانی")
     
+    objects = InventoryQuerySet.as_manager()
+    
+    @property
+    def average_cost(self):
+        """بهای میانگین موزون هر واحد"""
+        quantity = getattr(self, 'on_hand', self.current_quantity)
+        if not quantity or quantity <= 0:
+            return 0
+        return getattr(self, 'on_hand_value', self.stock_value) / quantity
+    
     def __str__(self):
         warehouse_name = self.warehouse.name if self.warehouse else "بدون انبار"
         supplier_name = f" - {self.supplier.name}" if self.supplier else ""
@@ -82,7 +153,46 @@ class Inventory(models.Model):
         verbose_name_plural = "موجودی انبار"
         # unique_together removed to allow multiple records with None warehouse
 
-class StockIn(models.Model):
+class InventoryDelta(models.Model):
+    """
+    خانه شمارنده تفکیک شده یک ردیف موجودی پرتردد
+    ثبت‌های ردیف‌های is_hot به جای قفل کردن ردیف Inventory به یکی از N خانه اضافه می‌شوند
+    و فرمان compact_inventory_counters آن‌ها را در ردیف اصلی فشرده می‌کند.
+    """
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='delta_slots', verbose_name="موجودی")
+    slot = models.PositiveSmallIntegerField(verbose_name="شماره خانه")
+    quantity = models.IntegerField(default=0, verbose_name="تغییر مقدار")
+    value = models.BigIntegerField(default=0, verbose_name="تغییر ارزش")
+    
+    def __str__(self):
+        return f"{self.inventory_id} / {self.slot}: {self.quantity}"
+    
+    class Meta:
+        verbose_name = "خانه شمارنده موجودی"
+        verbose_name_plural = "خانه‌های شمارنده موجودی"
+        unique_together = ['inventory', 'slot']
+
+class StockInQuerySet(models.QuerySet):
+    def delete(self):
+        """حذف گروهی ورودی‌ها همراه با برداشتن اثرشان از موجودی و نمایه جستجو"""
+        from .posting import forget_deleted, unpost_stock_ins
+        
+        with transaction.atomic():
+            unpost_stock_ins(self)
+            forget_deleted('stockin', self)
+            return super().delete()
+
+class StockOutQuerySet(models.QuerySet):
+    def delete(self):
+        """حذف گروهی خروجی‌ها همراه با برگرداندن مقدار به لات‌های مبدا و حذف نمایه جستجو"""
+        from .posting import forget_deleted, unpost_stock_outs
+        
+        with transaction.atomic():
+            unpost_stock_outs(self)
+            forget_deleted('stockout', self)
+            return super().delete()
+
+class StockIn(JalaliPeriodMixin):
     """ورودی انبار"""
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, blank=True, null=True, verbose_name="انبار")
     material_type = models.ForeignKey(MaterialType, on_delete=models.CASCADE, verbose_name="نام کالا")
@@ -97,22 +207,32 @@ class StockIn(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ورود")
     manual_date = models.DateField(blank=True, null=True, verbose_name="تاریخ ورود دستی")
     
+    objects = StockInQuerySet.as_manager()
+    
     def save(self, *args, **kwargs):
         # محاسبه قیمت کل
         if self.quantity and self.unit_price:
             self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
         
-        # بروزرسانی موجودی انبار - موجودی هر Supplier جداگانه
-        if self.warehouse:
-            inventory, created = Inventory.objects.get_or_create(
-                warehouse=self.warehouse,
-                material_type=self.material_type,
-                supplier=self.supplier,
-                defaults={'current_quantity': 0}
-            )
-            inventory.current_quantity += self.quantity or 0
-            inventory.save()
+        from .posting import post_stock_in, unpost_stock_ins
+        
+        with transaction.atomic():
+            # در ویرایش، ابتدا اثر مقادیر قبلی از موجودی برداشته می‌شود
+            reposting = not self._state.adding and self.pk is not None
+            if reposting:
+                unpost_stock_ins(StockIn.objects.filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            
+            # بروزرسانی موجودی و ارزش انبار - موجودی هر Supplier جداگانه - و جمع روزانه حرکات
+            post_stock_in(self, reposting=reposting)
+    
+    def delete(self, *args, **kwargs):
+        from .posting import forget_deleted, unpost_stock_ins
+        
+        with transaction.atomic():
+            unpost_stock_ins(StockIn.objects.filter(pk=self.pk))
+            forget_deleted('stockin', StockIn.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
     
     def __str__(self):
         warehouse_name = self.warehouse.name if self.warehouse else "بدون انبار"
@@ -123,8 +243,16 @@ class StockIn(models.Model):
     class Meta:
         verbose_name = "ورودی انبار"
         verbose_name_plural = "ورودی‌های انبار"
+        indexes = [
+            # صفحه‌بندی کلیدی لیست‌ها روی (created_at، id)
+            models.Index(fields=['created_at', 'id'], name='stockin_created_id_idx'),
+            # فیلتر بازه تاریخ کاری
+            models.Index(fields=['manual_date'], name='stockin_manual_date_idx'),
+            # سلسله‌مراتب و فیلتر سال/ماه شمسی و خلاصه خرید ماه به ازای Supplier
+            models.Index(fields=['jalali_year', 'jalali_month', 'supplier'], name='stockin_period_supplier_idx'),
+        ]
 
-class StockOut(models.Model):
+class StockOut(JalaliPeriodMixin):
     """خروجی انبار"""
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, blank=True, null=True, verbose_name="انبار")
     material_type = models.ForeignKey(MaterialType, on_delete=models.CASCADE, verbose_name="نام کالا")
@@ -138,35 +266,40 @@ class StockOut(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ثبت کننده")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ خروج")
     manual_date = models.DateField(blank=True, null=True, verbose_name="تاریخ خروج دستی")
+    cost_of_goods = models.BigIntegerField(blank=True, null=True, verbose_name="بهای تمام‌شده")
     
-    def save(self, *args, **kwargs):
+    objects = StockOutQuerySet.as_manager()
+    
+    def save(self, *args, optimistic=False, **kwargs):
+        """
+        optimistic: خواندن لات‌ها بدون قفل و کم کردن موجودی با UPDATE شرطی روی نسخه؛
+        در تداخل ConcurrentUpdateError بالا می‌رود (تکرار با save_stock_out_optimistic)
+        """
         # محاسبه قیمت کل
         if self.quantity and self.unit_price:
             self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
         
-        # بروزرسانی موجودی انبار - موجودی هر Supplier جداگانه
-        if self.warehouse:
-            try:
-                # اگر Supplier مشخص شده، از موجودی آن کم کن
-                if self.supplier:
-                    inventory = Inventory.objects.get(
-                        warehouse=self.warehouse, 
-                        material_type=self.material_type,
-                        supplier=self.supplier
-                    )
-                    inventory.current_quantity -= self.quantity or 0
-                    inventory.save()
-                else:
-                    # اگر Supplier مشخص نشده، از موجودی کلی کم کن
-                    inventory = Inventory.objects.get(
-                        warehouse=self.warehouse, 
-                        material_type=self.material_type
-                    )
-                    inventory.current_quantity -= self.quantity or 0
-                    inventory.save()
-            except Inventory.DoesNotExist:
-                pass  # اگر موجودی وجود نداشت، کاری نکن
+        from .posting import plan_stock_out, apply_stock_out, unpost_stock_outs
+        
+        with transaction.atomic():
+            # در ویرایش، ابتدا مقدار قبلی به لات‌های مبدا برمی‌گردد
+            if not self._state.adding and self.pk is not None:
+                unpost_stock_outs(StockOut.objects.filter(pk=self.pk))
+            
+            # بروزرسانی موجودی انبار - اگر Supplier مشخص شده فقط از لات همان Supplier،
+            # وگرنه تقسیم بین لات‌های Supplierها به روش FIFO
+            plan = plan_stock_out(self, optimistic=optimistic) if self.warehouse else []
+            self.cost_of_goods = sum(line.cost for line in plan) if plan else None
+            super().save(*args, **kwargs)
+            apply_stock_out(self, plan, applied=optimistic)
+    
+    def delete(self, *args, **kwargs):
+        from .posting import forget_deleted, unpost_stock_outs
+        
+        with transaction.atomic():
+            unpost_stock_outs(StockOut.objects.filter(pk=self.pk))
+            forget_deleted('stockout', StockOut.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
     
     def __str__(self):
         warehouse_name = self.warehouse.name if self.warehouse else "بدون انبار"
@@ -176,8 +309,139 @@ class StockOut(models.Model):
     class Meta:
         verbose_name = "خروجی انبار"
         verbose_name_plural = "خروجی‌های انبار"
+        indexes = [
+            # صفحه‌بندی کلیدی لیست‌ها روی (created_at، id)
+            models.Index(fields=['created_at', 'id'], name='stockout_created_id_idx'),
+            # فیلتر بازه تاریخ کاری
+            models.Index(fields=['manual_date'], name='stockout_manual_date_idx'),
+            # سلسله‌مراتب و فیلتر سال/ماه شمسی و خلاصه فروش ماه به ازای مشتری
+            models.Index(fields=['jalali_year', 'jalali_month', 'customer'], name='stockout_period_customer_idx'),
+        ]
+
+class StockOutAllocationManager(models.Manager):
+    """مدیر پایه تخصیص‌ها: __str__ نام هویت را می‌خواهد (مثلاً در فهرست تأیید حذف ادمین)"""
 
-class StockTransfer(models.Model):
+    def get_queryset(self):
+        return super().get_queryset().select_related('supplier')
+
+
+class StockOutAllocation(models.Model):
+    """تخصیص خروجی به لات هویت کالا (FIFO)"""
+    stock_out = models.ForeignKey(StockOut, on_delete=models.CASCADE, related_name='allocations', verbose_name="خروجی انبار")
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='allocations', verbose_name="لات موجودی")
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, blank=True, null=True, verbose_name="هویت کالا")
+    quantity = models.IntegerField(verbose_name="مقدار تخصیص")
+    cost = models.BigIntegerField(default=0, verbose_name="بهای تمام‌شده")
+    
+    objects = models.Manager()
+    with_supplier = StockOutAllocationManager()
+    
+    def __str__(self):
+        supplier_name = self.supplier.name if self.supplier else "بدون هویت"
+        return f"تخصیص {self.quantity} از {supplier_name}"
+    
+    class Meta:
+        # جمع‌آوری ردیف‌های وابسته هنگام حذف (Collector) از مدیر پایه استفاده می‌کند
+        base_manager_name = 'with_supplier'
+        verbose_name = "تخصیص خروجی"
+        verbose_name_plural = "تخصیص‌های خروجی"
+
+class CostLayer(models.Model):
+    """لایه بهای FIFO هر لات موجودی"""
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='cost_layers', verbose_name="لات موجودی")
+    stock_in = models.ForeignKey(StockIn, on_delete=models.CASCADE, blank=True, null=True, related_name='cost_layers', verbose_name="ورودی انبار")
+    quantity = models.IntegerField(verbose_name="مقدار اولیه")
+    remaining_quantity = models.IntegerField(verbose_name="مقدار باقی‌مانده")
+    unit_cost = models.IntegerField(default=0, verbose_name="بهای واحد")
+    
+    def __str__(self):
+        return f"لایه {self.remaining_quantity}/{self.quantity} × {self.unit_cost}"
+    
+    class Meta:
+        verbose_name = "لایه بهای FIFO"
+        verbose_name_plural = "لایه‌های بهای FIFO"
+        indexes = [
+            models.Index(fields=['inventory', 'remaining_quantity'], name='costlayer_open_idx'),
+        ]
+
+class DailyMovementRollup(models.Model):
+    """
+    جمع روزانه ورودی و خروجی به ازای (روز، انبار، نام کالا، هویت کالا، مشتری)
+    هر کلید تا MOVEMENT_ROLLUP_STRIPES ردیف (slot) دارد که گزارش‌ها جمعشان را می‌خوانند.
+    """
+    day = models.DateField(verbose_name="روز")
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, blank=True, null=True, related_name='daily_rollups', verbose_name="انبار")
+    material_type = models.ForeignKey(MaterialType, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name="نام کالا")
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, blank=True, null=True, related_name='daily_rollups', verbose_name="هویت کالا")
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, blank=True, null=True, related_name='daily_rollups', verbose_name="مشتری")
+    slot = models.PositiveSmallIntegerField(default=0, verbose_name="شماره خانه")
+    quantity_in = models.BigIntegerField(default=0, verbose_name="مقدار ورودی")
+    quantity_out = models.BigIntegerField(default=0, verbose_name="مقدار خروجی")
+    value_in = models.BigIntegerField(default=0, verbose_name="ارزش ورودی")
+    value_out = models.BigIntegerField(default=0, verbose_name="ارزش فروش خروجی")
+    cost_out = models.BigIntegerField(default=0, verbose_name="بهای تمام‌شده خروجی")
+    jalali_year = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="سال شمسی")
+    jalali_month = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="ماه شمسی")
+    
+    def __str__(self):
+        return f"{self.day} - {self.material_type_id}: +{self.quantity_in} / -{self.quantity_out}"
+    
+    def fill_jalali_period(self):
+        """سال و ماه شمسی روز؛ برای ثبت‌های گروهی (bulk_create) هم استفاده می‌شود"""
+        from .utils import jalali_period
+        
+        self.jalali_year, self.jalali_month = jalali_period(self.day)
+    
+    def save(self, *args, **kwargs):
+        self.fill_jalali_period()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'jalali_year', 'jalali_month'}
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        verbose_name = "جمع روزانه حرکات"
+        verbose_name_plural = "جمع روزانه حرکات"
+        indexes = [
+            models.Index(fields=['day', 'material_type'], name='rollup_day_material_idx'),
+            # گزارش ماهانه: گروه‌بندی (کالا، انبار، ماه) یک سال به ترتیب همین ایندکس
+            models.Index(fields=['jalali_year', 'material_type', 'warehouse', 'jalali_month'], name='rollup_jalali_period_idx'),
+        ]
+
+class SearchEntry(models.Model):
+    """متن نرمال شده قابل جستجوی یک ردیف (ورودی، خروجی یا موجودی) برای نمایه تمام‌متن"""
+    kind = models.CharField(max_length=16, verbose_name="نوع")
+    object_id = models.BigIntegerField(verbose_name="شناسه ردیف")
+    body = models.TextField(verbose_name="متن جستجو")
+    
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+    
+    class Meta:
+        verbose_name = "نمایه جستجو"
+        verbose_name_plural = "نمایه جستجو"
+        unique_together = ['kind', 'object_id']
+
+class ChangeLogEntry(models.Model):
+    """ردیف خوراک تغییرات برای همگام‌سازی پایانه‌ها؛ id همان شماره ترتیب خوراک است"""
+    ACTIONS = [
+        ('save', 'ذخیره'),
+        ('delete', 'حذف'),
+    ]
+    
+    kind = models.CharField(max_length=20, verbose_name="نوع")
+    object_id = models.BigIntegerField(verbose_name="شناسه ردیف")
+    action = models.CharField(max_length=6, choices=ACTIONS, default='save', verbose_name="عملیات")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="زمان تغییر")
+    
+    def __str__(self):
+        return f"{self.pk}: {self.action} {self.kind}:{self.object_id}"
+    
+    class Meta:
+        verbose_name = "تغییر"
+        verbose_name_plural = "خوراک تغییرات"
+
+class StockTransfer(JalaliPeriodMixin):
     """انتقال بین انبارها"""
     TRANSFER_TYPES = [
         ('in', 'انتقال به انبار'),
@@ -193,26 +457,13 @@ class StockTransfer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ انتقال")
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        # بروزرسانی موجودی انبار مبدا
-        if self.source_warehouse:
-            try:
-                source_inventory = Inventory.objects.get(warehouse=self.source_warehouse, material_type=self.material_type)
-                source_inventory.current_quantity -= self.quantity or 0
-                source_inventory.save()
-            except Inventory.DoesNotExist:
-                pass
+        from .posting import post_stock_transfer
         
-        # بروزرسانی موجودی انبار مقصد
-        if self.destination_warehouse:
-            dest_inventory, created = Inventory.objects.get_or_create(
-                warehouse=self.destination_warehouse,
-                material_type=self.material_type,
-                defaults={'current_quantity': 0}
-            )
-            dest_inventory.current_quantity += self.quantity or 0
-            dest_inventory.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # انتقال لات‌ها از انبار مبدا (FIFO) به لات همان Supplier در انبار مقصد همراه با ارزش
+            post_stock_transfer(self)
     
     def __str__(self):
         source_name = self.source_warehouse.name if self.source_warehouse else "بدون انبار"
@@ -222,3 +473,7 @@ class StockTransfer(models.Model):
     class Meta:
         verbose_name = "انتقال انبار"
         verbose_name_plural = "انتقالات انبار"
+        indexes = [
+            # سلسله‌مراتب و فیلتر سال/ماه شمسی
+            models.Index(fields=['jalali_year', 'jalali_month'], name='transfer_jalali_period_idx'),
+        ]
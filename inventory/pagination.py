@@ -0,0 +1,133 @@
+"""
+صفحه‌بندی کلیدی (keyset / seek) روی (created_at، id)
+
+به جای OFFSET و COUNT(*)، هر صفحه از آخرین ردیف صفحه قبل ادامه می‌دهد؛ پس صفحه ۱۰٬۰۰۰
+با همان یک پیمایش محدود ایندکس صفحه اول خوانده می‌شود. نشانگر صفحه بعد و قبل یک
+توکن امضا شده است که محتوای آن برای کاربر معنایی ندارد و قابل دستکاری نیست.
+"""
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+TOKEN_SALT = 'inventory.pagination'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_token(row, direction):
+    """توکن مبهم برای ادامه از یک ردیف در جهت داده شده"""
+    return signing.dumps({'t': row.created_at.isoformat(), 'i': row.pk, 'd': direction}, salt=TOKEN_SALT)
+
+
+def decode_token(token):
+    """خروجی: (created_at، id، جهت) یا None برای توکن خالی یا نامعتبر"""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+        return datetime.fromisoformat(data['t']), int(data['i']), data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """یک صفحه از صفحه‌بندی کلیدی؛ مانند Page جنگو قابل پیمایش است"""
+
+    def __init__(self, object_list, next_token=None, previous_token=None, approximate_count=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.approximate_count = approximate_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_keyset(queryset, token, per_page=20):
+    """
+    یک صفحه از queryset به ترتیب جدیدترین (created_at نزولی، سپس id نزولی)
+    token: توکن next_token یا previous_token صفحه قبلی؛ خالی برای صفحه اول
+    شرط ادامه با یک کران ساده روی created_at شروع می‌شود تا پایگاه داده از ایندکس
+    (created_at، id) پیمایش محدود انجام دهد.
+    """
+    cursor = decode_token(token)
+    if cursor is None:
+        rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+        has_older, has_newer = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        created_at, pk, direction = cursor
+        if direction == PREVIOUS:
+            rows = list(queryset.filter(created_at__gte=created_at).filter(
+                Q(created_at__gt=created_at) | Q(pk__gt=pk)
+            ).order_by('created_at', 'pk')[:per_page + 1])
+            has_older, has_newer = True, len(rows) > per_page
+            rows = rows[:per_page][::-1]
+        else:
+            rows = list(queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(pk__lt=pk)
+            ).order_by('-created_at', '-pk')[:per_page + 1])
+            has_older, has_newer = len(rows) > per_page, True
+            rows = rows[:per_page]
+
+    return KeysetPage(
+        rows,
+        next_token=encode_token(rows[-1], NEXT) if rows and has_older else None,
+        previous_token=encode_token(rows[0], PREVIOUS) if rows and has_newer else None,
+    )
+
+
+def approximate_count(queryset):
+    """
+    تعداد تقریبی ردیف‌ها بدون پیمایش جدول
+    PostgreSQL: تخمین برنامه‌ریز (EXPLAIN) برای همان کوئری فیلتر شده.
+    سایر پایگاه‌ها: فقط برای جدول بدون فیلتر از بزرگ‌ترین id؛ در غیر این صورت None.
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    if queryset.query.where:
+        return None
+    last = queryset.model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return last or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator ادمین که برای جدول‌های بزرگ‌تر از ADMIN_ESTIMATED_COUNT_THRESHOLD
+    به جای COUNT(*) از approximate_count استفاده می‌کند
+    اگر تخمینی برای کوئری فیلتر شده در دسترس نباشد (SQLite)، شمارش دقیق انجام می‌شود.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        table_size = approximate_count(queryset.model._default_manager.all())
+        if table_size >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            estimate = approximate_count(queryset)
+            if estimate is not None:
+                return estimate
+        return super().count
@@ -0,0 +1,448 @@
+"""
+ثبت حرکات انبار روی موجودی
+
+توابع این ماژول از save مدل‌های StockIn، StockOut و StockTransfer صدا زده می‌شوند و
+تغییر مقدار و ارزش لات‌ها را با UPDATE تجمیعی اعمال می‌کنند. فراخوان باید آن‌ها را
+داخل transaction.atomic اجرا کند.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .allocation import candidate_lots, plan_fifo_allocation
+from .caching import AVAILABILITY, DASHBOARD, LEDGER, invalidate
+from .models import CostLayer, Inventory, InventoryDelta, StockOutAllocation
+from .rollup import apply_rollup_deltas, record_stock_in, record_stock_out, stock_in_rollup, stock_out_rollup
+from .changefeed import record_changes
+from .search import index_objects, unindex_objects
+from .valuation import FIFO, price_plan, receipt_value, valuation_method
+
+
+def add_delta(deltas, inventory_id, quantity, value):
+    """جمع کردن تغییر مقدار و ارزش یک لات در دیکشنری تغییرات"""
+    old_quantity, old_value = deltas.get(inventory_id, (0, 0))
+    deltas[inventory_id] = (old_quantity + quantity, old_value + value)
+
+
+# حداکثر تعداد لات در هر UPDATE تجمیعی (محدودیت پارامترهای SQLite)
+DELTA_BATCH_SIZE = 500
+
+
+def counter_stripes():
+    """تعداد خانه‌های شمارنده هر ردیف پرتردد"""
+    return getattr(settings, 'INVENTORY_COUNTER_STRIPES', 8)
+
+
+def _delta_cases(batch, key='pk'):
+    """عبارت‌های CASE تغییر مقدار و ارزش برای یک دسته لات"""
+    quantity = Case(*[When(**{key: pk}, then=q) for pk, (q, _) in batch], default=0, output_field=IntegerField())
+    value = Case(*[When(**{key: pk}, then=v) for pk, (_, v) in batch], default=0, output_field=BigIntegerField())
+    return quantity, value
+
+
+def _apply_slot_deltas(batch):
+    """
+    افزودن تغییرات ردیف‌های پرتردد به یک خانه تصادفی با یک UPDATE
+    خانه‌ای که هنوز ساخته نشده با bulk_create (ignore_conflicts) ساخته و UPDATE تکرار می‌شود.
+    """
+    slot = random.randrange(counter_stripes())
+    pks = [pk for pk, _ in batch]
+
+    def update(items):
+        quantity, value = _delta_cases(items, key='inventory_id')
+        return InventoryDelta.objects.filter(inventory_id__in=[pk for pk, _ in items], slot=slot).update(
+            quantity=F('quantity') + quantity,
+            value=F('value') + value,
+        )
+
+    if update(batch) == len(batch):
+        return
+    existing = set(InventoryDelta.objects.filter(inventory_id__in=pks, slot=slot).values_list('inventory_id', flat=True))
+    missing = [(pk, delta) for pk, delta in batch if pk not in existing]
+    InventoryDelta.objects.bulk_create(
+        [InventoryDelta(inventory_id=pk, slot=slot) for pk, _ in missing], ignore_conflicts=True)
+    update(missing)
+
+
+def apply_inventory_deltas(deltas, direct=False):
+    """
+    اعمال تغییرات مقدار و ارزش روی چند لات با یک UPDATE (به ازای هر ۵۰۰ لات)
+    deltas: دیکشنری {inventory_id: (تغییر مقدار، تغییر ارزش)}
+    تغییرات ردیف‌های پرتردد (is_hot)، چه ورود و چه خروج، به خانه‌های InventoryDelta می‌رود
+    تا ردیف اصلی نوشته نشود. خروج از این لات‌ها فقط زیر قفل ردیف اصلی (plan_issue و ثبت
+    دسته‌ای) برنامه‌ریزی می‌شود؛ ورودهای هم‌زمان فقط موجودی را بیشتر می‌کنند، پس بررسی
+    موجودی زیر قفل معتبر می‌ماند. ردیف‌های عادی روی ردیف اصلی نوشته می‌شوند و نسخه
+    (version) آن‌ها بالا می‌رود تا خروجی‌های خوش‌بینانه هم‌زمان تداخل را ببینند.
+    direct: نوشتن همه تغییرات روی ردیف اصلی (برای فشرده‌سازی)
+    """
+    items = [(pk, delta) for pk, delta in deltas.items() if delta[0] or delta[1]]
+    if items:
+        invalidate(DASHBOARD, AVAILABILITY, LEDGER)
+        record_changes('inventory', [pk for pk, _ in items])
+    now = timezone.now()
+    updated = 0
+    for start in range(0, len(items), DELTA_BATCH_SIZE):
+        batch = items[start:start + DELTA_BATCH_SIZE]
+        lots = Inventory.objects.filter(pk__in=[pk for pk, _ in batch])
+        if not direct:
+            lots = lots.filter(is_hot=False)
+        quantity, value = _delta_cases(batch)
+        count = lots.update(
+            current_quantity=F('current_quantity') + quantity,
+            stock_value=F('stock_value') + value,
+            version=F('version') + 1,
+            last_updated=now,
+        )
+        if count < len(batch) and not direct:
+            hot = set(Inventory.objects.filter(pk__in=[pk for pk, _ in batch], is_hot=True).values_list('pk', flat=True))
+            if hot:
+                _apply_slot_deltas([(pk, delta) for pk, delta in batch if pk in hot])
+                count += len(hot)
+        updated += count
+    return updated
+
+
+class ConcurrentUpdateError(Exception):
+    """لات‌ها پس از خوانده شدن توسط ثبت دیگری تغییر کرده‌اند"""
+
+
+def apply_inventory_deltas_if_unchanged(deltas, versions):
+    """
+    اعمال تغییرات روی ردیف‌های اصلی فقط اگر نسخه آن‌ها همان نسخه خوانده شده باشد (CAS)
+    versions: دیکشنری {inventory_id: نسخه}؛ در تداخل ConcurrentUpdateError بالا می‌رود
+    فراخوان باید داخل transaction.atomic باشد تا بخش اعمال شده برگردانده شود.
+    """
+    items = [(pk, delta) for pk, delta in deltas.items() if delta[0] or delta[1]]
+    if items:
+        invalidate(AVAILABILITY, LEDGER)
+        record_changes('inventory', [pk for pk, _ in items])
+    for start in range(0, len(items), DELTA_BATCH_SIZE):
+        batch = items[start:start + DELTA_BATCH_SIZE]
+        condition = Q()
+        for pk, _ in batch:
+            condition |= Q(pk=pk, version=versions[pk])
+        quantity, value = _delta_cases(batch)
+        count = Inventory.objects.filter(condition).update(
+            current_quantity=F('current_quantity') + quantity,
+            stock_value=F('stock_value') + value,
+            version=F('version') + 1,
+            last_updated=timezone.now(),
+        )
+        if count != len(batch):
+            raise ConcurrentUpdateError("موجودی هم‌زمان توسط ثبت دیگری تغییر کرد")
+
+
+def compact_inventory_counters():
+    """
+    فشرده کردن خانه‌های شمارنده در ردیف‌های اصلی موجودی
+    خانه‌های غیرصفر قفل و خوانده می‌شوند، جمعشان به ردیف اصلی اضافه و خودشان صفر می‌شوند.
+    خروجی: تعداد ردیف‌های موجودی بروزرسانی شده
+    """
+    with transaction.atomic():
+        slots = list(
+            InventoryDelta.objects.select_for_update()
+            .filter(~Q(quantity=0) | ~Q(value=0))
+            .values_list('id', 'inventory_id', 'quantity', 'value')
+        )
+        if not slots:
+            return 0
+        deltas = {}
+        for _, inventory_id, quantity, value in slots:
+            add_delta(deltas, inventory_id, quantity, value)
+        updated = apply_inventory_deltas(deltas, direct=True)
+        slot_ids = [slot[0] for slot in slots]
+        for start in range(0, len(slot_ids), DELTA_BATCH_SIZE):
+            InventoryDelta.objects.filter(pk__in=slot_ids[start:start + DELTA_BATCH_SIZE]).update(quantity=0, value=0)
+    return updated
+
+
+def plan_issue(warehouse_id, material_type_id, quantity, supplier_id=None, optimistic=False):
+    """
+    قفل و خواندن لات‌ها، تقسیم FIFO و قیمت‌گذاری خروج
+    optimistic: خواندن بدون قفل و کم کردن همین‌جا با UPDATE شرطی روی نسخه لات‌ها؛
+    لات‌های پرتردد نسخه ندارند، پس اگر یکی از لات‌ها is_hot باشد لات‌ها قفل و دوباره
+    خوانده می‌شوند و کاهش‌ها همین‌جا به خانه‌های شمارنده می‌رود.
+    خروجی: (سطرهای AllocationLine قیمت‌گذاری شده، تکه‌های لایه FIFO)
+    """
+    def read(for_update):
+        return list(
+            candidate_lots(warehouse_id, material_type_id, supplier_id, for_update=for_update)
+            .values_list('id', 'supplier_id', 'on_hand', 'on_hand_value', 'version', 'is_hot')
+        )
+
+    lots = read(for_update=not optimistic)
+    locked = not optimistic
+    if optimistic and any(lot[5] for lot in lots):
+        lots = read(for_update=True)
+        locked = True
+    plan = plan_fifo_allocation([lot[:3] for lot in lots], quantity)
+    priced, chunks = price_plan(plan, {lot[0]: (lot[2], lot[3]) for lot in lots})
+    if optimistic:
+        deltas = {line.inventory_id: (-line.quantity, -line.cost) for line in priced}
+        if locked:
+            apply_inventory_deltas(deltas)
+        else:
+            apply_inventory_deltas_if_unchanged(deltas, {lot[0]: lot[4] for lot in lots})
+    return priced, chunks
+
+
+def lot_ids(keys):
+    """نگاشت کلیدهای (انبار، کالا، Supplier) به شناسه قدیمی‌ترین لات موجود با یک کوئری"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    result = {}
+    rows = Inventory.objects.filter(
+        warehouse_id__in={key[0] for key in keys},
+        material_type_id__in={key[1] for key in keys},
+    ).order_by('id').values_list('id', 'warehouse_id', 'material_type_id', 'supplier_id')
+    for pk, warehouse_id, material_type_id, supplier_id in rows:
+        key = (warehouse_id, material_type_id, supplier_id)
+        if key in keys:
+            result.setdefault(key, pk)
+    return result
+
+
+def post_stock_in(stock_in, reposting=False):
+    """
+    افزودن مقدار و ارزش ورودی به لات Supplier آن در انبار و به جمع روزانه حرکات
+    reposting: ورودی ویرایش شده که اثر قبلی‌اش با unpost_stock_ins برداشته شده است
+    """
+    rollup = {}
+    record_stock_in(stock_in, rollup)
+    apply_rollup_deltas(rollup)
+    if not stock_in.warehouse_id:
+        return None
+
+    inventory, created = Inventory.objects.get_or_create(
+        warehouse=stock_in.warehouse,
+        material_type=stock_in.material_type,
+        supplier=stock_in.supplier,
+        defaults={'current_quantity': 0}
+    )
+    quantity = stock_in.quantity or 0
+    apply_inventory_deltas({inventory.pk: (quantity, receipt_value(quantity, stock_in.unit_price))})
+
+    if valuation_method() != FIFO:
+        return inventory
+    # در ویرایش، لایه همان ورودی جابه‌جا و به اندازه تغییر مقدار اصلاح می‌شود
+    if reposting and CostLayer.objects.filter(stock_in=stock_in).update(
+        inventory=inventory,
+        unit_cost=stock_in.unit_price or 0,
+        remaining_quantity=Greatest(F('remaining_quantity') + quantity - F('quantity'), Value(0)),
+        quantity=quantity,
+    ):
+        return inventory
+    if quantity > 0:
+        CostLayer.objects.create(
+            inventory=inventory,
+            stock_in=stock_in,
+            quantity=quantity,
+            remaining_quantity=quantity,
+            unit_cost=stock_in.unit_price or 0,
+        )
+    return inventory
+
+
+def plan_stock_out(stock_out, optimistic=False):
+    """تقسیم و قیمت‌گذاری یک خروجی پیش از ذخیره آن"""
+    quantity = stock_out.quantity or 0
+    if not stock_out.warehouse_id or quantity <= 0:
+        return []
+    plan, _ = plan_issue(stock_out.warehouse_id, stock_out.material_type_id, quantity, stock_out.supplier_id,
+                         optimistic=optimistic)
+    return plan
+
+
+def apply_stock_out(stock_out, plan, applied=False):
+    """
+    کم کردن سطرهای تخصیص از لات‌ها، ثبت StockOutAllocation و افزودن به جمع روزانه حرکات
+    applied: موجودی قبلاً با UPDATE شرطی کم شده و فقط سطرهای تخصیص ثبت می‌شوند
+    """
+    rollup = {}
+    record_stock_out(stock_out, [(line.supplier_id, line.quantity, line.cost) for line in plan], rollup)
+    apply_rollup_deltas(rollup)
+    if not plan:
+        return []
+    if not applied:
+        apply_inventory_deltas({line.inventory_id: (-line.quantity, -line.cost) for line in plan})
+    return StockOutAllocation.objects.bulk_create([
+        StockOutAllocation(
+            stock_out=stock_out,
+            inventory_id=line.inventory_id,
+            supplier_id=line.supplier_id,
+            quantity=line.quantity,
+            cost=line.cost,
+        )
+        for line in plan
+    ])
+
+
+def save_stock_out_optimistic(stock_out, attempts=None):
+    """
+    ثبت خروجی با کنترل هم‌زمانی خوش‌بینانه و تکرار محدود
+    در هر تلاش موجودی بدون قفل خوانده و با UPDATE شرطی روی نسخه کم می‌شود؛ اگر ثبت
+    دیگری بین خواندن و نوشتن لات را تغییر داده باشد، تلاش با کمی مکث تکرار می‌شود.
+    کمبود موجودی InsufficientStockError و تداخل پس از آخرین تلاش ConcurrentUpdateError می‌دهد.
+    """
+    attempts = attempts or getattr(settings, 'INVENTORY_OPTIMISTIC_RETRIES', 5)
+    for attempt in range(attempts):
+        try:
+            stock_out.save(optimistic=True)
+            return stock_out
+        except ConcurrentUpdateError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+
+
+def destination_lots(warehouse_id, material_type_id, supplier_ids):
+    """
+    دریافت یا ایجاد لات‌های مقصد برای چند Supplier با یک SELECT و یک INSERT
+    خروجی: دیکشنری {supplier_id: inventory_id}
+    """
+    supplier_ids = set(supplier_ids)
+    condition = Q(supplier_id__in=[s for s in supplier_ids if s is not None])
+    if None in supplier_ids:
+        condition |= Q(supplier__isnull=True)
+    lots = dict(
+        Inventory.objects.filter(condition, warehouse_id=warehouse_id, material_type_id=material_type_id)
+        .order_by('-id').values_list('supplier_id', 'id')
+    )
+    missing = [s for s in supplier_ids if s not in lots]
+    if missing:
+        created = Inventory.objects.bulk_create([
+            Inventory(warehouse_id=warehouse_id, material_type_id=material_type_id, supplier_id=s, current_quantity=0)
+            for s in missing
+        ])
+        lots.update({inventory.supplier_id: inventory.pk for inventory in created})
+        index_objects('inventory', [inventory.pk for inventory in created])
+        record_changes('inventory', [inventory.pk for inventory in created])
+    return lots
+
+
+def post_stock_transfer(transfer):
+    """انتقال لات‌ها از انبار مبدا (FIFO) به لات همان Supplier در انبار مقصد همراه با ارزش"""
+    quantity = transfer.quantity or 0
+    if quantity <= 0:
+        return
+
+    deltas = {}
+    if transfer.source_warehouse_id:
+        plan, chunks = plan_issue(transfer.source_warehouse_id, transfer.material_type_id, quantity)
+        for line in plan:
+            add_delta(deltas, line.inventory_id, -line.quantity, -line.cost)
+    else:
+        # ورود از بیرون انبارها - لات بدون Supplier و بدون ارزش
+        plan, chunks = [], {}
+
+    if transfer.destination_warehouse_id:
+        moved = plan or [None]
+        lots = destination_lots(
+            transfer.destination_warehouse_id,
+            transfer.material_type_id,
+            [line.supplier_id if line else None for line in moved],
+        )
+        layers = []
+        for line in moved:
+            if line is None:
+                add_delta(deltas, lots[None], quantity, 0)
+                continue
+            add_delta(deltas, lots[line.supplier_id], line.quantity, line.cost)
+            for chunk_quantity, unit_cost in chunks.get(line.inventory_id, []):
+                layers.append(CostLayer(
+                    inventory_id=lots[line.supplier_id],
+                    quantity=chunk_quantity,
+                    remaining_quantity=chunk_quantity,
+                    unit_cost=unit_cost,
+                ))
+        if layers:
+            CostLayer.objects.bulk_create(layers)
+
+    apply_inventory_deltas(deltas)
+
+
+def forget_deleted(kind, movements):
+    """
+    پاک کردن ردپای حرکاتی که حذف می‌شوند با تعداد ثابت کوئری (به جای سیگنال‌های
+    post_delete تک‌ردیفی): نسخه دفتر، نمایه جستجو و ردیف‌های حذف در خوراک تغییرات؛ پیش
+    از حذف خود ردیف‌ها داخل همان تراکنش صدا زده می‌شود.
+    """
+    invalidate(LEDGER)
+    unindex_objects(kind, movements.values('pk'))
+    record_changes(kind, list(movements.values_list('pk', flat=True)), action='delete')
+
+
+def unpost_stock_ins(stock_ins):
+    """
+    برداشتن اثر ورودی‌ها از لات‌ها با تعداد ثابت کوئری (ویرایش، حذف و حذف گروهی)
+    stock_ins: QuerySet ورودی‌ها که هنوز مقادیر قبلی را در پایگاه داده دارند
+    """
+    apply_rollup_deltas(stock_in_rollup(stock_ins, sign=-1))
+    rows = list(
+        stock_ins.filter(warehouse__isnull=False)
+        .values('warehouse_id', 'material_type_id', 'supplier_id')
+        .annotate(
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_value=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+        )
+        .order_by()
+    )
+    lots = lot_ids((r['warehouse_id'], r['material_type_id'], r['supplier_id']) for r in rows)
+    deltas = {}
+    for r in rows:
+        pk = lots.get((r['warehouse_id'], r['material_type_id'], r['supplier_id']))
+        if pk is not None:
+            add_delta(deltas, pk, -r['total_quantity'], -r['total_value'])
+    apply_inventory_deltas(deltas)
+
+
+def unpost_stock_outs(stock_outs):
+    """
+    برگرداندن خروجی‌ها به لات‌هایی که از آن‌ها برداشته شده‌اند و حذف سطرهای تخصیص
+    خروجی‌های قدیمی بدون سطر تخصیص به لات (انبار، کالا، Supplier) خودشان برمی‌گردند.
+    """
+    apply_rollup_deltas(stock_out_rollup(stock_outs, sign=-1))
+    deltas = {}
+    returned = list(
+        StockOutAllocation.objects.filter(stock_out__in=stock_outs)
+        .values('inventory_id')
+        .annotate(total_quantity=Sum('quantity'), total_cost=Sum('cost'))
+        .order_by()
+    )
+    for r in returned:
+        add_delta(deltas, r['inventory_id'], r['total_quantity'], r['total_cost'])
+
+    legacy = list(
+        stock_outs.filter(warehouse__isnull=False, allocations__isnull=True)
+        .values('warehouse_id', 'material_type_id', 'supplier_id')
+        .annotate(total_quantity=Sum(Coalesce('quantity', 0)), total_cost=Sum(Coalesce('cost_of_goods', 0)))
+        .order_by()
+    )
+    if legacy:
+        lots = lot_ids((r['warehouse_id'], r['material_type_id'], r['supplier_id']) for r in legacy)
+        for r in legacy:
+            pk = lots.get((r['warehouse_id'], r['material_type_id'], r['supplier_id']))
+            if pk is not None:
+                add_delta(deltas, pk, r['total_quantity'], r['total_cost'])
+
+    apply_inventory_deltas(deltas)
+    if returned:
+        StockOutAllocation.objects.filter(stock_out__in=stock_outs).delete()
+
+    if valuation_method() == FIFO:
+        # مقدار برگشتی به صورت لایه جدید با بهای میانگین برداشت شده
+        CostLayer.objects.bulk_create([
+            CostLayer(
+                inventory_id=pk,
+                quantity=quantity,
+                remaining_quantity=quantity,
+                unit_cost=cost // quantity,
+            )
+            for pk, (quantity, cost) in deltas.items() if quantity > 0
+        ])
@@ -0,0 +1,219 @@
+"""
+جمع روزانه حرکات انبار
+
+DailyMovementRollup برای هر (روز، انبار، نام کالا، هویت کالا، مشتری) مقدار و ارزش ورودی،
+مقدار و ارزش فروش خروجی و بهای تمام‌شده خروجی را نگه می‌دارد. ثبت، ویرایش و حذف
+ورودی‌ها و خروجی‌ها در همان تراکنش این جدول را بروزرسانی می‌کنند، پس گزارش‌ها به جای
+پیمایش جدول‌های حرکات، چند هزار ردیف جمع روزانه را می‌خوانند.
+
+روز هر حرکت تاریخ دستی آن است و اگر خالی باشد روز تاریخ ثبت در منطقه زمانی کسب‌وکار
+(BUSINESS_TIME_ZONE)، همان روزی که سال و ماه شمسی و فیلترهای تاریخ حساب می‌کنند.
+هر ثبت به یک خانه (slot) تصادفی از MOVEMENT_ROLLUP_STRIPES خانه کلید خود اضافه می‌شود تا
+ثبت‌های هم‌زمان یک روز و یک لات روی یک ردیف صف نکشند؛ بازسازی همه را در خانه صفر جمع می‌کند.
+هویت کالای خروجی‌ها از سطرهای تخصیص (لات برداشت شده) خوانده می‌شود. انتقال‌ها در این
+جدول نیستند چون ورود و خروج کل شرکت را تغییر نمی‌دهند.
+"""
+import random
+
+from django.conf import settings
+from django.db.models import BigIntegerField, Case, F, Sum, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .caching import DASHBOARD, LEDGER, invalidate, period_namespace
+from .models import DailyMovementRollup, StockOutAllocation
+from .utils import business_timezone, jalali_period
+
+
+# ترتیب مقادیر هر ردیف تغییر
+ROLLUP_FIELDS = ('quantity_in', 'quantity_out', 'value_in', 'value_out', 'cost_out')
+
+# حداکثر تعداد ردیف در هر UPDATE تجمیعی (پنج CASE به ازای هر ردیف)
+ROLLUP_BATCH_SIZE = 200
+
+
+def rollup_stripes():
+    """تعداد خانه‌های هر کلید جمع روزانه"""
+    return getattr(settings, 'MOVEMENT_ROLLUP_STRIPES', 8)
+
+
+def movement_day(movement):
+    """روز گزارش یک حرکت: تاریخ دستی یا روز تاریخ ثبت در منطقه زمانی کسب‌وکار"""
+    if movement.manual_date:
+        return movement.manual_date
+    return timezone.localdate(movement.created_at or timezone.now(), business_timezone())
+
+
+def day_expression(prefix=''):
+    """عبارت SQL همان روز movement_day"""
+    return Coalesce(f'{prefix}manual_date', TruncDate(f'{prefix}created_at', tzinfo=business_timezone()))
+
+
+def rollup_periods(days):
+    """ماه‌های شمسی روزهای جمع روزانه"""
+    return {jalali_period(day) for day in days}
+
+
+def add_rollup(deltas, key, quantity_in=0, quantity_out=0, value_in=0, value_out=0, cost_out=0):
+    """
+    جمع کردن تغییر یک ردیف در دیکشنری تغییرات
+    key: (روز، انبار، کالا، هویت کالا، مشتری)
+    """
+    current = deltas.setdefault(key, [0, 0, 0, 0, 0])
+    for i, amount in enumerate((quantity_in, quantity_out, value_in, value_out, cost_out)):
+        current[i] += amount or 0
+
+
+def stock_in_rollup(stock_ins, sign=1, deltas=None):
+    """تغییرات جمع روزانه یک QuerySet ورودی با یک کوئری گروه‌بندی شده"""
+    deltas = {} if deltas is None else deltas
+    rows = (
+        stock_ins.values('warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', day=day_expression())
+        .annotate(
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_value=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+        )
+        .order_by()
+    )
+    for r in rows:
+        key = (r['day'], r['warehouse_id'], r['material_type_id'], r['supplier_id'], r['customer_id'])
+        add_rollup(deltas, key, quantity_in=sign * r['total_quantity'], value_in=sign * r['total_value'])
+    return deltas
+
+
+def stock_out_rollup(stock_outs, sign=1, deltas=None):
+    """
+    تغییرات جمع روزانه یک QuerySet خروجی با دو کوئری گروه‌بندی شده
+    خروجی‌های دارای تخصیص به هویت کالای لات‌ها تقسیم می‌شوند و بقیه با Supplier خودشان.
+    """
+    deltas = {} if deltas is None else deltas
+    allocated = (
+        StockOutAllocation.objects.filter(stock_out__in=stock_outs)
+        .values('supplier_id', day=day_expression('stock_out__'), warehouse=F('stock_out__warehouse_id'),
+                material=F('stock_out__material_type_id'), buyer=F('stock_out__customer_id'))
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * Coalesce('stock_out__unit_price', 0), output_field=BigIntegerField()),
+            total_cost=Sum('cost'),
+        )
+        .order_by()
+    )
+    for r in allocated:
+        key = (r['day'], r['warehouse'], r['material'], r['supplier_id'], r['buyer'])
+        add_rollup(deltas, key, quantity_out=sign * r['total_quantity'],
+                   value_out=sign * r['total_value'], cost_out=sign * r['total_cost'])
+
+    unallocated = (
+        stock_outs.filter(allocations__isnull=True)
+        .values('warehouse_id', 'material_type_id', 'supplier_id', 'customer_id', day=day_expression())
+        .annotate(
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_value=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+            total_cost=Sum(Coalesce('cost_of_goods', 0)),
+        )
+        .order_by()
+    )
+    for r in unallocated:
+        key = (r['day'], r['warehouse_id'], r['material_type_id'], r['supplier_id'], r['customer_id'])
+        add_rollup(deltas, key, quantity_out=sign * r['total_quantity'],
+                   value_out=sign * r['total_value'], cost_out=sign * r['total_cost'])
+    return deltas
+
+
+def record_stock_in(stock_in, deltas):
+    """تغییر جمع روزانه یک ورودی ذخیره شده (بدون کوئری)"""
+    quantity = stock_in.quantity or 0
+    key = (movement_day(stock_in), stock_in.warehouse_id, stock_in.material_type_id,
+           stock_in.supplier_id, stock_in.customer_id)
+    add_rollup(deltas, key, quantity_in=quantity, value_in=quantity * (stock_in.unit_price or 0))
+
+
+def record_stock_out(stock_out, lines, deltas):
+    """
+    تغییر جمع روزانه یک خروجی ذخیره شده (بدون کوئری)
+    lines: دنباله (supplier_id، مقدار، بها) لات‌های برداشت شده؛ خالی برای خروجی بدون تخصیص
+    """
+    day = movement_day(stock_out)
+    unit_price = stock_out.unit_price or 0
+    if not lines:
+        quantity = stock_out.quantity or 0
+        lines = [(stock_out.supplier_id, quantity, stock_out.cost_of_goods or 0)]
+    for supplier_id, quantity, cost in lines:
+        key = (day, stock_out.warehouse_id, stock_out.material_type_id, supplier_id, stock_out.customer_id)
+        add_rollup(deltas, key, quantity_out=quantity, value_out=quantity * unit_price, cost_out=cost)
+
+
+def rollup_row(key, values, slot=0):
+    """ردیف جدید جمع روزانه برای bulk_create با سال و ماه شمسی پر شده"""
+    row = DailyMovementRollup(
+        day=key[0], warehouse_id=key[1], material_type_id=key[2], supplier_id=key[3], customer_id=key[4],
+        slot=slot, **dict(zip(ROLLUP_FIELDS, values))
+    )
+    row.fill_jalali_period()
+    return row
+
+
+def apply_rollup_deltas(deltas):
+    """
+    اعمال تغییرات روی یک خانه تصادفی جدول جمع روزانه: یک SELECT برای ردیف‌های موجود،
+    یک UPDATE تجمیعی به ازای هر ۲۰۰ ردیف و یک INSERT برای ردیف‌های جدید
+    """
+    items = [(key, values) for key, values in deltas.items() if any(values)]
+    if not items:
+        return
+    invalidate(DASHBOARD, LEDGER)
+    # خلاصه‌های خرید و فروش فقط در ماه‌های همین حرکت‌ها
+    invalidate(*(period_namespace(year, month) for year, month in rollup_periods({key[0] for key, _ in items})))
+    slot = random.randrange(rollup_stripes())
+    existing = {}
+    rows = DailyMovementRollup.objects.filter(
+        day__in={key[0] for key, _ in items},
+        material_type_id__in={key[2] for key, _ in items},
+        slot=slot,
+    ).order_by('id').values_list('id', 'day', 'warehouse_id', 'material_type_id', 'supplier_id', 'customer_id')
+    for pk, *key in rows:
+        existing.setdefault(tuple(key), pk)
+
+    updates = [(existing[key], values) for key, values in items if key in existing]
+    for start in range(0, len(updates), ROLLUP_BATCH_SIZE):
+        batch = updates[start:start + ROLLUP_BATCH_SIZE]
+        DailyMovementRollup.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+            field: F(field) + Case(*[When(pk=pk, then=values[i]) for pk, values in batch],
+                                   default=0, output_field=BigIntegerField())
+            for i, field in enumerate(ROLLUP_FIELDS)
+        })
+
+    DailyMovementRollup.objects.bulk_create([
+        rollup_row(key, values, slot) for key, values in items if key not in existing
+    ], batch_size=ROLLUP_BATCH_SIZE)
+
+
+def in_day_range(movements, start=None, end=None):
+    """محدود کردن QuerySet ورودی یا خروجی به روزهای گزارش بین start و end (هر دو شامل)"""
+    movements = movements.alias(rollup_day=day_expression())
+    if start:
+        movements = movements.filter(rollup_day__gte=start)
+    if end:
+        movements = movements.filter(rollup_day__lte=end)
+    return movements
+
+
+def ledger_rollup(stock_ins, stock_outs):
+    """جمع روزانه محاسبه شده مستقیم از جدول‌های حرکات (برای بازسازی و بررسی)"""
+    deltas = stock_in_rollup(stock_ins)
+    return stock_out_rollup(stock_outs, deltas=deltas)
+
+
+def stored_rollup(queryset=None):
+    """جمع ردیف‌های جدول جمع روزانه به ازای هر کلید"""
+    queryset = DailyMovementRollup.objects.all() if queryset is None else queryset
+    totals = {}
+    rows = (
+        queryset.values('day', 'warehouse_id', 'material_type_id', 'supplier_id', 'customer_id')
+        .annotate(**{f'total_{field}': Sum(field) for field in ROLLUP_FIELDS})
+        .order_by()
+    )
+    for r in rows:
+        key = (r['day'], r['warehouse_id'], r['material_type_id'], r['supplier_id'], r['customer_id'])
+        add_rollup(totals, key, *(r[f'total_{field}'] for field in ROLLUP_FIELDS))
+    return totals
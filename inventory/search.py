@@ -0,0 +1,135 @@
+"""
+جستجوی تمام‌متن روی ورودی‌ها، خروجی‌ها و موجودی
+
+برای هر ردیف یک SearchEntry با متن نرمال شده (نام کالا، هویت کالا، مشتری، شماره فاکتور)
+نگه داشته می‌شود. حروف عربی و فارسی یکسان می‌شوند (ي/ی، ك/ک، ة/ه)، اعراب، کشیده و
+نیم‌فاصله حذف و ارقام فارسی به لاتین تبدیل می‌شوند، پس «كيك» و «کیک» یکی هستند.
+
+SQLite: جدول FTS5 (inventory_searchentry_fts) که تریگرها آن را با SearchEntry همگام
+نگه می‌دارند. PostgreSQL: ایندکس GIN روی to_tsvector('simple', body). هر کلمه جستجو
+به صورت پیشوندی تطبیق داده می‌شود (مثلاً «INV-14» همه فاکتورهای INV-14xx را پیدا می‌کند).
+
+ذخیره تکی از سیگنال‌ها (signals.py) و ثبت‌های گروهی مستقیم با index_objects نمایه
+می‌شوند؛ حذف ورودی‌ها و خروجی‌ها نمایه را در QuerySet.delete با یک DELETE پاک می‌کند.
+مهاجرت 0022 ردیف‌های قبلی را نمایه می‌کند و rebuild_search_index کل نمایه را از نو می‌سازد.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Inventory, SearchEntry, StockIn, StockOut
+
+
+# نوع ← (مدل، فیلدهای متن جستجو)
+SEARCH_FIELDS = {
+    'stockin': (StockIn, ('material_type__name', 'supplier__name', 'customer__name', 'invoice_number')),
+    'stockout': (StockOut, ('material_type__name', 'customer__name', 'supplier__name', 'invoice_number')),
+    'inventory': (Inventory, ('material_type__name', 'material_type__description', 'supplier__name')),
+}
+
+# تعداد ردیف در هر دور بازسازی نمایه
+INDEX_BATCH_SIZE = 1000
+
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', '‌': ' ', '‍': None, 'ـ': None,
+    **{chr(code): None for code in range(0x064B, 0x0653)},  # اعراب
+    **{persian: str(i) for i, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(i) for i, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+
+WORD = re.compile(r'\w+')
+
+
+def normalize_text(*values):
+    """متن نرمال شده برای نمایه و جستجو"""
+    text = ' '.join(str(value) for value in values if value)
+    return ' '.join(WORD.findall(text.translate(CHARACTER_MAP).lower()))
+
+
+def kind_of(model):
+    """نوع نمایه یک مدل یا None"""
+    for kind, (search_model, _) in SEARCH_FIELDS.items():
+        if search_model is model:
+            return kind
+    return None
+
+
+def index_objects(kind, pks):
+    """ساخت یا بروزرسانی نمایه ردیف‌های داده شده با یک SELECT و یک INSERT در هر دور"""
+    model, fields = SEARCH_FIELDS[kind]
+    pks = list(pks)
+    for start in range(0, len(pks), INDEX_BATCH_SIZE):
+        batch = pks[start:start + INDEX_BATCH_SIZE]
+        rows = model.objects.filter(pk__in=batch).values_list('pk', *fields)
+        entries = [SearchEntry(kind=kind, object_id=pk, body=normalize_text(*values)) for pk, *values in rows]
+        SearchEntry.objects.filter(kind=kind, object_id__in=batch).delete()
+        SearchEntry.objects.bulk_create(entries)
+
+
+def index_queryset(kind, queryset):
+    """نمایه همه ردیف‌های یک QuerySet"""
+    index_objects(kind, queryset.order_by().values_list('pk', flat=True))
+
+
+def unindex_objects(kind, pks):
+    """حذف نمایه ردیف‌ها با یک DELETE؛ pks لیست یا زیرکوئری شناسه‌ها"""
+    SearchEntry.objects.filter(kind=kind, object_id__in=pks).delete()
+
+
+def reindex_related(field, instance):
+    """بروزرسانی نمایه ردیف‌هایی که نام یک کالا، هویت کالا یا مشتری را در متن خود دارند"""
+    for kind, (model, fields) in SEARCH_FIELDS.items():
+        if any(name.startswith(f'{field}__') for name in fields):
+            index_queryset(kind, model.objects.filter(**{field: instance}))
+
+
+def rebuild_index():
+    """بازسازی کامل نمایه از جدول‌های اصلی؛ خروجی: تعداد ردیف نمایه شده به ازای هر نوع"""
+    SearchEntry.objects.all().delete()
+    counts = {}
+    for kind, (model, _) in SEARCH_FIELDS.items():
+        index_queryset(kind, model.objects.all())
+        counts[kind] = SearchEntry.objects.filter(kind=kind).count()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO inventory_searchentry_fts(inventory_searchentry_fts) VALUES ('rebuild')")
+    return counts
+
+
+def search_terms(text):
+    return normalize_text(text).split()
+
+
+def matching_ids(kind, text):
+    """
+    زیرکوئری شناسه ردیف‌های نوع kind که همه کلمات text (به صورت پیشوندی) را دارند
+    جستجو از نمایه تمام‌متن شروع می‌شود و فقط ردیف‌های منطبق به SearchEntry پیوند می‌خورند.
+    """
+    terms = search_terms(text)
+    if connection.vendor == 'sqlite':
+        return RawSQL(
+            # CROSS JOIN ترتیب پیوند را ثابت می‌کند: اول FTS، سپس جستجوی کلید اصلی
+            'SELECT e.object_id FROM inventory_searchentry_fts f '
+            'CROSS JOIN inventory_searchentry e ON e.id = f.rowid '
+            'WHERE inventory_searchentry_fts MATCH %s AND e.kind = %s',
+            (' '.join(f'"{term}"*' for term in terms), kind),
+        )
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            'SELECT object_id FROM inventory_searchentry '
+            "WHERE to_tsvector('simple', body) @@ to_tsquery('simple', %s) AND kind = %s",
+            (' & '.join(f'{term}:*' for term in terms), kind),
+        )
+    entries = SearchEntry.objects.filter(kind=kind)
+    for term in terms:
+        entries = entries.filter(body__contains=term)
+    return entries.values('object_id')
+
+
+def search(queryset, text):
+    """محدود کردن QuerySet ورودی، خروجی یا موجودی به ردیف‌های منطبق با text"""
+    if not search_terms(text):
+        return queryset
+    return queryset.filter(pk__in=matching_ids(kind_of(queryset.model), text))
@@ -0,0 +1,87 @@
+"""
+باطل‌سازی کش با تغییر اطلاعات پایه و همگام نگه داشتن نمایه جستجو
+
+ثبت حرکات کش را در posting و rollup باطل می‌کند؛ این‌جا فقط مدل‌هایی هستند که مستقیم
+(فرم‌ها و پنل مدیریت) ذخیره یا حذف می‌شوند. ثبت‌های گروهی (bulk_create) سیگنال ندارند و
+خودشان index_objects را صدا می‌زنند.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .autocomplete import table_namespace
+from .caching import DASHBOARD, LEDGER, invalidate
+from .changefeed import record_changes
+from .models import Customer, Inventory, MaterialType, StockIn, StockOut, StockTransfer, Supplier, Warehouse
+from .search import index_objects, kind_of, reindex_related, unindex_objects
+
+
+def invalidate_dashboard(sender, **kwargs):
+    invalidate(DASHBOARD)
+
+
+for model in (Warehouse, MaterialType, Supplier, Customer, Inventory):
+    post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard_{model.__name__}_save')
+    post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard_{model.__name__}_delete')
+
+
+def invalidate_ledger(sender, **kwargs):
+    # ETag صفحات فهرست و APIهای موجودی (حتی برای تغییراتی مثل شماره فاکتور که موجودی را عوض نمی‌کنند)
+    invalidate(LEDGER)
+
+
+for model in (Warehouse, MaterialType, Supplier, Customer, Inventory, StockIn, StockOut, StockTransfer):
+    post_save.connect(invalidate_ledger, sender=model, dispatch_uid=f'ledger_{model.__name__}_save')
+# حذف ورودی‌ها و خروجی‌ها نسخه دفتر را یک بار در QuerySet.delete عوض می‌کند
+for model in (Warehouse, MaterialType, Supplier, Customer, Inventory, StockTransfer):
+    post_delete.connect(invalidate_ledger, sender=model, dispatch_uid=f'ledger_{model.__name__}_delete')
+
+
+def invalidate_table_version(sender, **kwargs):
+    # ETag پاسخ‌های تکمیل خودکار این جدول عوض می‌شود
+    invalidate(table_namespace(sender))
+
+
+for model in (Warehouse, MaterialType, Supplier, Customer):
+    post_save.connect(invalidate_table_version, sender=model, dispatch_uid=f'table_{model.__name__}_save')
+    post_delete.connect(invalidate_table_version, sender=model, dispatch_uid=f'table_{model.__name__}_delete')
+
+
+def index_search_entry(sender, instance, **kwargs):
+    index_objects(kind_of(sender), [instance.pk])
+
+
+def unindex_search_entry(sender, instance, **kwargs):
+    unindex_objects(kind_of(sender), [instance.pk])
+
+
+# اطلاعات پایه‌ای که نامشان در متن جستجوی حرکات و موجودی می‌آید
+SEARCH_RELATED_FIELDS = {MaterialType: 'material_type', Supplier: 'supplier', Customer: 'customer'}
+
+
+def reindex_search_entries(sender, instance, created, **kwargs):
+    # ردیف تازه هنوز در متن هیچ حرکتی نیامده است
+    if not created:
+        reindex_related(SEARCH_RELATED_FIELDS[sender], instance)
+
+
+for model in (StockIn, StockOut, Inventory):
+    post_save.connect(index_search_entry, sender=model, dispatch_uid=f'search_{model.__name__}_save')
+# حذف ورودی‌ها و خروجی‌ها نمایه را در QuerySet.delete به صورت گروهی پاک می‌کند
+post_delete.connect(unindex_search_entry, sender=Inventory, dispatch_uid='search_Inventory_delete')
+
+for model in SEARCH_RELATED_FIELDS:
+    post_save.connect(reindex_search_entries, sender=model, dispatch_uid=f'search_{model.__name__}_reindex')
+
+
+def record_saved_change(sender, instance, **kwargs):
+    record_changes(sender._meta.model_name, [instance.pk])
+
+
+def record_deleted_change(sender, instance, **kwargs):
+    record_changes(sender._meta.model_name, [instance.pk], action='delete')
+
+
+for model in (Warehouse, MaterialType, Supplier, Customer, Inventory, StockIn, StockOut, StockTransfer):
+    post_save.connect(record_saved_change, sender=model, dispatch_uid=f'feed_{model.__name__}_save')
+# حذف ورودی‌ها و خروجی‌ها با یک INSERT در QuerySet.delete ثبت می‌شود
+for model in (Warehouse, MaterialType, Supplier, Customer, Inventory, StockTransfer):
+    post_delete.connect(record_deleted_change, sender=model, dispatch_uid=f'feed_{model.__name__}_delete')
@@ -0,0 +1,85 @@
+"""
+خلاصه خرید از هر هویت کالا (Supplier) و فروش به هر مشتری در یک دوره شمسی
+
+برای هر ماه شمسی یک کوئری تجمیعی روی ورودی‌ها (به ازای supplier) یا خروجی‌ها (به ازای
+customer) با ایندکس (jalali_year، jalali_month، طرف حساب) اجرا و نتیجه در کش نگه داشته
+می‌شود؛ خلاصه سال از ادغام خلاصه ۱۲ ماه آن ساخته می‌شود. هر ماه فضای نام جدای خود را در
+caching دارد و apply_rollup_deltas با هر ثبت، ویرایش یا حذف حرکت فقط ماه‌های همان حرکت‌ها
+را باطل می‌کند. نام طرف حساب‌ها در کش نیست و هر بار با یک کوئری خوانده می‌شود.
+"""
+from django.conf import settings
+from django.db.models import BigIntegerField, Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .caching import get_or_compute, period_namespace
+from .models import Customer, StockIn, StockOut, Supplier
+from .rollup import day_expression
+
+# (مدل حرکت، فیلد طرف حساب، مدل طرف حساب) هر نوع خلاصه
+SUMMARY_KINDS = {
+    'purchases': (StockIn, 'supplier', Supplier),
+    'sales': (StockOut, 'customer', Customer),
+}
+
+
+def month_summary(kind, year, month):
+    """
+    {شناسه طرف حساب: [تعداد حرکت، مقدار، مبلغ، مقدار دارای قیمت، آخرین روز]} یک ماه
+    بدون کش؛ فقط با یک کوئری گروه‌بندی شده
+    """
+    model, field, _ = SUMMARY_KINDS[kind]
+    rows = (
+        model.objects.filter(jalali_year=year, jalali_month=month)
+        .values_list(f'{field}_id')
+        .annotate(
+            transactions=Count('id'),
+            total_quantity=Sum(Coalesce('quantity', 0)),
+            total_amount=Sum(Coalesce('quantity', 0) * Coalesce('unit_price', 0), output_field=BigIntegerField()),
+            priced_quantity=Sum(Coalesce('quantity', 0), filter=Q(unit_price__isnull=False)),
+            last_day=Max(day_expression()),
+        )
+        .order_by()
+    )
+    return {pk: [count, quantity, amount, priced or 0, last] for pk, count, quantity, amount, priced, last in rows}
+
+
+def cached_month_summary(kind, year, month):
+    return get_or_compute(
+        period_namespace(year, month), kind,
+        lambda: month_summary(kind, year, month),
+        getattr(settings, 'SUMMARY_CACHE_TIMEOUT', 86400),
+    )
+
+
+def counterparty_summary(kind, year, month=None):
+    """
+    خلاصه خرید ('purchases') یا فروش ('sales') یک ماه یا کل یک سال شمسی، به ترتیب مبلغ
+    خروجی: [{'id', 'name', 'transactions', 'quantity', 'amount', 'average_price', 'last_date'}]
+    """
+    totals = {}
+    for current in ([month] if month else range(1, 13)):
+        for pk, (count, quantity, amount, priced, last) in cached_month_summary(kind, year, current).items():
+            total = totals.setdefault(pk, [0, 0, 0, 0, None])
+            total[0] += count
+            total[1] += quantity
+            total[2] += amount
+            total[3] += priced
+            if last and (total[4] is None or last > total[4]):
+                total[4] = last
+
+    _, _, counterparty = SUMMARY_KINDS[kind]
+    names = dict(counterparty.objects.filter(pk__in=[pk for pk in totals if pk]).values_list('pk', 'name'))
+    summary = [
+        {
+            'id': pk,
+            'name': names.get(pk, 'نامشخص'),
+            'transactions': count,
+            'quantity': quantity,
+            'amount': amount,
+            'average_price': round(amount / priced) if priced else None,
+            'last_date': last,
+        }
+        for pk, (count, quantity, amount, priced, last) in totals.items()
+    ]
+    summary.sort(key=lambda row: (-row['amount'], row['name']))
+    return summary
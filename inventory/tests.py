@@ -1,3 +1,1703 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import jdatetime
+import pandas as pd
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching, posting
+from .aging import stock_aging
+from .allocation import InsufficientStockError
+from .batch import BatchValidationError, post_movement_batch
+from .changefeed import advance, changes_since, decode_cursor, encode_cursor
+from .excel_utils import INVALID_DATE_MESSAGE, import_stock_in_excel
+from .live import InventoryBroadcaster
+from .models import (
+    ChangeLogEntry, CostLayer, Customer, DailyMovementRollup, Inventory, InventoryDelta, MaterialType, SearchEntry, StockIn, StockOut, StockOutAllocation,
+    StockTransfer, Supplier, Warehouse,
+)
+from .pagination import NEXT, EstimatedCountPaginator, decode_token, encode_token, paginate_keyset
+from .posting import ConcurrentUpdateError, apply_inventory_deltas_if_unchanged, save_stock_out_optimistic
+from .reports import current_jalali_year, monthly_movements
+from .rollup import in_day_range, ledger_rollup, stored_rollup
+from .search import normalize_text, search
+from .summaries import counterparty_summary
+from .turnover import metric_rows, turnover_metrics
+from .utils import (
+    GREGORIAN_TABLE_FIRST_YEAR, JALALI_TABLE_FIRST_YEAR, MISSING_DAY, day_range_bounds, filter_date_range,
+    filter_jalali_period, gregorian_day_table, jalali_day, jalali_day_table, jalali_period, parse_persian_date,
+    parse_persian_dates, persian_dates,
+)
+
+
+class OptimisticStockOutTests(TestCase):
+    """کنترل هم‌زمانی خوش‌بینانه خروجی‌ها با ستون نسخه"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.customer = Customer.objects.create(name='مشتری')
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                               quantity=100, unit_price=10, created_by=self.user)
+        self.inventory = Inventory.objects.get()
+
+    def stock_out(self, quantity):
+        return StockOut(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                        quantity=quantity, created_by=self.user)
+
+    def test_stale_version_is_rejected(self):
+        version = self.inventory.version
+        Inventory.objects.filter(pk=self.inventory.pk).update(version=version + 1)
+        with self.assertRaises(ConcurrentUpdateError):
+            apply_inventory_deltas_if_unchanged({self.inventory.pk: (-10, -100)}, {self.inventory.pk: version})
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.current_quantity, 100)
+
+    def test_conflict_is_retried(self):
+        original = posting.apply_inventory_deltas_if_unchanged
+        calls = []
+
+        def conflict_once(deltas, versions):
+            calls.append(deltas)
+            if len(calls) == 1:
+                raise ConcurrentUpdateError()
+            return original(deltas, versions)
+
+        with mock.patch.object(posting, 'apply_inventory_deltas_if_unchanged', side_effect=conflict_once):
+            stock_out = save_stock_out_optimistic(self.stock_out(30))
+
+        self.assertEqual(len(calls), 2)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.current_quantity, 70)
+        self.assertEqual(StockOut.objects.count(), 1)
+        self.assertEqual(stock_out.allocations.get().quantity, 30)
+
+    def test_insufficient_stock(self):
+        with self.assertRaises(InsufficientStockError):
+            save_stock_out_optimistic(self.stock_out(101))
+        self.assertFalse(StockOut.objects.exists())
+
+
+class ConcurrentStockOutTests(TransactionTestCase):
+    """چند کارگر هم‌زمان نباید موجودی را منفی کنند"""
+
+    workers = 8
+    attempts_per_worker = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.customer = Customer.objects.create(name='مشتری')
+        for name in ('ذوب آهن', 'فولاد خوزستان'):
+            StockIn.objects.create(warehouse=self.warehouse, material_type=self.material,
+                                   supplier=Supplier.objects.create(name=name),
+                                   quantity=50, unit_price=10, created_by=self.user)
+
+    def test_no_negative_balance_under_contention(self):
+        issued = []
+        barrier = threading.Barrier(self.workers)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.attempts_per_worker):
+                    stock_out = StockOut(warehouse=self.warehouse, material_type=self.material,
+                                         customer=self.customer, quantity=7, created_by=self.user)
+                    try:
+                        save_stock_out_optimistic(stock_out)
+                        issued.append(stock_out.quantity)
+                    except (InsufficientStockError, ConcurrentUpdateError, OperationalError):
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        balances = list(Inventory.objects.with_balance().values_list('on_hand', flat=True))
+        self.assertTrue(all(balance >= 0 for balance in balances))
+        self.assertEqual(sum(balances), 100 - sum(issued))
+        self.assertEqual(StockOut.objects.count(), len(issued))
+        self.assertEqual(sum(StockOutAllocation.objects.values_list('quantity', flat=True)), sum(issued))
+        # ۱۴ خروجی ۷تایی از ۱۰۰ واحد ممکن است
+        self.assertLessEqual(len(issued), 14)
+
+
+class FifoAllocationTests(TestCase):
+    """تخصیص FIFO خروجی بین لات‌ها و برگشت آن در ویرایش و حذف"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='secret')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.destination = Warehouse.objects.create(name='انبار مقصد', code='DEST')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.customer = Customer.objects.create(name='مشتری')
+        self.old = Supplier.objects.create(name='ذوب آهن')
+        self.new = Supplier.objects.create(name='فولاد خوزستان')
+        for supplier, quantity, unit_price in ((self.old, 5, 10), (self.new, 10, 20)):
+            StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=supplier,
+                                   quantity=quantity, unit_price=unit_price, created_by=self.user)
+
+    def balances(self):
+        return dict(Inventory.objects.with_balance().values_list('supplier_id', 'on_hand'))
+
+    def allocations(self, stock_out):
+        return list(stock_out.allocations.order_by('inventory_id').values_list('supplier_id', 'quantity', 'cost'))
+
+    def stock_out(self, quantity):
+        return StockOut.objects.create(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                                       quantity=quantity, created_by=self.user)
+
+    def test_issue_spans_lots_oldest_first(self):
+        stock_out = self.stock_out(8)
+        self.assertEqual(self.allocations(stock_out), [(self.old.pk, 5, 50), (self.new.pk, 3, 60)])
+        self.assertEqual(stock_out.cost_of_goods, 110)
+        self.assertEqual(self.balances(), {self.old.pk: 0, self.new.pk: 7})
+
+    def test_edit_and_delete_return_allocations(self):
+        stock_out = self.stock_out(8)
+        stock_out.quantity = 4
+        stock_out.save()
+        self.assertEqual(self.allocations(stock_out), [(self.old.pk, 4, 40)])
+        self.assertEqual(self.balances(), {self.old.pk: 1, self.new.pk: 10})
+
+        stock_out.delete()
+        self.assertFalse(StockOutAllocation.objects.exists())
+        self.assertEqual(self.balances(), {self.old.pk: 5, self.new.pk: 10})
+
+    def test_admin_reports_insufficient_stock_as_form_error(self):
+        self.client.force_login(self.user)
+        data = {
+            'warehouse': self.warehouse.pk, 'material_type': self.material.pk, 'customer': self.customer.pk,
+            'quantity': 50, 'unit_price': 30, 'invoice_number': '', 'notes': '', 'created_by': self.user.pk,
+            'allocations-TOTAL_FORMS': 0, 'allocations-INITIAL_FORMS': 0,
+            'allocations-MIN_NUM_FORMS': 0, 'allocations-MAX_NUM_FORMS': 1000,
+        }
+        response = self.client.post(reverse('admin:inventory_stockout_add'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.non_field_errors(),
+                         [str(InsufficientStockError(50, 15))])
+        self.assertFalse(StockOut.objects.exists())
+
+        # در ویرایش، مقدار برداشته شده خود خروجی هم قابل خروج است
+        stock_out = self.stock_out(15)
+        data.update(quantity=15, **{'allocations-TOTAL_FORMS': 2, 'allocations-INITIAL_FORMS': 2})
+        for number, allocation in enumerate(stock_out.allocations.order_by('pk')):
+            data[f'allocations-{number}-id'] = allocation.pk
+            data[f'allocations-{number}-stock_out'] = stock_out.pk
+        response = self.client.post(reverse('admin:inventory_stockout_change', args=[stock_out.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.balances(), {self.old.pk: 0, self.new.pk: 0})
+
+    def test_admin_transfer_reports_insufficient_stock(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:inventory_stocktransfer_add'), {
+            'source_warehouse': self.warehouse.pk, 'destination_warehouse': self.destination.pk,
+            'material_type': self.material.pk, 'quantity': 16, 'notes': '',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.non_field_errors(),
+                         [str(InsufficientStockError(16, 15))])
+        self.assertFalse(StockTransfer.objects.exists())
+
+
+class ValuationTests(TestCase):
+    """ارزش لات‌ها و بهای تمام‌شده به روش میانگین موزون و FIFO"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.customer = Customer.objects.create(name='مشتری')
+
+    def receive(self, quantity, unit_price):
+        return StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                      quantity=quantity, unit_price=unit_price, created_by=self.user)
+
+    def issue(self, quantity):
+        return StockOut.objects.create(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                                       quantity=quantity, created_by=self.user)
+
+    def lot(self):
+        return Inventory.objects.with_balance().values_list('on_hand', 'on_hand_value').get()
+
+    def open_layers(self):
+        return list(CostLayer.objects.filter(remaining_quantity__gt=0).order_by('id')
+                    .values_list('remaining_quantity', 'unit_cost'))
+
+    def test_moving_average(self):
+        self.receive(10, 100)
+        self.receive(10, 200)
+        stock_out = self.issue(5)
+        self.assertEqual(stock_out.cost_of_goods, 750)
+        self.assertEqual(self.lot(), (15, 2250))
+        # خروج کل باقی‌مانده کل ارزش را بدون خطای گرد کردن برمی‌دارد
+        self.assertEqual(self.issue(15).cost_of_goods, 2250)
+        self.assertEqual(self.lot(), (0, 0))
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_fifo_issue_spans_layers(self):
+        self.receive(10, 100)
+        self.receive(10, 200)
+        stock_out = self.issue(15)
+        self.assertEqual(stock_out.cost_of_goods, 10 * 100 + 5 * 200)
+        self.assertEqual(stock_out.allocations.get().cost, 2000)
+        self.assertEqual(self.lot(), (5, 1000))
+        self.assertEqual(self.open_layers(), [(5, 200)])
+
+        # حذف خروجی مقدار و بها را برمی‌گرداند
+        stock_out.delete()
+        self.assertEqual(self.lot(), (20, 3000))
+        self.assertEqual(sum(quantity for quantity, _ in self.open_layers()), 20)
+
+    def test_receipt_edit_and_delete_reverse_value(self):
+        stock_in = self.receive(10, 100)
+        self.receive(10, 200)
+        stock_in.unit_price = 150
+        stock_in.save()
+        self.assertEqual(self.lot(), (20, 3500))
+        stock_in.quantity = 4
+        stock_in.save()
+        self.assertEqual(self.lot(), (14, 2600))
+        stock_in.delete()
+        self.assertEqual(self.lot(), (10, 2000))
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_fifo_receipt_edit_moves_its_layer(self):
+        stock_in = self.receive(10, 100)
+        self.receive(10, 200)
+        stock_in.quantity = 12
+        stock_in.unit_price = 120
+        stock_in.save()
+        self.assertEqual(self.lot(), (22, 3440))
+        self.assertEqual(self.open_layers(), [(12, 120), (10, 200)])
+        self.assertEqual(self.issue(13).cost_of_goods, 12 * 120 + 200)
+
+    def backfill(self):
+        expected = (self.lot(), list(StockOut.objects.order_by('pk').values_list('cost_of_goods', flat=True)),
+                    self.open_layers())
+        Inventory.objects.update(stock_value=0)
+        StockOut.objects.update(cost_of_goods=None)
+        StockOutAllocation.objects.update(cost=0)
+        CostLayer.objects.all().delete()
+        call_command('backfill_inventory_costs', stdout=mock.MagicMock())
+        actual = (self.lot(), list(StockOut.objects.order_by('pk').values_list('cost_of_goods', flat=True)),
+                  self.open_layers())
+        self.assertEqual(actual, expected)
+
+    def test_backfill_replays_average_costs(self):
+        self.receive(10, 100)
+        self.issue(4)
+        self.receive(10, 200)
+        self.issue(7)
+        self.backfill()
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_backfill_rebuilds_fifo_layers(self):
+        self.receive(10, 100)
+        self.issue(4)
+        self.receive(10, 200)
+        self.issue(7)
+        self.backfill()
+        self.assertEqual(self.open_layers(), [(9, 200)])
+
+
+class MovementBatchTests(TestCase):
+    """ثبت دسته‌ای حرکات: همه یا هیچ، با تعداد کوئری ثابت"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.destination = Warehouse.objects.create(name='انبار مقصد', code='DEST')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.customer = Customer.objects.create(name='مشتری')
+
+    def movements(self, count):
+        """هر سه حرکت: ورود ۱۰، خروج ۴ و انتقال ۳ واحد"""
+        rows = []
+        for _ in range(count):
+            rows += [
+                {'type': 'in', 'warehouse': self.warehouse.pk, 'material_type': self.material.pk,
+                 'supplier': self.supplier.pk, 'quantity': 10, 'unit_price': 100},
+                {'type': 'out', 'warehouse': self.warehouse.pk, 'material_type': self.material.pk,
+                 'customer': self.customer.pk, 'quantity': 4, 'unit_price': 150},
+                {'type': 'transfer', 'source_warehouse': self.warehouse.pk,
+                 'destination_warehouse': self.destination.pk, 'material_type': self.material.pk, 'quantity': 3},
+            ]
+        return rows
+
+    def snapshot(self):
+        return [model.objects.count() for model in
+                (StockIn, StockOut, StockTransfer, Inventory, StockOutAllocation, SearchEntry, ChangeLogEntry)]
+
+    def test_short_line_rejects_whole_batch(self):
+        before = self.snapshot()
+        movements = self.movements(2) + [{'type': 'out', 'warehouse': self.warehouse.pk,
+                                          'material_type': self.material.pk, 'customer': self.customer.pk,
+                                          'quantity': 7}]
+        with self.assertRaises(BatchValidationError) as raised:
+            post_movement_batch(movements, self.user)
+        self.assertEqual(raised.exception.errors, [{'index': 6, 'message': str(InsufficientStockError(7, 6))}])
+        self.assertEqual(self.snapshot(), before)
+
+    def test_new_lots_invalidate_caches(self):
+        namespaces = (caching.DASHBOARD, caching.AVAILABILITY, caching.LEDGER)
+        batches = [
+            [{'type': 'in', 'warehouse': self.warehouse.pk, 'material_type': self.material.pk,
+              'supplier': self.supplier.pk, 'quantity': 10, 'unit_price': 100}],
+            # انتقال بدون مبدا فقط لات جدید مقصد را می‌سازد
+            [{'type': 'transfer', 'destination_warehouse': self.destination.pk,
+              'material_type': MaterialType.objects.create(name='ورق ۲').pk, 'quantity': 3}],
+        ]
+        for movements in batches:
+            with self.subTest(type=movements[0]['type']):
+                before = {namespace: caching.generation(namespace) for namespace in namespaces}
+                lots = Inventory.objects.count()
+                with self.captureOnCommitCallbacks(execute=True):
+                    post_movement_batch(movements, self.user)
+                self.assertEqual(Inventory.objects.count(), lots + 1)
+                for namespace in namespaces:
+                    self.assertGreater(caching.generation(namespace), before[namespace], namespace)
+
+    def test_endpoint_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('inventory:post_movements_batch')
+        body = json.dumps({'movements': self.movements(1)})
+        response = client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(StockIn.objects.exists())
+
+        client.get(reverse('inventory:warehouses'))
+        response = client.post(url, body, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StockIn.objects.count(), 1)
+
+    def test_failure_while_writing_rolls_back(self):
+        before = self.snapshot()
+        with mock.patch('inventory.batch.record_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                post_movement_batch(self.movements(2), self.user)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_posts_in_fixed_number_of_queries(self):
+        def posting_queries(count):
+            with CaptureQueriesContext(connection) as queries:
+                results = post_movement_batch(self.movements(count), self.user)
+            self.assertEqual(len(results['stock_out']), count)
+            return len(queries)
+
+        # دسته اول لات‌های جدید می‌سازد؛ مقایسه روی لات‌های موجود
+        posting_queries(1)
+        self.assertEqual(posting_queries(20), posting_queries(2))
+        balances = dict(Inventory.objects.with_balance().values_list('warehouse_id', 'on_hand'))
+        self.assertEqual(balances, {self.warehouse.pk: 23 * 3, self.destination.pk: 23 * 3})
+        self.assertEqual(StockOutAllocation.objects.count(), 23)
+
+
+class HotInventoryTests(TestCase):
+    """ثبت روی لات‌های پرتردد در خانه‌های شمارنده و فشرده‌سازی آن‌ها"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.customer = Customer.objects.create(name='مشتری')
+        self.receive(10)
+        self.inventory = Inventory.objects.get()
+        Inventory.objects.filter(pk=self.inventory.pk).update(is_hot=True)
+
+    def receive(self, quantity):
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                               quantity=quantity, unit_price=100, created_by=self.user)
+
+    def stock_out(self, quantity):
+        return StockOut(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                        quantity=quantity, created_by=self.user)
+
+    @override_settings(MOVEMENT_ROLLUP_STRIPES=1)
+    def test_postings_go_to_slots(self):
+        slots = iter(range(5))
+        # randrange(1) خانه جمع روزانه است و بقیه خانه شمارنده موجودی
+        with mock.patch('inventory.posting.random.randrange', side_effect=lambda n: next(slots) if n > 1 else 0):
+            self.receive(5)
+            self.receive(7)
+            self.stock_out(4).save()
+            save_stock_out_optimistic(self.stock_out(3))
+            self.receive(1)
+
+        main = Inventory.objects.values_list('current_quantity', 'stock_value', 'version').get()
+        self.assertEqual(main, (10, 1000, self.inventory.version))
+        slots = dict(InventoryDelta.objects.values_list('slot', 'quantity'))
+        self.assertEqual(slots, {0: 5, 1: 7, 2: -4, 3: -3, 4: 1})
+        balance = Inventory.objects.with_balance().values_list('on_hand', 'on_hand_value').get()
+        self.assertEqual(balance, (16, 1600))
+
+        with self.assertRaises(InsufficientStockError):
+            save_stock_out_optimistic(self.stock_out(17))
+
+    def test_compaction_keeps_totals(self):
+        for quantity in (5, 7, 3):
+            self.receive(quantity)
+        self.stock_out(6).save()
+        before = Inventory.objects.with_balance().values_list('on_hand', 'on_hand_value').get()
+
+        self.assertEqual(posting.compact_inventory_counters(), 1)
+        self.assertEqual(Inventory.objects.with_balance().values_list('on_hand', 'on_hand_value').get(), before)
+        self.assertEqual(Inventory.objects.values_list('current_quantity', 'stock_value').get(), before)
+        self.assertFalse(InventoryDelta.objects.exclude(quantity=0, value=0).exists())
+        self.assertEqual(posting.compact_inventory_counters(), 0)
+
+
+class CachingTests(TestCase):
+    """باطل‌سازی نسل‌ها پس از commit و محاسبه دوباره فقط توسط یک فراخوان"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def test_posting_bumps_generation_after_commit(self):
+        before = {namespace: caching.generation(namespace)
+                  for namespace in (caching.DASHBOARD, caching.AVAILABILITY, caching.LEDGER)}
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                   quantity=10, unit_price=5, created_by=self.user)
+            # پیش از commit خواننده‌ها هنوز نسل قبلی را می‌بینند
+            self.assertEqual({namespace: caching.generation(namespace) for namespace in before}, before)
+        for namespace, generation in before.items():
+            with self.subTest(namespace=namespace):
+                self.assertNotEqual(caching.generation(namespace), generation)
+
+    def test_only_one_caller_recomputes(self):
+        calls = []
+        barrier = threading.Barrier(6)
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'fresh'
+
+        def worker():
+            barrier.wait()
+            results.append(caching.get_or_compute(caching.DASHBOARD, 'stats', compute, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['fresh'] * 6)
+
+    def test_waiters_get_stale_value_while_recomputing(self):
+        self.assertEqual(caching.get_or_compute(caching.DASHBOARD, 'stats', lambda: 'old', 60), 'old')
+        caching._bump(caching.DASHBOARD)
+        key = f'inventory:{caching.DASHBOARD}:{caching.generation(caching.DASHBOARD)}:stats'
+        # پردازش دیگری قفل محاسبه را گرفته است
+        cache.add(f'{key}:lock', 1)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(caching.get_or_compute(caching.DASHBOARD, 'stats', compute, 60), 'old')
+        compute.assert_not_called()
+
+        cache.delete(f'{key}:lock')
+        self.assertEqual(caching.get_or_compute(caching.DASHBOARD, 'stats', compute, 60), 'new')
+        compute.assert_called_once()
+
+
+class KeysetPaginationTests(TestCase):
+    """صفحه‌بندی کلیدی با توکن امضا شده و شمارش تخمینی ادمین"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        material = MaterialType.objects.create(name='میلگرد ۱۶')
+        supplier = Supplier.objects.create(name='ذوب آهن')
+        for _ in range(8):
+            StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=supplier,
+                                   quantity=1, unit_price=5, created_by=self.user)
+        # چهار ردیف میانی با created_at یکسان
+        pks = list(StockIn.objects.order_by('pk').values_list('pk', flat=True))
+        StockIn.objects.filter(pk__in=pks[2:6]).update(created_at=timezone.now() - timedelta(days=1))
+        self.expected = list(StockIn.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def test_token_round_trip(self):
+        row = StockIn.objects.first()
+        self.assertEqual(decode_token(encode_token(row, NEXT)), (row.created_at, row.pk, NEXT))
+
+    def test_tampered_token_restarts_from_first_page(self):
+        token = encode_token(StockIn.objects.first(), NEXT)
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        self.assertIsNone(decode_token(tampered))
+        self.assertIsNone(decode_token('not-a-token'))
+        page = paginate_keyset(StockIn.objects.all(), tampered, 3)
+        self.assertEqual([row.pk for row in page], self.expected[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_walks_ties_forward_and_back(self):
+        pages = []
+        page = paginate_keyset(StockIn.objects.all(), None, 3)
+        pages.append([row.pk for row in page])
+        while page.has_next():
+            page = paginate_keyset(StockIn.objects.all(), page.next_token, 3)
+            pages.append([row.pk for row in page])
+        self.assertEqual([pk for rows in pages for pk in rows], self.expected)
+
+        backward = [[row.pk for row in page]]
+        while page.has_previous():
+            page = paginate_keyset(StockIn.objects.all(), page.previous_token, 3)
+            backward.append([row.pk for row in page])
+        self.assertEqual(backward, pages[::-1])
+
+    def test_estimated_count_fallback(self):
+        last_pk = StockIn.objects.order_by('-pk').values_list('pk', flat=True).first()
+        StockIn.objects.filter(pk=self.expected[-1]).delete()
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1000):
+            self.assertEqual(EstimatedCountPaginator(StockIn.objects.order_by('pk'), 5).count, 7)
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=5):
+            # بدون فیلتر: بزرگ‌ترین id به جای COUNT(*)
+            self.assertEqual(EstimatedCountPaginator(StockIn.objects.order_by('pk'), 5).count, last_pk)
+            # با فیلتر تخمینی در SQLite نیست و دقیق شمرده می‌شود
+            filtered = StockIn.objects.filter(pk__in=self.expected[:3]).order_by('pk')
+            self.assertEqual(EstimatedCountPaginator(filtered, 5).count, 3)
+
+
+class SearchIndexTests(TestCase):
+    """نرمال‌سازی متن، جستجوی پیشوندی و همگام ماندن نمایه با ذخیره و حذف"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='کیک')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def stock_in(self, invoice_number):
+        return StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                      quantity=1, unit_price=5, invoice_number=invoice_number, created_by=self.user)
+
+    def found(self, text):
+        return sorted(search(StockIn.objects.all(), text).values_list('invoice_number', flat=True))
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('كيك'), normalize_text('کیک'))
+        self.assertEqual(normalize_text('ميلگرد ۱۶'), 'میلگرد 16')
+        self.assertEqual(normalize_text('نیم‌فاصله', 'كَتاب'), 'نیم فاصله کتاب')
+        self.assertEqual(normalize_text('INV-1402', None, ''), 'inv 1402')
+
+    def test_prefix_matching(self):
+        self.stock_in('INV-1402')
+        self.stock_in('INV-1501')
+        self.assertEqual(self.found('inv-14'), ['INV-1402'])
+        self.assertEqual(self.found('INV'), ['INV-1402', 'INV-1501'])
+        self.assertEqual(self.found('كيك ذوب 15'), ['INV-1501'])
+        self.assertEqual(self.found('فولاد'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        first = self.stock_in('INV-1402')
+        self.stock_in('INV-1501')
+        first.invoice_number = 'BILL-7'
+        first.save()
+        self.assertEqual(self.found('inv'), ['INV-1501'])
+        self.assertEqual(self.found('bill'), ['BILL-7'])
+
+        self.supplier.name = 'فولاد مبارکه'
+        self.supplier.save()
+        self.assertEqual(self.found('مبارکه'), ['BILL-7', 'INV-1501'])
+
+        first.delete()
+        self.assertEqual(self.found('bill'), [])
+        with CaptureQueriesContext(connection) as queries:
+            StockIn.objects.all().delete()
+        self.assertFalse(SearchEntry.objects.filter(kind='stockin').exists())
+        self.assertEqual(len([query for query in queries if 'inventory_searchentry' in query['sql']]), 1)
+        self.assertEqual(self.found('inv'), [])
+
+    def test_migration_backfills_missing_entries(self):
+        self.stock_in('INV-1402')
+        self.stock_in('INV-1501')
+        SearchEntry.objects.filter(kind='stockin', object_id=StockIn.objects.order_by('pk').first().pk).delete()
+        migration = importlib.import_module('inventory.migrations.0022_backfill_search_index')
+        migration.backfill_search_index(apps, None)
+        self.assertEqual(SearchEntry.objects.filter(kind='stockin').count(), 2)
+        self.assertEqual(self.found('inv'), ['INV-1402', 'INV-1501'])
+
+
+class ChangeFeedTests(TestCase):
+    """توکن خوراک تغییرات، reset، ثبت گروهی حذف‌ها و شکاف شماره‌های دیر commit شده"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.cursor = changes_since(None, 10)['cursor']
+
+    def stock_in(self, invoice_number):
+        return StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                      quantity=1, unit_price=5, invoice_number=invoice_number, created_by=self.user)
+
+    def read(self, limit=100):
+        page = changes_since(self.cursor, limit)
+        self.assertFalse(page['reset'])
+        self.cursor = page['cursor']
+        return page
+
+    def test_reset_for_missing_invalid_or_pruned_cursor(self):
+        self.assertTrue(changes_since(None, 10)['reset'])
+        self.assertTrue(changes_since('not-a-token', 10)['reset'])
+        ChangeLogEntry.objects.create(kind='warehouse', object_id=self.warehouse.pk)
+        ChangeLogEntry.objects.filter(pk__lt=ChangeLogEntry.objects.order_by('-pk')[0].pk).delete()
+        self.assertTrue(changes_since(encode_cursor(0), 10)['reset'])
+
+    def test_cursor_pages_latest_state(self):
+        stock_in = self.stock_in('INV-1')
+        stock_in.invoice_number = 'INV-2'
+        stock_in.save()
+        page = self.read()
+        movements = [change for change in page['changes'] if change['kind'] == 'stockin']
+        self.assertEqual(len(movements), 1)
+        self.assertEqual(movements[0]['data']['invoice_number'], 'INV-2')
+        self.assertEqual(self.read()['changes'], [])
+
+        Warehouse.objects.create(name='انبار دوم', code='W2')
+        Warehouse.objects.create(name='انبار سوم', code='W3')
+        first = self.read(limit=1)
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(self.read()['changes']), 1)
+
+    def test_bulk_delete_records_with_one_insert(self):
+        for number in range(5):
+            self.stock_in(f'INV-{number}')
+        self.read()
+        with CaptureQueriesContext(connection) as queries:
+            StockIn.objects.all().delete()
+        inserts = [query['sql'] for query in queries
+                   if query['sql'].startswith('INSERT INTO "inventory_changelogentry"') and "'delete'" in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        changes = [change for change in self.read()['changes'] if change['kind'] == 'stockin']
+        self.assertEqual(len(changes), 5)
+        self.assertTrue(all(change['action'] == 'delete' and change['data'] is None for change in changes))
+
+    def test_late_commit_fills_gap(self):
+        warehouses = [Warehouse.objects.create(name=f'انبار {i}', code=f'W{i}') for i in range(3)]
+        entries = list(ChangeLogEntry.objects.filter(kind='warehouse', object_id__in=[w.pk for w in warehouses]))
+        # ردیف وسط هنوز commit نشده است
+        late = entries[1]
+        ChangeLogEntry.objects.filter(pk=late.pk).delete()
+        seen = {change['id'] for change in self.read()['changes']}
+        self.assertEqual(seen, {warehouses[0].pk, warehouses[2].pk})
+        self.assertEqual(decode_cursor(self.cursor)[1][0][:2], (late.pk, late.pk))
+
+        late.save()
+        self.assertEqual([change['id'] for change in self.read()['changes']], [warehouses[1].pk])
+        self.assertEqual(decode_cursor(self.cursor)[1], [])
+
+    def test_gaps_split_and_expire(self):
+        after, gaps = advance(10, [], [12, 15])
+        self.assertEqual(after, 15)
+        self.assertEqual([gap[:2] for gap in gaps], [(11, 11), (13, 14)])
+        after, gaps = advance(after, gaps, [13, 16])
+        self.assertEqual((after, [gap[:2] for gap in gaps]), (16, [(11, 11), (14, 14)]))
+        # شماره rollback شده پس از CHANGE_FEED_GAP_SECONDS کنار گذاشته می‌شود
+        with override_settings(CHANGE_FEED_GAP_SECONDS=60):
+            self.assertEqual(advance(after, gaps, [], now=gaps[0][2] + 61), (16, []))
+
+    def test_live_poll_picks_up_late_inventory_change(self):
+        lot = Inventory.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier)
+        hub = InventoryBroadcaster()
+        hub.poll()
+        ChangeLogEntry.objects.create(kind='warehouse', object_id=self.warehouse.pk)
+        late = ChangeLogEntry.objects.create(kind='inventory', object_id=lot.pk)
+        ChangeLogEntry.objects.create(kind='warehouse', object_id=self.warehouse.pk)
+        ChangeLogEntry.objects.filter(pk=late.pk).delete()
+        self.assertEqual(hub.poll(), [])
+
+        late.save()
+        changes = hub.poll()
+        self.assertEqual([change['inventory'] for change in changes], [lot.pk])
+        self.assertEqual(hub.gaps, [])
+
+
+class AutocompleteTests(TestCase):
+    """تکمیل خودکار پیشوندی، صفحه‌بندی با توکن و ETag از نسخه جدول"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.client.force_login(self.user)
+        self.url = reverse('inventory:get_suppliers')
+        for name in ('فولاد مبارکه', 'فولاد خوزستان', 'فولاد كاوه', 'ذوب آهن'):
+            Supplier.objects.create(name=name)
+
+    def get(self, **params):
+        return self.client.get(self.url, params)
+
+    def test_prefix_pages_follow_cursor(self):
+        response = self.get(q='فولاد', limit=2)
+        first = response.json()
+        # ترتیب نام نرمال شده (کد نویسه): م پیش از ک
+        self.assertEqual([row['name'] for row in first['suppliers']], ['فولاد خوزستان', 'فولاد مبارکه'])
+        self.assertIsNotNone(first['next'])
+
+        second = self.get(q='فولاد', limit=2, cursor=first['next']).json()
+        self.assertEqual([row['name'] for row in second['suppliers']], ['فولاد كاوه'])
+        self.assertIsNone(second['next'])
+
+        # حروف عربی و فارسی پرسش و نام یکسان نرمال می‌شوند
+        self.assertEqual([row['name'] for row in self.get(q='فولاد ک').json()['suppliers']], ['فولاد كاوه'])
+        self.assertEqual(self.get(q='آهن').json()['suppliers'], [])
+
+    def test_inactive_warehouses_are_hidden(self):
+        Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        Warehouse.objects.create(name='انبار قدیمی', code='OLD', is_active=False)
+        rows = self.client.get(reverse('inventory:get_warehouses'), {'q': 'انبار'}).json()['warehouses']
+        self.assertEqual([row['code'] for row in rows], ['MAIN'])
+
+    def test_etag_follows_table_version_and_params(self):
+        response = self.get(q='فولاد')
+        etag = response['ETag']
+        self.assertIn(f'max-age={settings.AUTOCOMPLETE_MAX_AGE}', response['Cache-Control'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url, {'q': 'فولاد'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse([query for query in queries if 'inventory_supplier' in query['sql']])
+        self.assertNotEqual(self.get(q='ذوب')['ETag'], etag)
+
+        # تغییر جدول‌های دیگر نسخه این جدول را عوض نمی‌کند
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name='فولاد گستر')
+        self.assertEqual(self.client.get(self.url, {'q': 'فولاد'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(name='فولاد هرمزگان')
+        response = self.client.get(self.url, {'q': 'فولاد'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['suppliers']), 4)
+
+
+class StockAvailabilityTests(TestCase):
+    """موجودی دسته‌ای کالاها به تفکیک انبار و هویت، فیلترها و کش تا ثبت حرکت بعدی"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.client.force_login(self.user)
+        self.url = reverse('inventory:get_stock_availability')
+        self.main = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.branch = Warehouse.objects.create(name='انبار شعبه', code='BRANCH')
+        self.rebar = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.sheet = MaterialType.objects.create(name='ورق ۲')
+        self.empty = MaterialType.objects.create(name='تیرآهن ۱۴')
+        self.esfahan = Supplier.objects.create(name='ذوب آهن')
+        self.khuzestan = Supplier.objects.create(name='فولاد خوزستان')
+        with self.captureOnCommitCallbacks(execute=True):
+            for warehouse, material, supplier, quantity in (
+                (self.main, self.rebar, self.esfahan, 10),
+                (self.main, self.rebar, self.khuzestan, 5),
+                (self.branch, self.rebar, self.esfahan, 3),
+                (self.main, self.sheet, self.esfahan, 7),
+            ):
+                self.receive(warehouse, material, supplier, quantity)
+
+    def receive(self, warehouse, material, supplier, quantity):
+        StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=supplier,
+                               quantity=quantity, unit_price=5, created_by=self.user)
+
+    def availability(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['materials']
+
+    def test_breakdown_by_warehouse_and_supplier(self):
+        result = self.availability(materials=f'{self.rebar.pk},{self.sheet.pk},{self.empty.pk}')
+        rebar = result[str(self.rebar.pk)]
+        self.assertEqual(rebar['total'], 18)
+        self.assertEqual({line['name']: line['quantity'] for line in rebar['warehouses']},
+                         {'انبار اصلی': 15, 'انبار شعبه': 3})
+        self.assertEqual({line['name']: line['quantity'] for line in rebar['suppliers']},
+                         {'ذوب آهن': 13, 'فولاد خوزستان': 5})
+        self.assertEqual(result[str(self.sheet.pk)]['total'], 7)
+        self.assertEqual(result[str(self.empty.pk)], {'total': 0, 'warehouses': [], 'suppliers': []})
+
+        filtered = self.availability(materials=self.rebar.pk, warehouse=self.main.pk, supplier=self.khuzestan.pk)
+        self.assertEqual(filtered[str(self.rebar.pk)]['total'], 5)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'materials': 'x,'}).status_code, 400)
+        with override_settings(AVAILABILITY_MAX_MATERIALS=2):
+            ids = f'{self.rebar.pk},{self.sheet.pk},{self.empty.pk}'
+            self.assertEqual(self.client.get(self.url, {'materials': ids}).status_code, 400)
+
+    def test_cached_until_next_posting(self):
+        self.assertEqual(self.availability(materials=self.rebar.pk)[str(self.rebar.pk)]['total'], 18)
+        with CaptureQueriesContext(connection) as queries:
+            self.availability(materials=self.rebar.pk)
+        self.assertFalse([query for query in queries if 'inventory_inventory' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.branch, self.rebar, self.khuzestan, 4)
+        self.assertEqual(self.availability(materials=self.rebar.pk)[str(self.rebar.pk)]['total'], 22)
+
+
+class InventoryStreamTests(TestCase):
+    """زیر WSGI هر درخواست پخش زنده یک دور کوتاه از Last-Event-ID است نه اتصال باز"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.client.force_login(self.user)
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.other = Warehouse.objects.create(name='انبار شعبه', code='BRANCH')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def poll(self, url, last_event_id=None):
+        headers = {'HTTP_LAST_EVENT_ID': last_event_id} if last_event_id else {}
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        event_id = [line[4:] for line in body.splitlines() if line.startswith('id: ')][-1]
+        balances = [json.loads(line[6:]) for line in body.splitlines() if line.startswith('data: ')]
+        return event_id, balances
+
+    def test_short_poll_resumes_from_last_event_id(self):
+        url = reverse('inventory:inventory_stream')
+        branch_url = reverse('inventory:inventory_stream_warehouse', args=[self.other.pk])
+        event_id, balances = self.poll(url)
+        branch_id, _ = self.poll(branch_url)
+        self.assertEqual(balances, [])
+
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                               quantity=12, unit_price=5, created_by=self.user)
+        event_id, balances = self.poll(url, event_id)
+        lot = Inventory.objects.get(warehouse=self.warehouse)
+        self.assertEqual([(change['inventory'], change['on_hand']) for change in balances], [(lot.pk, 12)])
+        self.assertEqual(self.poll(url, event_id)[1], [])
+
+        # نمایشگر انبار دیگر رویداد نمی‌گیرد ولی موقعیتش جلو می‌رود
+        branch_id, balances = self.poll(branch_url, branch_id)
+        self.assertEqual(balances, [])
+        self.assertEqual(self.poll(branch_url, branch_id)[1], [])
+
+        # شناسه نامعتبر مثل اتصال اول از موقعیت فعلی شروع می‌کند
+        self.assertEqual(self.poll(url, 'not-a-token')[1], [])
+
+    def receive(self, count):
+        for number in range(count):
+            StockIn.objects.create(warehouse=self.warehouse, material_type=self.material,
+                                   supplier=Supplier.objects.create(name=f'هویت {number}'),
+                                   quantity=number + 1, unit_price=5, created_by=self.user)
+
+    @override_settings(CHANGE_FEED_MAX_PAGE_SIZE=3)
+    def test_backlog_is_read_in_pages(self):
+        url = reverse('inventory:inventory_stream')
+        event_id, _ = self.poll(url)
+        self.receive(5)
+        with CaptureQueriesContext(connection) as queries:
+            event_id, balances = self.poll(url, event_id)
+        self.assertEqual(sorted(change['on_hand'] for change in balances), [1, 2, 3, 4, 5])
+        feed_reads = [query['sql'] for query in queries if 'FROM "inventory_changelogentry"' in query['sql']
+                      and '"inventory_changelogentry"."kind"' in query['sql']]
+        self.assertGreater(len(feed_reads), 1)
+        self.assertTrue(all(sql.endswith('LIMIT 3') for sql in feed_reads))
+        self.assertEqual(self.poll(url, event_id)[1], [])
+
+    def test_pruned_event_id_starts_from_now(self):
+        url = reverse('inventory:inventory_stream')
+        event_id, _ = self.poll(url)
+        self.receive(2)
+        ChangeLogEntry.objects.filter(pk__lt=ChangeLogEntry.objects.order_by('-pk')[0].pk).delete()
+        self.assertEqual(self.poll(url, event_id)[1], [])
+
+    def test_restarted_broadcaster_starts_from_now(self):
+        hub = InventoryBroadcaster()
+        hub.poll()
+        self.receive(2)
+
+        async def restart():
+            with mock.patch.object(InventoryBroadcaster, 'run', new=mock.AsyncMock()):
+                hub.subscribe()
+
+        # وظیفه قبلی پس از رفتن آخرین نمایشگر تمام شده است
+        hub.task = None
+        asyncio.run(restart())
+        self.assertEqual(hub.poll(), [])
+        self.receive(1)
+        self.assertEqual(len(hub.poll()), 1)
+
+
+class ConditionalRequestTests(TestCase):
+    """پاسخ 304 صفحات فهرست تا عوض شدن نسخه دفتر"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester', password='secret')
+        self.client.force_login(self.user)
+        self.url = reverse('inventory:warehouses')
+        warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        material = MaterialType.objects.create(name='میلگرد ۱۶')
+        supplier = Supplier.objects.create(name='ذوب آهن')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock_in = StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=supplier,
+                                                   quantity=1, unit_price=5, created_by=self.user)
+
+    def etag(self):
+        # اولین پاسخ کوکی CSRF را می‌گذارد و ETag بعدی با آن ساخته می‌شود
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_ledger_returns_not_modified(self):
+        etag = self.etag()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries if 'inventory_warehouse' in query['sql']])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_edit_and_bulk_delete_change_etag(self):
+        etag = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.filter(pk=self.stock_in.pk).update(invoice_number='INV-1')
+        # بروزرسانی مستقیم بدون ثبت نسخه را عوض نمی‌کند
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock_in.invoice_number = 'INV-2'
+            self.stock_in.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.all().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pending_messages_skip_conditional_response(self):
+        etag = self.etag()
+        session = self.client.session
+        session['_messages'] = '[]'
+        session.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+        session = self.client.session
+        del session['_messages']
+        session.save()
+        self.client.cookies['messages'] = 'pending'
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AdminQueryCountTests(TestCase):
+    """تعداد کوئری صفحه‌های ادمین نباید با تعداد ردیف‌ها رشد کند"""
+
+    changelists = ['inventory', 'stockin', 'stockout', 'stocktransfer']
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='مشتری')
+        self.destination = Warehouse.objects.create(name='انبار مقصد', code='DEST')
+        self.rows = 0
+
+    def add_rows(self, count):
+        """هر ردیف با انبار، کالا و هویت جدا تا هر کوئری تکراری دیده شود"""
+        for _ in range(count):
+            self.rows += 1
+            warehouse = Warehouse.objects.create(name=f'انبار {self.rows}', code=f'W{self.rows}')
+            material = MaterialType.objects.create(name=f'میلگرد {self.rows}')
+            supplier = Supplier.objects.create(name=f'هویت {self.rows}')
+            StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=supplier,
+                                   customer=self.customer, quantity=10, unit_price=5, created_by=self.user)
+            save_stock_out_optimistic(StockOut(warehouse=warehouse, material_type=material, supplier=supplier,
+                                               customer=self.customer, quantity=2, created_by=self.user))
+            StockTransfer.objects.create(source_warehouse=warehouse, destination_warehouse=self.destination,
+                                         material_type=material, quantity=3, created_by=self.user)
+
+    def get_changelist(self, model_name, **params):
+        response = self.client.get(reverse(f'admin:inventory_{model_name}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, model_name):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_changelist(model_name)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        expected = {name: self.count_queries(name) for name in self.changelists}
+        self.add_rows(10)
+        for name in self.changelists:
+            with self.subTest(changelist=name), self.assertNumQueries(expected[name]):
+                self.get_changelist(name)
+
+    def test_stock_out_allocations_inline_queries_do_not_grow(self):
+        warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        material = MaterialType.objects.create(name='میلگرد ۱۶')
+        for name in ('ذوب آهن', 'فولاد خوزستان', 'فولاد مبارکه'):
+            StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=Supplier.objects.create(name=name),
+                                   quantity=5, unit_price=5, created_by=self.user)
+
+        def change_form_queries(quantity):
+            stock_out = save_stock_out_optimistic(StockOut(warehouse=warehouse, material_type=material,
+                                                           customer=self.customer, quantity=quantity,
+                                                           created_by=self.user))
+            url = reverse('admin:inventory_stockout_change', args=[stock_out.pk])
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            return stock_out.allocations.count(), len(queries)
+
+        # خروجی اول از یک لات و خروجی دوم از سه لات برداشته می‌شود
+        single, single_queries = change_form_queries(2)
+        several, several_queries = change_form_queries(12)
+        self.assertEqual((single, several), (1, 3))
+        self.assertEqual(several_queries, single_queries)
+
+    def bulk_delete_queries(self, model_name, count):
+        """حذف گروهی count ردیف تازه با اکشن حذف ادمین"""
+        model = apps.get_model('inventory', model_name)
+        existing = set(model.objects.values_list('pk', flat=True))
+        self.add_rows(count)
+        pks = [pk for pk in model.objects.values_list('pk', flat=True) if pk not in existing]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse(f'admin:inventory_{model_name}_changelist'), {
+                'action': 'delete_selected', 'post': 'yes', '_selected_action': pks,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(model.objects.filter(pk__in=pks).exists())
+        return len(queries)
+
+    @override_settings(MOVEMENT_ROLLUP_STRIPES=1)
+    def test_bulk_delete_queries_do_not_grow(self):
+        for name in ('stockout', 'stockin'):
+            with self.subTest(model=name):
+                # بار اول نوع محتوا برای لاگ ادمین خوانده و کش می‌شود
+                self.bulk_delete_queries(name, 1)
+                self.assertEqual(self.bulk_delete_queries(name, 10), self.bulk_delete_queries(name, 2))
+
+    @override_settings(MOVEMENT_ROLLUP_STRIPES=1)
+    def test_single_edit_queries_do_not_grow_with_allocations(self):
+        warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        material = MaterialType.objects.create(name='میلگرد ۱۶')
+        for number in range(8):
+            StockIn.objects.create(warehouse=warehouse, material_type=material,
+                                   supplier=Supplier.objects.create(name=f'هویت {number}'),
+                                   quantity=5, unit_price=5, created_by=self.user)
+
+        def edit_queries(quantity):
+            stock_out = save_stock_out_optimistic(StockOut(warehouse=warehouse, material_type=material,
+                                                           customer=self.customer, quantity=quantity,
+                                                           created_by=self.user))
+            data = {
+                'warehouse': warehouse.pk, 'material_type': material.pk, 'customer': self.customer.pk,
+                'quantity': quantity, 'unit_price': 30, 'invoice_number': 'INV-1', 'notes': '',
+                'created_by': self.user.pk,
+                'allocations-TOTAL_FORMS': stock_out.allocations.count(),
+                'allocations-INITIAL_FORMS': stock_out.allocations.count(),
+                'allocations-MIN_NUM_FORMS': 0, 'allocations-MAX_NUM_FORMS': 1000,
+            }
+            for number, allocation in enumerate(stock_out.allocations.order_by('pk')):
+                data[f'allocations-{number}-id'] = allocation.pk
+                data[f'allocations-{number}-stock_out'] = stock_out.pk
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('admin:inventory_stockout_change', args=[stock_out.pk]), data)
+            self.assertEqual(response.status_code, 302)
+            stock_out.refresh_from_db()
+            self.assertEqual(stock_out.invoice_number, 'INV-1')
+            return stock_out.allocations.count(), len(queries)
+
+        edit_queries(5)
+        single, single_queries = edit_queries(5)
+        several, several_queries = edit_queries(30)
+        self.assertEqual((single, several), (1, 6))
+        self.assertEqual(several_queries, single_queries)
+
+    def test_filters_do_not_load_related_tables(self):
+        self.add_rows(1)
+        Customer.objects.bulk_create(Customer(name=f'مشتری {number}') for number in range(30))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_changelist('stockin', customer__id__exact=self.customer.pk)
+        # فیلتر پیش‌فرض جنگو کل جدول مشتری‌ها را بدون شرط می‌خواند
+        full_reads = [query['sql'] for query in queries
+                      if 'FROM "inventory_customer"' in query['sql'] and 'WHERE' not in query['sql']]
+        self.assertEqual(full_reads, [])
+        self.assertContains(response, f'<option value="{self.customer.pk}" selected>{self.customer.name}</option>', html=True)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=5)
+    def test_large_tables_use_estimated_count(self):
+        self.add_rows(6)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_changelist('stockin')
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+        self.assertEqual(response.context['cl'].result_count, StockIn.objects.order_by('-pk').first().pk)
+
+        # کوئری فیلتر شده در SQLite تخمین ندارد و دقیق شمرده می‌شود
+        warehouse = Warehouse.objects.get(code='W1')
+        response = self.get_changelist('stockin', warehouse__id__exact=warehouse.pk)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class ParsePersianDatesTests(TestCase):
+    """نسخه برداری (ستون اکسل) باید همان نتیجه parse_persian_date را بدهد"""
+
+    def assert_parity(self, values):
+        dates, invalid = parse_persian_dates(pd.Series(values, index=range(10, 10 + len(values)), dtype=object))
+        self.assertEqual(list(dates.index), list(range(10, 10 + len(values))))
+        for value, parsed, is_invalid in zip(values, dates, invalid):
+            expected = parse_persian_date(value)
+            blank = value is None or (isinstance(value, float) and pd.isna(value)) or str(value).strip() == ''
+            with self.subTest(value=value):
+                self.assertEqual(parsed, expected)
+                self.assertEqual(bool(is_invalid), expected is None and not blank)
+
+    def test_every_day_across_year_boundaries(self):
+        day = jdatetime.date(1399, 12, 1)
+        values = []
+        while day < jdatetime.date(1405, 1, 15):
+            # قالب‌های مختلف یک روز: خط تیره، نقطه، ارقام فارسی و بدون صفر پیشوند
+            values.append([
+                day.strftime('%Y/%m/%d'), day.strftime('%Y-%m-%d'),
+                day.strftime('%Y.%m.%d').translate(str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹')),
+                f'{day.year}/{day.month}/{day.day} 10:30',
+            ][day.toordinal() % 4])
+            day += timedelta(days=1)
+        self.assertEqual(len(values), jdatetime.date(1405, 1, 15).toordinal() - jdatetime.date(1399, 12, 1).toordinal())
+        self.assert_parity(values)
+
+    def test_edge_values(self):
+        self.assert_parity([
+            '1403/12/30', '1404/12/30', '1404/07/31', '1404/06/31', '1404/13/01', '1404/00/10', '1404/01/00',
+            '2024-02-29', '2023-02-29', '2025-03-21 08:00:00', pd.Timestamp('2025-03-21'), date(2025, 3, 21),
+            '1899/01/01', '2101/01/01', '1100/01/01', '1501/06/31', '9999/01/01', '0/1/1',
+            '', '   ', None, float('nan'), 'abc', '14040126', 1404, ' ۱۴۰۴/۰۱/۲۶ ', '١٤٠٤/٠١/٢٦', '1404/01/26T10:00',
+            '1404/01/26',
+        ])
+
+
+class ExcelDateImportTests(TestCase):
+    """تاریخ نامعتبر در اکسل باید خطای همان ردیف شود، نه ثبت بی‌تاریخ"""
+
+    def test_bad_date_is_reported_per_row(self):
+        user = User.objects.create_user(username='tester')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'stock_in.xlsx'
+        pd.DataFrame({
+            'نام کالا': ['میلگرد ۱۶', 'میلگرد ۱۸'],
+            'هویت کالا': ['ذوب آهن', 'ذوب آهن'],
+            'مقدار': [10, 5],
+            'قیمت واحد': [100, 100],
+            'شماره بارنامه': ['', ''],
+            'یادداشت‌ها': ['', ''],
+            'تاریخ ورود (YYYY-MM-DD)': ['1404/01/26', '1404/13/40'],
+        }).to_excel(path, index=False)
+
+        results = import_stock_in_excel(path, user)
+        self.assertEqual(results['errors'], [f'ردیف 3: {INVALID_DATE_MESSAGE}'])
+        self.assertEqual(len(results['success']), 1)
+        self.assertEqual(list(StockIn.objects.values_list('quantity', 'manual_date')), [(10, date(2025, 4, 15))])
+
+
+class JalaliConversionTests(TestCase):
+    """جدول‌های NumPy و تبدیل حافظه‌دار باید با jdatetime یکی باشند، به‌ویژه در مرز سال‌ها"""
+
+    epoch = date(1970, 1, 1).toordinal()
+
+    def test_jalali_day_table_matches_jdatetime(self):
+        table = jalali_day_table()
+        # سال‌های کبیسه ۱۳۹۹ و ۱۴۰۳، ابتدا و انتهای جدول
+        for year in (1300, *range(1398, 1411), 1500):
+            for month in range(13):
+                for day in range(32):
+                    try:
+                        expected = jdatetime.date(year, month, day).togregorian().toordinal() - self.epoch
+                    except ValueError:
+                        expected = MISSING_DAY
+                    with self.subTest(date=(year, month, day)):
+                        self.assertEqual(table[year - JALALI_TABLE_FIRST_YEAR, month, day], expected)
+
+    def test_gregorian_day_table_matches_calendar(self):
+        table = gregorian_day_table()
+        for year in (1900, *range(2019, 2032), 2100):
+            for month in range(13):
+                for day in range(32):
+                    try:
+                        expected = date(year, month, day).toordinal() - self.epoch
+                    except ValueError:
+                        expected = MISSING_DAY
+                    with self.subTest(date=(year, month, day)):
+                        self.assertEqual(table[year - GREGORIAN_TABLE_FIRST_YEAR, month, day], expected)
+
+    def test_memoized_conversion_matches_jdatetime(self):
+        days = [date(2019, 3, 1) + timedelta(days=offset) for offset in range(12 * 366)]
+        expected = [jdatetime.date.fromgregorian(date=day) for day in days]
+        self.assertEqual([jalali_day(day) for day in days], expected)
+        self.assertEqual(persian_dates(days), [day.strftime('%Y/%m/%d') for day in expected])
+
+    def test_datetimes_use_business_day_at_nowruz(self):
+        # ۰۰:۱۵ بامداد اول فروردین ۱۴۰۴ به وقت تهران هنوز ۲۹ اسفند در UTC است
+        moment = datetime(2025, 3, 20, 20, 45, tzinfo=dt_timezone.utc)
+        self.assertEqual(persian_dates([moment, moment - timedelta(hours=1)]), ['1404/01/01', '1403/12/30'])
+        self.assertEqual(persian_dates([moment], '%Y/%m/%d %H:%M'), ['1404/01/01 00:15'])
+        self.assertEqual(jalali_period(None, moment), (1404, 1))
+
+
+class SelfContainedMigrationTests(TestCase):
+    """مهاجرت‌های داده کد برنامه را import نمی‌کنند و همان نتیجه کد فعلی را می‌دهند"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='ميلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def migration(self, name):
+        return importlib.import_module(f'inventory.migrations.{name}')
+
+    def test_migrations_do_not_import_application_code(self):
+        directory = Path(importlib.import_module('inventory.migrations').__file__).parent
+        for path in sorted(directory.glob('0*.py')):
+            with self.subTest(migration=path.name):
+                self.assertNotRegex(path.read_text(encoding='utf-8'), r'(?m)^\s*(from|import) inventory\b')
+
+    def test_normalized_names(self):
+        MaterialType.objects.update(normalized_name='')
+        self.migration('0016_normalized_names').fill_normalized_names(apps, None)
+        self.assertEqual(MaterialType.objects.get().normalized_name, normalize_text('ميلگرد ۱۶'))
+
+    def test_jalali_periods(self):
+        # ورودی اول فروردین به وقت تهران که در UTC هنوز اسفند است، و ورودی با تاریخ دستی
+        nowruz = StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                        quantity=1, unit_price=5, created_by=self.user)
+        StockIn.objects.filter(pk=nowruz.pk).update(created_at=datetime(2025, 3, 20, 20, 45, tzinfo=dt_timezone.utc))
+        manual = StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                        quantity=1, unit_price=5, manual_date=date(2024, 3, 19), created_by=self.user)
+        StockIn.objects.update(jalali_year=None, jalali_month=None)
+        self.migration('0018_jalali_period').fill_jalali_periods(apps, None)
+        periods = dict(StockIn.objects.values_list('pk', 'jalali_year'))
+        self.assertEqual(periods, {nowruz.pk: 1404, manual.pk: 1402})
+        for stock_in in StockIn.objects.all():
+            self.assertEqual((stock_in.jalali_year, stock_in.jalali_month),
+                             jalali_period(stock_in.manual_date, stock_in.created_at))
+
+    def test_rollup_jalali_periods(self):
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                               quantity=1, unit_price=5, manual_date=date(2025, 3, 21), created_by=self.user)
+        DailyMovementRollup.objects.update(jalali_year=None, jalali_month=None)
+        self.migration('0019_rollup_jalali_period').fill_rollup_jalali_periods(apps, None)
+        self.assertEqual(set(DailyMovementRollup.objects.values_list('jalali_year', 'jalali_month')), {(1404, 1)})
+
+
+class JalaliDateRangeTests(TestCase):
+    """تبدیل تاریخ‌های شمسی ورودی کاربر و بازه‌های نیمه‌باز روز کاری"""
+
+    def test_parse_persian_date(self):
+        cases = {
+            '1404/01/26': date(2025, 4, 15),
+            '1404-1-26': date(2025, 4, 15),
+            '۱۴۰۴.۰۱.۲۶': date(2025, 4, 15),
+            '1404/01/26 10:30': date(2025, 4, 15),
+            '2024-03-20': date(2024, 3, 20),
+            '1399/12/30': date(2021, 3, 20),
+            '1402/12/30': None,
+            '1404/13/01': None,
+            '1404/01': None,
+            'فردا': None,
+            '': None,
+            None: None,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_persian_date(value), expected)
+
+    def test_month_and_year_bounds_are_half_open(self):
+        tehran = dt_timezone(timedelta(hours=3, minutes=30))
+        # اسفند ۱۴۰۳ (سال کبیسه) ۳۰ روز و اسفند ۱۴۰۲ ۲۹ روز دارد
+        self.assertEqual(day_range_bounds('1403/12/01', '1403/12/30')[:2], (date(2025, 2, 19), date(2025, 3, 21)))
+        self.assertEqual(day_range_bounds('1402/12/01', '1402/12/29')[:2], (date(2024, 2, 20), date(2024, 3, 20)))
+        self.assertEqual(day_range_bounds('1402/12/01', '1402/12/30')[1], None)
+
+        start, end, start_at, end_at = day_range_bounds('1403/01/01', '1403/12/30')
+        self.assertEqual((start, end), (date(2024, 3, 20), date(2025, 3, 21)))
+        self.assertEqual(start_at, datetime(2024, 3, 20, tzinfo=tehran))
+        self.assertEqual(end_at, datetime(2025, 3, 21, tzinfo=tehran))
+
+    def test_filter_includes_last_business_minute_only(self):
+        user = User.objects.create_user(username='tester')
+        warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        material = MaterialType.objects.create(name='میلگرد ۱۶')
+        supplier = Supplier.objects.create(name='ذوب آهن')
+        # ۲۳:۵۹ و ۰۰:۰۰ تهران در مرز اسفند ۱۴۰۳ و فروردین ۱۴۰۴
+        for moment in (datetime(2025, 3, 20, 20, 29, tzinfo=dt_timezone.utc),
+                       datetime(2025, 3, 20, 20, 30, tzinfo=dt_timezone.utc)):
+            with mock.patch('django.utils.timezone.now', return_value=moment):
+                StockIn.objects.create(warehouse=warehouse, material_type=material, supplier=supplier,
+                                       quantity=1, unit_price=5, created_by=user)
+        esfand = filter_date_range(StockIn.objects.all(), '1403/12/01', '1403/12/30', basis='created')
+        farvardin = filter_date_range(StockIn.objects.all(), '1404/01/01', '1404/01/31', basis='created')
+        self.assertEqual([row.created_at.minute for row in esfand], [29])
+        self.assertEqual([row.created_at.minute for row in farvardin], [30])
+
+
+class MovementRollupTests(TestCase):
+    """جمع روزانه حرکات: ثبت، روز کاری، خانه‌ها، بررسی و بازسازی"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.old = Supplier.objects.create(name='ذوب آهن')
+        self.new = Supplier.objects.create(name='فولاد خوزستان')
+        self.customer = Customer.objects.create(name='مشتری')
+
+    def receive(self, supplier, quantity, **fields):
+        return StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=supplier,
+                                      quantity=quantity, unit_price=100, created_by=self.user, **fields)
+
+    def issue(self, quantity, **fields):
+        return StockOut.objects.create(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                                       quantity=quantity, unit_price=150, created_by=self.user, **fields)
+
+    def assert_matches_ledger(self):
+        def nonzero(totals):
+            return {key: values for key, values in totals.items() if any(values)}
+
+        expected = nonzero(ledger_rollup(StockIn.objects.all(), StockOut.objects.all()))
+        self.assertTrue(expected)
+        self.assertEqual(nonzero(stored_rollup()), expected)
+
+    def test_postings_edits_and_deletes_match_ledger(self):
+        day = date(2024, 5, 1)
+        self.receive(self.old, 5, manual_date=day)
+        stock_in = self.receive(self.new, 10)
+        stock_out = self.issue(8, manual_date=day)
+        self.assert_matches_ledger()
+        stock_out.quantity = 3
+        stock_out.manual_date = day + timedelta(days=1)
+        stock_out.save()
+        stock_in.delete()
+        self.assert_matches_ledger()
+        key = (day + timedelta(days=1), self.warehouse.pk, self.material.pk, self.old.pk, self.customer.pk)
+        self.assertEqual(stored_rollup()[key], [0, 3, 0, 450, 300])
+
+    def test_created_at_uses_business_day(self):
+        # ۲۰:۴۵ روز ۱۹ مارس به وقت UTC، در تهران بامداد ۱ فروردین ۱۴۰۳ است
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2024, 3, 19, 20, 45, tzinfo=dt_timezone.utc)):
+            self.receive(self.old, 5)
+        row = DailyMovementRollup.objects.get()
+        self.assertEqual((row.day, row.jalali_year, row.jalali_month), (date(2024, 3, 20), 1403, 1))
+        self.assertEqual(in_day_range(StockIn.objects.all(), date(2024, 3, 20), date(2024, 3, 20)).count(), 1)
+        self.assert_matches_ledger()
+
+    def test_postings_are_striped(self):
+        day = date(2024, 5, 1)
+        with mock.patch('inventory.rollup.random.randrange', side_effect=[0, 3, 3]):
+            for quantity in (1, 2, 4):
+                self.receive(self.old, quantity, manual_date=day)
+        self.assertEqual(sorted(DailyMovementRollup.objects.values_list('slot', 'quantity_in')), [(0, 1), (3, 6)])
+        self.assert_matches_ledger()
+
+    def test_check_and_rebuild(self):
+        with mock.patch('inventory.rollup.random.randrange', side_effect=[1, 2, 5]):
+            self.receive(self.old, 5, manual_date=date(2024, 5, 1))
+            self.receive(self.old, 5, manual_date=date(2024, 5, 1))
+            self.issue(4, manual_date=date(2024, 5, 2))
+        call_command('check_movement_rollup', stdout=mock.MagicMock())
+
+        DailyMovementRollup.objects.filter(day=date(2024, 5, 1), slot=2).update(quantity_in=F('quantity_in') + 1)
+        with self.assertRaises(CommandError):
+            call_command('check_movement_rollup', stdout=mock.MagicMock())
+
+        call_command('rebuild_movement_rollup', stdout=mock.MagicMock())
+        call_command('check_movement_rollup', stdout=mock.MagicMock())
+        self.assertEqual(sorted(DailyMovementRollup.objects.values_list('day', 'slot', 'quantity_in', 'quantity_out')),
+                         [(date(2024, 5, 1), 0, 10, 0), (date(2024, 5, 2), 0, 0, 4)])
+        self.assert_matches_ledger()
+
+
+class JalaliPeriodTests(TestCase):
+    """سال و ماه شمسی حرکات از تاریخ دستی یا روز کاری تاریخ ثبت"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='secret')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def stock_in(self, **fields):
+        return StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=self.supplier,
+                                      quantity=10, unit_price=5, created_by=self.user, **fields)
+
+    def test_period_follows_manual_date_or_business_day(self):
+        # ۲۱:۰۰ روز ۳۰ اسفند به وقت UTC، در تهران ۱ فروردین ۱۴۰۴ است
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 3, 20, 21, 0, tzinfo=dt_timezone.utc)):
+            stock_in = self.stock_in()
+        self.assertEqual((stock_in.jalali_year, stock_in.jalali_month), (1404, 1))
+
+        stock_in.manual_date = date(2024, 12, 25)
+        stock_in.save(update_fields=['manual_date'])
+        stock_in.refresh_from_db()
+        self.assertEqual((stock_in.jalali_year, stock_in.jalali_month), (1403, 10))
+
+    def test_admin_filters_by_jalali_month(self):
+        self.stock_in(manual_date=date(2024, 12, 25))
+        self.stock_in(manual_date=date(2024, 10, 1))
+        self.client.force_login(self.user)
+        url = reverse('admin:inventory_stockin_changelist')
+        response = self.client.get(url, {'jalali_year': 1403, 'jalali_month': 10})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(url, {'jalali_year': 1403})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertEqual(self.client.get(url, {'jalali_year': 1403, 'jalali_month': 13}).status_code, 302)
+
+
+class MonthlyReportTests(TestCase):
+    """گزارش ماهانه شمسی از جمع روزانه حرکات"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='secret')
+        self.warehouses = [Warehouse.objects.create(name='انبار الف', code='A'), Warehouse.objects.create(name='انبار ب', code='B')]
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+
+    def stock_in(self, warehouse, manual_date, quantity):
+        StockIn.objects.create(warehouse=warehouse, material_type=self.material, supplier=self.supplier,
+                               quantity=quantity, unit_price=5, manual_date=manual_date, created_by=self.user)
+
+    def test_matrix_per_warehouse_and_month(self):
+        self.stock_in(self.warehouses[0], date(2024, 12, 25), 10)  # دی ۱۴۰۳
+        self.stock_in(self.warehouses[0], date(2024, 12, 26), 4)
+        self.stock_in(self.warehouses[1], date(2024, 3, 20), 7)  # ۱ فروردین ۱۴۰۳
+        self.stock_in(self.warehouses[1], date(2024, 3, 19), 100)  # اسفند ۱۴۰۲
+
+        # یک کوئری تجمیعی و یک کوئری نام برای هر جدول
+        with self.assertNumQueries(3):
+            report = monthly_movements(1403)
+        self.assertEqual([row['warehouse'] for row in report['rows']], ['انبار الف', 'انبار ب'])
+        self.assertEqual(report['matrix'][0, 9].tolist(), [14, 0, 70, 0])
+        self.assertEqual(report['matrix'][1, 0].tolist(), [7, 0, 35, 0])
+        self.assertEqual(int(report['matrix'][:, :, 0].sum()), 21)
+
+        report = monthly_movements(1403, self.warehouses[1].pk)
+        self.assertEqual(len(report['rows']), 1)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('inventory:monthly_report'), {'year': 1403, 'field': 'quantity_in'})
+        self.assertEqual(response.context['year_total'], 21)
+
+    def test_movement_after_business_midnight_on_first_of_month(self):
+        cache.clear()
+        customer = Customer.objects.create(name='مشتری')
+        # ۲۰:۴۰ روز ۱۹ آوریل به وقت UTC (۳۱ فروردین)، در تهران بامداد ۱ اردیبهشت ۱۴۰۳ است
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2024, 4, 19, 20, 40, tzinfo=dt_timezone.utc)):
+            with self.captureOnCommitCallbacks(execute=True):
+                StockIn.objects.create(warehouse=self.warehouses[0], material_type=self.material, supplier=self.supplier,
+                                       quantity=10, unit_price=5, created_by=self.user)
+                StockOut.objects.create(warehouse=self.warehouses[0], material_type=self.material, customer=customer,
+                                        quantity=4, unit_price=8, created_by=self.user)
+
+        report = monthly_movements(1403)
+        self.assertEqual(report['matrix'][0, 1].tolist(), [10, 4, 50, 32])
+        self.assertEqual(int(report['matrix'][0, 0].sum()), 0)
+
+        for kind, quantity in (('purchases', 10), ('sales', 4)):
+            with self.subTest(kind=kind):
+                self.assertEqual(counterparty_summary(kind, 1403, 1), [])
+                summary = counterparty_summary(kind, 1403, 2)
+                self.assertEqual([(row['quantity'], row['last_date']) for row in summary], [(quantity, date(2024, 4, 20))])
+
+        for model in (StockIn, StockOut):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(filter_jalali_period(model.objects.all(), 1403, 2).count(), 1)
+                self.assertEqual(filter_date_range(model.objects.all(), '1403/02/01', '1403/02/31').count(), 1)
+                self.assertEqual(filter_date_range(model.objects.all(), '1403/01/01', '1403/01/31').count(), 0)
+
+
+    def test_current_year_turns_at_tehran_midnight(self):
+        # نوروز ۱۴۰۴: ۰۰:۳۰ تهران، هنوز ۲۰ مارس در UTC
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 3, 20, 21, 0, tzinfo=dt_timezone.utc)):
+            self.assertEqual(current_jalali_year(), 1404)
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 3, 20, 20, 0, tzinfo=dt_timezone.utc)):
+            self.assertEqual(current_jalali_year(), 1403)
+
+class CounterpartySummaryTests(TestCase):
+    """خلاصه خرید و فروش ماه‌های شمسی با کش و باطل‌سازی به ازای ماه"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.suppliers = [Supplier.objects.create(name='ذوب آهن'), Supplier.objects.create(name='فولاد مبارکه')]
+        self.customer = Customer.objects.create(name='مشتری')
+
+    def stock_in(self, supplier, manual_date, quantity, unit_price=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=supplier,
+                                   quantity=quantity, unit_price=unit_price, manual_date=manual_date, created_by=self.user)
+
+    def test_purchase_summary_is_cached_per_month(self):
+        self.stock_in(self.suppliers[0], date(2024, 12, 25), 10, 100)  # دی ۱۴۰۳
+        self.stock_in(self.suppliers[0], date(2025, 1, 5), 30, 200)
+        self.stock_in(self.suppliers[0], date(2025, 1, 6), 5)  # بدون قیمت
+        self.stock_in(self.suppliers[1], date(2024, 12, 30), 1, 50)
+
+        summary = counterparty_summary('purchases', 1403, 10)
+        self.assertEqual([row['name'] for row in summary], ['ذوب آهن', 'فولاد مبارکه'])
+        self.assertEqual(summary[0]['transactions'], 3)
+        self.assertEqual(summary[0]['quantity'], 45)
+        self.assertEqual(summary[0]['amount'], 7000)
+        self.assertEqual(summary[0]['average_price'], 175)
+        self.assertEqual(summary[0]['last_date'], date(2025, 1, 6))
+
+        # از کش؛ فقط نام‌ها خوانده می‌شوند
+        with self.assertNumQueries(1):
+            counterparty_summary('purchases', 1403, 10)
+        # ثبت در ماه دیگر کش این ماه را باطل نمی‌کند
+        self.stock_in(self.suppliers[1], date(2024, 10, 1), 1, 50)
+        with self.assertNumQueries(1):
+            counterparty_summary('purchases', 1403, 10)
+        self.stock_in(self.suppliers[1], date(2024, 12, 31), 2, 50)
+        self.assertEqual(counterparty_summary('purchases', 1403, 10)[1]['quantity'], 3)
+
+        self.assertEqual(sum(row['transactions'] for row in counterparty_summary('purchases', 1403)), 6)
+
+    def test_sales_summary(self):
+        self.stock_in(self.suppliers[0], date(2024, 12, 25), 10, 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            StockOut.objects.create(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                                    quantity=4, unit_price=150, manual_date=date(2024, 12, 26), created_by=self.user)
+        summary = counterparty_summary('sales', 1403)
+        self.assertEqual([(row['name'], row['quantity'], row['amount']) for row in summary], [('مشتری', 4, 600)])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('inventory:sales_summary'), {'year': 1403, 'month': 10})
+        self.assertEqual(response.context['total_amount'], 600)
+
+
+class StockAgingTests(TestCase):
+    """سن موجودی لات‌ها با تطبیق FIFO برداشت‌ها با ورودی‌ها"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.other = Warehouse.objects.create(name='انبار دوم', code='SECOND')
+        self.material = MaterialType.objects.create(name='میلگرد ۱۶')
+        self.suppliers = [Supplier.objects.create(name='ذوب آهن'), Supplier.objects.create(name='فولاد مبارکه')]
+        self.customer = Customer.objects.create(name='مشتری')
+
+    def stock_in(self, supplier, manual_date, quantity):
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.material, supplier=supplier,
+                               quantity=quantity, unit_price=10, manual_date=manual_date, created_by=self.user)
+
+    def test_buckets_follow_fifo_matching(self):
+        self.stock_in(self.suppliers[0], date(2024, 6, 1), 100)
+        self.stock_in(self.suppliers[0], date(2024, 11, 15), 50)
+        self.stock_in(self.suppliers[0], date(2024, 12, 25), 20)
+        self.stock_in(self.suppliers[1], date(2024, 8, 1), 10)
+        # از قدیمی‌ترین ورودی‌ها: ۱۰۰ از خرداد و ۲۰ از آبان
+        StockOut.objects.create(warehouse=self.warehouse, material_type=self.material, customer=self.customer,
+                                quantity=120, manual_date=date(2024, 12, 1), created_by=self.user)
+        # انتقال سطر تخصیص ندارد؛ با موجودی واقعی لات تطبیق داده می‌شود
+        StockTransfer.objects.create(source_warehouse=self.warehouse, destination_warehouse=self.other,
+                                     material_type=self.material, quantity=5, created_by=self.user)
+
+        # یک کوئری دفتر لات‌ها، یک کوئری موجودی و سه کوئری نام
+        with self.assertNumQueries(5):
+            lots = stock_aging(as_of=date(2025, 1, 1))
+        self.assertEqual(
+            [(lot['warehouse'], lot['supplier'], lot['on_hand'], lot['buckets'], lot['unknown']) for lot in lots],
+            [
+                ('انبار اصلی', 'ذوب آهن', 45, [20, 25, 0, 0], 0),
+                ('انبار اصلی', 'فولاد مبارکه', 10, [0, 0, 10, 0], 0),
+                ('انبار دوم', 'ذوب آهن', 5, [0, 0, 0, 0], 5),
+            ],
+        )
+        self.assertEqual(lots[0]['oldest_day'], date(2024, 11, 15))
+        self.assertEqual(len(stock_aging(as_of=date(2025, 1, 1), warehouse_id=self.other.pk)), 1)
+
+
+    def test_default_day_is_business_day(self):
+        self.stock_in(self.suppliers[0], date(2024, 12, 1), 10)
+        # ۰۰:۳۰ اول ژانویه در تهران، هنوز ۳۱ دسامبر در UTC: سن ۳۱ روز، نه ۳۰
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2024, 12, 31, 21, 0, tzinfo=dt_timezone.utc)):
+            self.assertEqual([lot['buckets'] for lot in stock_aging()], [[0, 10, 0, 0]])
+
+class TurnoverTests(TestCase):
+    """مصرف روزانه، گردش و روزهای پوشش از جمع روزانه حرکات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester')
+        self.warehouse = Warehouse.objects.create(name='انبار اصلی', code='MAIN')
+        self.materials = [MaterialType.objects.create(name='میلگرد ۱۶'), MaterialType.objects.create(name='تیرآهن ۱۴')]
+        self.supplier = Supplier.objects.create(name='ذوب آهن')
+        self.customer = Customer.objects.create(name='مشتری')
+        self.today = timezone.localdate()
+
+    def test_metrics_over_window(self):
+        for material in self.materials:
+            StockIn.objects.create(warehouse=self.warehouse, material_type=material, supplier=self.supplier, quantity=100,
+                                   unit_price=10, manual_date=self.today - timedelta(days=10), created_by=self.user)
+        StockOut.objects.create(warehouse=self.warehouse, material_type=self.materials[0], customer=self.customer,
+                                quantity=30, manual_date=self.today - timedelta(days=5), created_by=self.user)
+        # ورودی پیش از بازه در مصرف اثری ندارد
+        StockIn.objects.create(warehouse=self.warehouse, material_type=self.materials[1], supplier=self.supplier,
+                               quantity=20, unit_price=10, manual_date=self.today - timedelta(days=60), created_by=self.user)
+
+        # یک کوئری جمع روزانه و یک کوئری موجودی
+        with self.assertNumQueries(2):
+            metrics = turnover_metrics(30, as_of=self.today)
+        rows = {row['material_type_id']: row for row in metric_rows(metrics)}
+        # موجودی ۱۹ روز صفر، ۵ روز ۱۰۰ و ۶ روز ۷۰: میانگین ۹۲۰ / ۳۰
+        self.assertEqual(
+            rows[self.materials[0].pk],
+            {'warehouse_id': self.warehouse.pk, 'material_type_id': self.materials[0].pk, 'on_hand': 70,
+             'issued': 30, 'average_daily': 1.0, 'turnover': 0.98, 'days_of_cover': 70.0},
+        )
+        self.assertEqual(rows[self.materials[1].pk]['on_hand'], 120)
+        self.assertIsNone(rows[self.materials[1].pk]['days_of_cover'])
+        self.assertEqual(rows[self.materials[1].pk]['turnover'], 0.0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('inventory:turnover_report'), {'window': 30})
+        self.assertEqual([row['material'] for row in response.context['rows']], self.materials)
+
+    def test_default_window_ends_on_business_day(self):
+        # ۰۰:۳۰ تهران در نوروز، هنوز ۲۰ مارس در UTC
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 3, 20, 21, 0, tzinfo=dt_timezone.utc)):
+            self.assertEqual(turnover_metrics(30)['as_of'], date(2025, 3, 21))
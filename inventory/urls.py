@@ -28,6 +28,19 @@ urlpatterns = [
     # Stock Out
     path('stock-out/', views.stock_out_list, name='stock_out_list'),
     
+    # Monthly Report
+    path('reports/monthly/', views.monthly_report, name='monthly_report'),
+    
+    # Purchase / Sales Summaries
+    path('reports/purchases/', views.purchase_summary, name='purchase_summary'),
+    path('reports/sales/', views.sales_summary, name='sales_summary'),
+    
+    # Stock Aging
+    path('reports/aging/', views.aging_report, name='aging_report'),
+    
+    # Inventory Turnover
+    path('reports/turnover/', views.turnover_report, name='turnover_report'),
+    
     # Excel Upload Page
     path('excel-upload/', views.excel_upload, name='excel_upload'),
     
@@ -39,6 +52,7 @@ urlpatterns = [
     
     # Download Reports
     path('download-inventory-report/', views.download_inventory_report, name='download_inventory_report'),
+    path('download-monthly-report/', views.download_monthly_report, name='download_monthly_report'),
     
     # Upload Excel Files
     path('upload-stock-in-excel/', views.upload_stock_in_excel, name='upload_stock_in_excel'),
@@ -52,6 +66,11 @@ urlpatterns = [
     path('api/customers/', views.get_customers, name='get_customers'),
     path('api/warehouses/', views.get_warehouses, name='get_warehouses'),
     path('api/inventory-quantity/<int:material_id>/', views.get_inventory_quantity, name='get_inventory_quantity'),
+    path('api/stock-availability/', views.get_stock_availability, name='get_stock_availability'),
+    path('api/changes/', views.get_changes, name='get_changes'),
+    path('api/inventory-stream/', views.inventory_stream, name='inventory_stream'),
+    path('api/inventory-stream/<int:warehouse_id>/', views.inventory_stream, name='inventory_stream_warehouse'),
+    path('api/movements/batch/', views.post_movements_batch, name='post_movements_batch'),
     
     # Test Views
     path('test-warehouse/', views.test_warehouse_operations, name='test_warehouse_operations'),
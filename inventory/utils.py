@@ -1,52 +1,35 @@
+import re
 import jdatetime
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
+import numpy as np
 import pandas as pd
 
 
 def parse_persian_date(date_str):
     """
     Parse Persian date string to Gregorian date
-    Supports formats like: 1404-01-26, 1404/01/26, 1404.01.26
+    Supports formats like: 1404-01-26, 1404/01/26, 1404.01.26, Persian digits and a
+    trailing time part (1404/01/26 10:30). Years between 1900 and 2100 are taken as
+    Gregorian so existing links and Excel cells keep working.
+    Returns None for empty or invalid input.
     """
     if not date_str or pd.isna(date_str):
         return None
-    
+
+    text = str(date_str).strip().translate(PERSIAN_DIGITS).replace('-', '/').replace('.', '/')
+    match = re.match(DATE_PARTS, text)
+    if not match:
+        return None
+    year, month, day = map(int, match.groups())
     try:
-        # Convert to string if it's not already
-        date_str = str(date_str).strip()
-        
-        # Handle different separators
-        if '-' in date_str:
-            parts = date_str.split('-')
-        elif '/' in date_str:
-            parts = date_str.split('/')
-        elif '.' in date_str:
-            parts = date_str.split('.')
-        else:
-            return None
-        
-        if len(parts) != 3:
-            return None
-        
-        year, month, day = map(int, parts)
-        
-        # Check if it's a Persian date (year > 1400 for modern Persian dates)
-        if year > 1400:
-            # Convert Persian to Gregorian
-            persian_date = jdatetime.date(year, month, day)
-            return persian_date.togregorian()
-        elif 1900 <= year <= 2100:
-            # Assume it's already Gregorian
+        if 1900 <= year <= 2100:
             return date(year, month, day)
-        else:
-            # Try as Persian date anyway (for older dates)
-            try:
-                persian_date = jdatetime.date(year, month, day)
-                return persian_date.togregorian()
-            except:
-                return None
-            
+        return jdatetime.date(year, month, day).togregorian()
     except (ValueError, TypeError):
         return None
 
@@ -107,13 +90,384 @@ def gregorian_to_persian_str(gregorian_date, format_str="%Y/%m/%d"):
     """
     Convert Gregorian date to Persian date string
     """
-    persian_date = to_persian_date(gregorian_date)
-    return format_persian_date(persian_date, format_str)
+    return persian_date_str(gregorian_date, format_str)
 
 
 def gregorian_to_persian_datetime_str(gregorian_datetime, format_str="%Y/%m/%d %H:%M"):
     """
     Convert Gregorian datetime to Persian datetime string
     """
-    persian_datetime = to_persian_datetime(gregorian_datetime)
-    return format_persian_datetime(persian_datetime, format_str)
+    return persian_date_str(gregorian_datetime, format_str)
+
+
+# Distinct days kept by the conversion cache (about 11 years of days)
+PERSIAN_DATE_CACHE_SIZE = 4096
+
+# Time-of-day directives; they are filled by datetime.strftime after the Jalali date part
+TIME_DIRECTIVES = re.compile(r'%[HIMSpfzZ]')
+
+
+@lru_cache(maxsize=PERSIAN_DATE_CACHE_SIZE)
+def jalali_day(gregorian_date):
+    """
+    Memoized Jalali date of a Gregorian date; the calendar arithmetic runs once per day
+    """
+    return jdatetime.date.fromgregorian(date=gregorian_date)
+
+
+@lru_cache(maxsize=PERSIAN_DATE_CACHE_SIZE)
+def format_jalali_day(gregorian_date, format_str):
+    """
+    Memoized formatted Jalali date of a Gregorian date; time directives are kept
+    (escaped) so the result can be passed to datetime.strftime
+    """
+    escaped = TIME_DIRECTIVES.sub(lambda match: '%' + match.group(), format_str)
+    return jalali_day(gregorian_date).strftime(escaped)
+
+
+def localize_datetime(value):
+    """
+    Aware datetimes in the business time zone (so the Jalali day is the local day);
+    naive datetimes are returned unchanged
+    """
+    if timezone.is_aware(value):
+        return value.astimezone(business_timezone())
+    return value
+
+
+def persian_date_str(value, format_str="%Y/%m/%d"):
+    """
+    Format a date or datetime as a Jalali string using the day cache.
+    Datetimes are converted to the business time zone first; the time part is
+    formatted without another calendar conversion.
+    """
+    if value is None or value == "":
+        return ""
+    if isinstance(value, datetime):
+        value = localize_datetime(value)
+        template = format_jalali_day(value.date(), format_str)
+        if not TIME_DIRECTIVES.search(format_str):
+            return template
+        return value.strftime(template)
+    if isinstance(value, date):
+        if TIME_DIRECTIVES.search(format_str):
+            return jalali_day(value).strftime(format_str)
+        return format_jalali_day(value, format_str)
+    return str(value)
+
+
+def persian_dates(values, format_str="%Y/%m/%d"):
+    """
+    Batch conversion of a column of dates/datetimes (exports, list pages).
+    Each distinct day (or distinct datetime when the format has a time part) is
+    converted once; empty values become "".
+    """
+    with_time = bool(TIME_DIRECTIVES.search(format_str))
+    converted = {}
+    result = []
+    for value in values:
+        key = value
+        if isinstance(value, datetime) and not with_time:
+            key = localize_datetime(value).date()
+        if key not in converted:
+            converted[key] = persian_date_str(key, format_str)
+        result.append(converted[key])
+    return result
+
+
+PERSIAN_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+PERSIAN_DIGIT_PAIRS = list(zip('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789'))
+
+
+def business_timezone():
+    """
+    Time zone used to turn business dates into datetime bounds (Asia/Tehran by default)
+    """
+    return ZoneInfo(getattr(settings, 'BUSINESS_TIME_ZONE', 'Asia/Tehran'))
+
+
+def day_range_bounds(start, end):
+    """
+    Convert inclusive Jalali (or Gregorian) start/end strings to half-open bounds.
+    Returns (start_date, end_date_exclusive, start_datetime, end_datetime_exclusive);
+    the datetimes are midnight in the business time zone. Missing or invalid sides are None.
+    """
+    start_date = parse_persian_date(start)
+    end_date = parse_persian_date(end)
+    end_exclusive = end_date + timedelta(days=1) if end_date else None
+    tz = business_timezone()
+
+    def midnight(day):
+        return datetime.combine(day, time.min, tzinfo=tz) if day else None
+
+    return start_date, end_exclusive, midnight(start_date), midnight(end_exclusive)
+
+
+def filter_date_range(queryset, start, end, basis='business'):
+    """
+    Filter movements by an inclusive Jalali date range using plain indexable ranges.
+    basis: 'created' (created_at), 'manual' (manual_date) or 'business'
+    (manual_date, falling back to created_at for rows without a manual date).
+    """
+    start_date, end_date, start_at, end_at = day_range_bounds(start, end)
+    if not start_date and not end_date:
+        return queryset
+
+    manual = Q()
+    created = Q()
+    if start_date:
+        manual &= Q(manual_date__gte=start_date)
+        created &= Q(created_at__gte=start_at)
+    if end_date:
+        manual &= Q(manual_date__lt=end_date)
+        created &= Q(created_at__lt=end_at)
+
+    if basis == 'created':
+        return queryset.filter(created)
+    if basis == 'manual':
+        return queryset.filter(manual)
+    return queryset.filter(manual | (Q(manual_date__isnull=True) & created))
+
+
+def jalali_period(manual_date, created_at=None):
+    """
+    (Jalali year, Jalali month) of a movement: its manual date, otherwise the
+    business-time-zone day of created_at (now for rows that are not saved yet)
+    """
+    if manual_date:
+        day = manual_date
+    else:
+        day = localize_datetime(created_at or timezone.now()).date()
+    jalali = jalali_day(day)
+    return jalali.year, jalali.month
+
+
+def backfill_jalali_periods(model, batch_size=2000, only_missing=True):
+    """
+    Fill jalali_year/jalali_month of existing rows in primary-key batches.
+    Rows of one batch that fall in the same month are updated with a single UPDATE.
+    Returns the number of rows updated.
+    """
+    fields = ['pk', 'created_at']
+    has_manual_date = any(field.name == 'manual_date' for field in model._meta.get_fields())
+    if has_manual_date:
+        fields.append('manual_date')
+    rows = model._default_manager.order_by('pk')
+    if only_missing:
+        rows = rows.filter(jalali_year__isnull=True)
+
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk).values_list(*fields)[:batch_size])
+        if not batch:
+            return updated
+        periods = {}
+        for row in batch:
+            manual_date = row[2] if has_manual_date else None
+            periods.setdefault(jalali_period(manual_date, row[1]), []).append(row[0])
+        for (year, month), pks in periods.items():
+            updated += model._default_manager.filter(pk__in=pks).update(jalali_year=year, jalali_month=month)
+        last_pk = batch[-1][0]
+
+
+def backfill_rollup_jalali_periods(model, only_missing=True):
+    """
+    Fill jalali_year/jalali_month of daily rollup rows with one UPDATE per distinct day.
+    Returns the number of rows updated.
+    """
+    rows = model._default_manager.all()
+    if only_missing:
+        rows = rows.filter(jalali_year__isnull=True)
+    updated = 0
+    for day in list(rows.order_by().values_list('day', flat=True).distinct()):
+        year, month = jalali_period(day)
+        updated += rows.filter(day=day).update(jalali_year=year, jalali_month=month)
+    return updated
+
+
+def filter_jalali_period(queryset, year=None, month=None):
+    """
+    Rows of a Jalali year (and month) using the indexed jalali_year/jalali_month columns.
+    Invalid or missing values leave the queryset unfiltered.
+    """
+    try:
+        year = int(year) if year else None
+        month = int(month) if month else None
+    except (TypeError, ValueError):
+        return queryset
+    if year is None:
+        return queryset
+    if month is not None and 1 <= month <= 12:
+        return queryset.filter(jalali_year=year, jalali_month=month)
+    return queryset.filter(jalali_year=year)
+
+
+def jalali_years(queryset):
+    """
+    Jalali years covered by a queryset, newest first. Reads only the smallest and
+    largest jalali_year (two index seeks) instead of grouping the table.
+    """
+    years = queryset.filter(jalali_year__isnull=False).order_by().values_list('jalali_year', flat=True)
+    first = years.order_by('jalali_year').first()
+    if first is None:
+        return []
+    last = years.order_by('-jalali_year').first()
+    return list(range(last, first - 1, -1))
+
+
+# Jalali month numbers and names (1 = Farvardin)
+JALALI_MONTHS = list(enumerate(jdatetime.date.j_months_fa, 1))
+
+
+# Jalali years covered by the day table
+JALALI_TABLE_FIRST_YEAR = 1300
+JALALI_TABLE_LAST_YEAR = 1500
+# Years read as Gregorian rather than Jalali
+GREGORIAN_TABLE_FIRST_YEAR = 1900
+GREGORIAN_TABLE_LAST_YEAR = 2100
+# Day number of dates that do not exist (dates before 1970 are negative)
+MISSING_DAY = -2 ** 62
+
+# y/m/d after digits and separators are normalized; a trailing time part is ignored
+DATE_PARTS = r'^\s*(\d{1,4})/(\d{1,2})/(\d{1,2})(?:[ T].*)?$'
+
+
+@lru_cache(maxsize=1)
+def jalali_day_table():
+    """
+    Precomputed table of Jalali dates for JALALI_TABLE_FIRST_YEAR..LAST_YEAR.
+    table[year - first, month, day] is the day number since 1970-01-01 of that
+    Jalali date, or MISSING_DAY if the date does not exist (month 0, day 0, 31 Mehr, ...).
+    Built once per process from one jdatetime conversion per year.
+    """
+    years = JALALI_TABLE_LAST_YEAR - JALALI_TABLE_FIRST_YEAR + 1
+    table = np.full((years, 13, 32), MISSING_DAY, dtype=np.int64)
+    epoch = date(1970, 1, 1).toordinal()
+    for offset in range(years):
+        year = JALALI_TABLE_FIRST_YEAR + offset
+        day_number = jdatetime.date(year, 1, 1).togregorian().toordinal() - epoch
+        for month in range(1, 13):
+            if month <= 6:
+                length = 31
+            elif month <= 11:
+                length = 30
+            else:
+                length = 30 if jdatetime.date(year, 1, 1).isleap() else 29
+            table[offset, month, 1:length + 1] = np.arange(day_number, day_number + length)
+            day_number += length
+    return table
+
+
+@lru_cache(maxsize=1)
+def gregorian_day_table():
+    """
+    Same layout as jalali_day_table for Gregorian years
+    GREGORIAN_TABLE_FIRST_YEAR..LAST_YEAR, built with NumPy month arithmetic.
+    """
+    years = np.arange(GREGORIAN_TABLE_FIRST_YEAR, GREGORIAN_TABLE_LAST_YEAR + 1)
+    months = (years[:, None] - 1970) * 12 + np.arange(13)[None, :]
+    starts = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    lengths = np.diff(starts, axis=1)
+    days = np.arange(32)[None, None, :]
+    table = np.full((len(years), 13, 32), MISSING_DAY, dtype=np.int64)
+    table[:, 1:, :] = np.where(
+        (days >= 1) & (days <= lengths[:, :, None]),
+        starts[:, :12, None] + days - 1,
+        MISSING_DAY,
+    )
+    return table
+
+
+def _lookup_day_numbers(table, first_year, year, month, day):
+    """Day numbers of (year, month, day) arrays in a day table; MISSING_DAY outside the table"""
+    inside = (
+        (year >= first_year) & (year < first_year + len(table))
+        & (month >= 0) & (month <= 12) & (day >= 0) & (day <= 31)
+    )
+    return np.where(
+        inside,
+        table[
+            np.clip(year - first_year, 0, len(table) - 1),
+            np.clip(month, 0, 12),
+            np.clip(day, 0, 31),
+        ],
+        MISSING_DAY,
+    )
+
+
+def _normalize_date_texts(texts):
+    """
+    Latin digits and '/' separators for a list of strings. The replacements run once over
+    the whole column joined into one string instead of once per value.
+    """
+    joined = '\n'.join(texts)
+    if not joined.isascii():
+        for persian, latin in PERSIAN_DIGIT_PAIRS:
+            joined = joined.replace(persian, latin)
+    normalized = joined.replace('-', '/').replace('.', '/').split('\n')
+    if len(normalized) == len(texts):
+        return normalized
+    # Some value contains a newline itself: convert one by one
+    return [text.translate(PERSIAN_DIGITS).replace('-', '/').replace('.', '/') for text in texts]
+
+
+def _parse_distinct_dates(values):
+    """
+    Day numbers (since 1970-01-01, MISSING_DAY when invalid) of an array of distinct
+    non-empty values, and a mask of the values that are blank strings
+    """
+    # Normalizing first collapses '1404-01-26' and '۱۴۰۴/۰۱/۲۶' into one value, so only the
+    # remaining distinct strings go through the regex.
+    texts = _normalize_date_texts([str(value) for value in values])
+    codes, normalized = pd.factorize(pd.Series(texts, dtype=object))
+    blank = np.array([text.strip() == '' for text in normalized], dtype=bool)
+    parts = pd.Series(normalized, dtype=object).str.extract(DATE_PARTS).astype(float).fillna(0)
+    year = parts[0].to_numpy(dtype=np.int64)
+    month = parts[1].to_numpy(dtype=np.int64)
+    day = parts[2].to_numpy(dtype=np.int64)
+
+    day_numbers = np.maximum(
+        _lookup_day_numbers(jalali_day_table(), JALALI_TABLE_FIRST_YEAR, year, month, day),
+        _lookup_day_numbers(gregorian_day_table(), GREGORIAN_TABLE_FIRST_YEAR, year, month, day),
+    )
+    # Years outside both tables (typos such as 0404/01/26) are rare; they go through
+    # jdatetime one by one so the result matches parse_persian_date
+    in_tables = (
+        ((year >= JALALI_TABLE_FIRST_YEAR) & (year <= JALALI_TABLE_LAST_YEAR))
+        | ((year >= GREGORIAN_TABLE_FIRST_YEAR) & (year <= GREGORIAN_TABLE_LAST_YEAR))
+    )
+    epoch = date(1970, 1, 1).toordinal()
+    for index in np.flatnonzero((year > 0) & ~in_tables):
+        try:
+            gregorian = jdatetime.date(int(year[index]), int(month[index]), int(day[index])).togregorian()
+        except ValueError:
+            continue
+        day_numbers[index] = gregorian.toordinal() - epoch
+    return day_numbers[codes], blank[codes]
+
+
+def parse_persian_dates(values):
+    """
+    Vectorized parse_persian_date for a whole column (pandas Series or list).
+    Accepts 1404/01/26, 1404-01-26, 1404.01.26, Persian digits, Gregorian strings
+    (years 1900-2100) and pandas Timestamps/dates. Each distinct value is parsed
+    once and the results are mapped back to the rows with NumPy indexing.
+    Returns (dates, invalid): dates is an object Series of datetime.date or None;
+    invalid is a boolean Series marking non-empty values that could not be parsed.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    codes, distinct = pd.factorize(series, use_na_sentinel=True)
+    distinct = np.asarray(distinct, dtype=object)
+
+    day_numbers, blank = _parse_distinct_dates(distinct)
+    valid = day_numbers != MISSING_DAY
+    converted = np.where(valid, day_numbers, 0).astype('datetime64[D]').astype(object)
+    distinct_dates = np.where(valid, converted, None)
+
+    present = codes >= 0
+    dates = np.full(len(series), None, dtype=object)
+    dates[present] = distinct_dates[codes[present]]
+    invalid = np.zeros(len(series), dtype=bool)
+    invalid[present] = (~valid & ~blank)[codes[present]]
+    return pd.Series(dates, index=series.index, dtype=object), pd.Series(invalid, index=series.index)
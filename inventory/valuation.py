@@ -0,0 +1,181 @@
+"""
+ارزش‌گذاری موجودی انبار
+
+ارزش هر لات (انبار، نام کالا، هویت کالا) در Inventory.stock_value نگهداری می‌شود و
+هنگام ثبت هر ورودی و خروجی بروزرسانی می‌شود؛ پس ارزش موجودی و بهای تمام‌شده
+(StockOut.cost_of_goods) بدون محاسبه دوباره خوانده می‌شوند.
+
+روش پیش‌فرض میانگین موزون متحرک است. با INVENTORY_VALUATION_METHOD = 'fifo'
+برای هر ورودی یک CostLayer ساخته می‌شود و خروجی‌ها از قدیمی‌ترین لایه مصرف می‌کنند.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, When
+
+from .models import CostLayer
+
+
+AVERAGE = 'average'
+FIFO = 'fifo'
+
+
+def valuation_method():
+    """روش ارزش‌گذاری تنظیم شده"""
+    return getattr(settings, 'INVENTORY_VALUATION_METHOD', AVERAGE)
+
+
+def receipt_value(quantity, unit_price):
+    """ارزش یک ورودی"""
+    return (quantity or 0) * (unit_price or 0)
+
+
+def average_issue_cost(stock_value, on_hand, quantity):
+    """
+    بهای خروج به روش میانگین موزون
+    خروج کل موجودی دقیقاً کل ارزش را برمی‌دارد تا خطای گرد کردن باقی نماند.
+    """
+    if not on_hand or on_hand <= 0 or quantity <= 0:
+        return 0
+    if quantity >= on_hand:
+        return stock_value or 0
+    return ((stock_value or 0) * quantity + on_hand // 2) // on_hand
+
+
+def price_average(plan, lots):
+    """
+    قیمت‌گذاری سطرهای تخصیص به روش میانگین موزون
+    lots: دیکشنری {inventory_id: (on_hand, stock_value)}
+    """
+    return [
+        line._replace(cost=average_issue_cost(lots[line.inventory_id][1], lots[line.inventory_id][0], line.quantity))
+        for line in plan
+    ]
+
+
+def consume_fifo_layers(plan, lots):
+    """
+    مصرف لایه‌های FIFO برای سطرهای تخصیص با یک SELECT و یک UPDATE
+    اگر لایه‌ها کمتر از مقدار خروجی باشند (سوابق قبل از اجرای backfill_inventory_costs)،
+    باقی‌مانده به میانگین موزون قیمت‌گذاری می‌شود.
+    خروجی: (سطرهای قیمت‌گذاری شده، دیکشنری {inventory_id: [(مقدار، بهای واحد)]})
+    """
+    if not plan:
+        return [], {}
+
+    layers = defaultdict(list)
+    for layer in CostLayer.objects.filter(
+        inventory_id__in={line.inventory_id for line in plan},
+        remaining_quantity__gt=0,
+    ).order_by('id').values('id', 'inventory_id', 'remaining_quantity', 'unit_cost'):
+        layers[layer['inventory_id']].append(layer)
+
+    consumed = {}
+    chunks = defaultdict(list)
+    priced = []
+    for line in plan:
+        remaining = line.quantity
+        cost = 0
+        for layer in layers[line.inventory_id]:
+            if remaining <= 0:
+                break
+            if layer['remaining_quantity'] <= 0:
+                continue
+            take = min(layer['remaining_quantity'], remaining)
+            layer['remaining_quantity'] -= take
+            consumed[layer['id']] = layer['remaining_quantity']
+            chunks[line.inventory_id].append((take, layer['unit_cost']))
+            cost += take * layer['unit_cost']
+            remaining -= take
+        if remaining > 0:
+            on_hand, stock_value = lots[line.inventory_id]
+            fallback = average_issue_cost(stock_value - cost, on_hand - (line.quantity - remaining), remaining)
+            chunks[line.inventory_id].append((remaining, fallback // remaining if remaining else 0))
+            cost += fallback
+        priced.append(line._replace(cost=cost))
+
+    if consumed:
+        CostLayer.objects.filter(pk__in=consumed.keys()).update(
+            remaining_quantity=Case(
+                *[When(pk=pk, then=qty) for pk, qty in consumed.items()],
+                output_field=IntegerField(),
+            )
+        )
+    return priced, chunks
+
+
+def price_plan(plan, lots):
+    """
+    قیمت‌گذاری سطرهای تخصیص با روش ارزش‌گذاری تنظیم شده
+    در روش میانگین موزون تکه‌های لایه خالی برمی‌گردد.
+    """
+    if valuation_method() == FIFO:
+        return consume_fifo_layers(plan, lots)
+    return price_average(plan, lots), {}
+
+
+class LayerState:
+    """لایه FIFO درون‌حافظه‌ای؛ pk برای لایه‌های موجود در پایگاه داده پر است"""
+    __slots__ = ('remaining', 'unit_cost', 'source', 'pk', 'original')
+
+    def __init__(self, remaining, unit_cost, source=None, pk=None):
+        self.remaining = remaining
+        self.unit_cost = unit_cost
+        self.source = source
+        self.pk = pk
+        self.original = remaining
+
+
+class LotState:
+    """
+    وضعیت درون‌حافظه‌ای یک لات برای بازپخش سوابق و اعتبارسنجی دسته‌ای
+    همان قواعد ثبت آنلاین (میانگین موزون یا FIFO) را بدون کوئری اجرا می‌کند.
+    """
+    __slots__ = ('quantity', 'value', 'layers', 'fifo')
+
+    def __init__(self, quantity=0, value=0, fifo=False):
+        self.quantity = quantity or 0
+        self.value = value or 0
+        self.layers = []
+        self.fifo = fifo
+
+    def receive(self, quantity, unit_cost, source=None):
+        self.quantity += quantity
+        self.value += quantity * unit_cost
+        if self.fifo:
+            self.layers.append(LayerState(quantity, unit_cost, source))
+
+    def receive_issued(self, quantity, cost, chunks):
+        """دریافت مقداری که از لات دیگری برداشته شده، با همان بها و تکه‌های لایه"""
+        self.quantity += quantity
+        self.value += cost
+        if self.fifo:
+            self.layers.extend(LayerState(chunk_quantity, unit_cost) for chunk_quantity, unit_cost in chunks)
+
+    def issue(self, quantity):
+        """برداشت از لات؛ خروجی: (بها، تکه‌های [(مقدار، بهای واحد)])"""
+        if not self.fifo:
+            cost = average_issue_cost(self.value, self.quantity, quantity)
+            chunks = [(quantity, cost // quantity if quantity else 0)]
+        else:
+            cost, chunks, remaining = 0, [], quantity
+            for layer in self.layers:
+                if remaining <= 0:
+                    break
+                if layer.remaining <= 0:
+                    continue
+                take = min(layer.remaining, remaining)
+                layer.remaining -= take
+                remaining -= take
+                cost += take * layer.unit_cost
+                chunks.append((take, layer.unit_cost))
+            if remaining > 0:
+                fallback = average_issue_cost(self.value - cost, self.quantity - (quantity - remaining), remaining)
+                chunks.append((remaining, fallback // remaining))
+                cost += fallback
+        self.quantity -= quantity
+        self.value -= cost
+        return cost, chunks
+
+    def open_layers(self):
+        return [layer for layer in self.layers if layer.remaining > 0]
@@ -1,19 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from datetime import datetime, date
+import asyncio
+import hashlib
 import json
 import os
 import tempfile
 
+import numpy as np
+from asgiref.sync import sync_to_async
+
 from .models import (
-    Warehouse, MaterialType, Supplier, Customer, Inventory, 
+    Warehouse, MaterialType, Supplier, Customer, Inventory, InventoryDelta,
     StockIn, StockOut, StockTransfer
 )
 from .excel_utils import (
@@ -22,22 +30,63 @@ from .excel_utils import (
     import_stock_in_excel, import_stock_out_excel,
     import_unified_stock_excel,
     export_inventory_to_excel, create_stock_transfer_template,
-    import_stock_transfer_excel
+    import_stock_transfer_excel, export_monthly_report_to_excel
+)
+from .utils import (
+    JALALI_MONTHS, gregorian_to_persian_str, gregorian_to_persian_datetime_str, filter_date_range,
+    filter_jalali_period, jalali_years,
 )
-from .utils import gregorian_to_persian_str, gregorian_to_persian_datetime_str
+from .batch import BatchValidationError, post_movement_batch
+from .allocation import stock_availability
+from .conditional import ledger_conditional
+from .changefeed import changes_since
+from .live import broadcaster, long_poll_body, sse_event
+from .search import search as search_index
+from .autocomplete import etag as autocomplete_etag, lookup, request_params
+from .caching import AVAILABILITY, DASHBOARD, get_or_compute
+from .pagination import approximate_count, paginate_keyset
+from .reports import REPORT_FIELDS, current_jalali_year, monthly_movements
+from .summaries import counterparty_summary
+from .aging import AGING_BUCKETS, stock_aging
+from .turnover import metric_rows, turnover_metrics
+
+def dashboard_statistics():
+    """
+    آمار کلی داشبورد با یک کوئری
+    جمع موجودی برابر جمع ردیف‌های اصلی به اضافه جمع خانه‌های شمارنده فشرده نشده است.
+    """
+    quote = connection.ops.quote_name
+
+    def table(model):
+        return quote(model._meta.db_table)
+
+    sql = (
+        f"SELECT (SELECT COUNT(*) FROM {table(Warehouse)}),"
+        f" (SELECT COUNT(*) FROM {table(MaterialType)}),"
+        f" (SELECT COUNT(*) FROM {table(Supplier)}),"
+        f" (SELECT COUNT(*) FROM {table(Customer)}),"
+        f" (SELECT COALESCE(SUM({quote('current_quantity')}), 0) FROM {table(Inventory)})"
+        f" + (SELECT COALESCE(SUM({quote('quantity')}), 0) FROM {table(InventoryDelta)}),"
+        f" (SELECT COALESCE(SUM({quote('stock_value')}), 0) FROM {table(Inventory)})"
+        f" + (SELECT COALESCE(SUM({quote('value')}), 0) FROM {table(InventoryDelta)})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        row = cursor.fetchone()
+    names = ['total_warehouses', 'total_materials', 'total_suppliers', 'total_customers',
+             'total_inventory_quantity', 'total_inventory_value']
+    return {name: int(value or 0) for name, value in zip(names, row)}
 
 # صفحه اصلی انبار
 @login_required
+@ledger_conditional
 def dashboard(request):
     """صفحه اصلی انبار"""
-    # آمار کلی
-    total_warehouses = Warehouse.objects.count()
-    total_materials = MaterialType.objects.count()
-    total_suppliers = Supplier.objects.count()
-    total_customers = Customer.objects.count()
-    total_inventory_value = Inventory.objects.aggregate(
-        total=Sum('current_quantity')
-    )['total'] or 0
+    # آمار کلی - از کش؛ با ثبت حرکات و تغییر اطلاعات پایه باطل می‌شود
+    statistics = get_or_compute(
+        DASHBOARD, 'statistics', dashboard_statistics,
+        getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300),
+    )
     
     # آخرین ورودی‌ها
     recent_stock_ins = StockIn.objects.select_related('material_type', 'supplier').order_by('-created_at')[:5]
@@ -46,14 +95,10 @@ def dashboard(request):
     recent_stock_outs = StockOut.objects.select_related('material_type', 'customer').order_by('-created_at')[:5]
     
     # موجودی‌های کم
-    low_stock = Inventory.objects.filter(current_quantity__lt=100).select_related('material_type')[:5]
+    low_stock = Inventory.objects.with_balance().filter(on_hand__lt=100).select_related('material_type')[:5]
     
     context = {
-        'total_warehouses': total_warehouses,
-        'total_materials': total_materials,
-        'total_suppliers': total_suppliers,
-        'total_customers': total_customers,
-        'total_inventory_value': total_inventory_value,
+        **statistics,
         'recent_stock_ins': recent_stock_ins,
         'recent_stock_outs': recent_stock_outs,
         'low_stock': low_stock,
@@ -63,6 +108,7 @@ def dashboard(request):
 
 # مدیریت نام‌های کالا
 @login_required
+@ledger_conditional
 def material_types(request):
     """مدیریت نام‌های کالا"""
     if request.method == 'POST':
@@ -84,6 +130,7 @@ def material_types(request):
 
 # مدیریت هویت‌های کالا
 @login_required
+@ledger_conditional
 def suppliers(request):
     """
     مدیریت هویت‌های کالا (تامین‌کنندگان)
@@ -117,6 +164,7 @@ def suppliers(request):
 
 # مدیریت مشتریان
 @login_required
+@ledger_conditional
 def customers(request):
     """مدیریت مشتریان"""
     if request.method == 'POST':
@@ -140,6 +188,7 @@ def customers(request):
 
 # مدیریت انبارها
 @login_required
+@ledger_conditional
 def warehouses(request):
     """مدیریت انبارها"""
     if request.method == 'POST':
@@ -173,23 +222,22 @@ def warehouses(request):
 
 # موجودی انبار
 @login_required
+@ledger_conditional
 def inventory_list(request):
     """لیست موجودی انبار"""
-    inventories = Inventory.objects.select_related('material_type').all().order_by('material_type__name')
+    inventories = Inventory.objects.with_balance().select_related('material_type').order_by('material_type__name')
     
-    # جستجو
+    # جستجو - نمایه تمام‌متن روی متن نرمال شده (پیشوندی)
     search = request.GET.get('search', '')
     if search:
-        inventories = inventories.filter(
-            Q(material_type__name__icontains=search) |
-            Q(material_type__description__icontains=search)
-        )
+        inventories = search_index(inventories, search)
     
     # صفحه‌بندی
     paginator = Paginator(inventories, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # گردش و روزهای پوشش در گزارش reports/turnover/ است (کارت داشبورد)
     return render(request, 'inventory/inventory_list.html', {
         'page_obj': page_obj,
         'search': search
@@ -197,78 +245,229 @@ def inventory_list(request):
 
 # ورودی انبار
 @login_required
+@ledger_conditional
 def stock_in_list(request):
     """لیست ورودی‌های انبار"""
     stock_ins = StockIn.objects.select_related(
         'material_type', 'supplier', 'created_by'
     ).all().order_by('-created_at')
     
-    # فیلتر بر اساس تاریخ
+    # فیلتر بر اساس تاریخ شمسی - بازه نیم‌باز روی ستون ایندکس شده (تاریخ دستی یا تاریخ ثبت)
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
+    date_basis = request.GET.get('date_basis', 'business')
+    stock_ins = filter_date_range(stock_ins, start_date, end_date, date_basis)
     
-    if start_date:
-        stock_ins = stock_ins.filter(created_at__date__gte=start_date)
-    if end_date:
-        stock_ins = stock_ins.filter(created_at__date__lte=end_date)
+    # سال/ماه شمسی - ستون‌های ایندکس شده jalali_year و jalali_month
+    jalali_year = request.GET.get('jalali_year', '')
+    jalali_month = request.GET.get('jalali_month', '')
+    stock_ins = filter_jalali_period(stock_ins, jalali_year, jalali_month)
     
-    # جستجو
+    # جستجو - نمایه تمام‌متن روی متن نرمال شده (پیشوندی)
     search = request.GET.get('search', '')
     if search:
-        stock_ins = stock_ins.filter(
-            Q(material_type__name__icontains=search) |
-            Q(supplier__name__icontains=search) |
-            Q(invoice_number__icontains=search)
-        )
+        stock_ins = search_index(stock_ins, search)
     
-    # صفحه‌بندی
-    paginator = Paginator(stock_ins, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # صفحه‌بندی کلیدی - هزینه هر صفحه مستقل از عمق آن است
+    page_obj = paginate_keyset(stock_ins, request.GET.get('cursor'), 20)
+    page_obj.approximate_count = approximate_count(stock_ins)
     
     return render(request, 'inventory/stock_in_list.html', {
         'page_obj': page_obj,
         'search': search,
         'start_date': start_date,
-        'end_date': end_date
+        'end_date': end_date,
+        'date_basis': date_basis,
+        'jalali_year': jalali_year,
+        'jalali_month': jalali_month,
+        'jalali_years': jalali_years(StockIn.objects.all()),
+        'jalali_months': JALALI_MONTHS,
     })
 
 # خروجی انبار
 @login_required
+@ledger_conditional
 def stock_out_list(request):
     """لیست خروجی‌های انبار"""
     stock_outs = StockOut.objects.select_related(
         'material_type', 'customer', 'created_by'
     ).all().order_by('-created_at')
     
-    # فیلتر بر اساس تاریخ
+    # فیلتر بر اساس تاریخ شمسی - بازه نیم‌باز روی ستون ایندکس شده (تاریخ دستی یا تاریخ ثبت)
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
+    date_basis = request.GET.get('date_basis', 'business')
+    stock_outs = filter_date_range(stock_outs, start_date, end_date, date_basis)
     
-    if start_date:
-        stock_outs = stock_outs.filter(created_at__date__gte=start_date)
-    if end_date:
-        stock_outs = stock_outs.filter(created_at__date__lte=end_date)
+    # سال/ماه شمسی - ستون‌های ایندکس شده jalali_year و jalali_month
+    jalali_year = request.GET.get('jalali_year', '')
+    jalali_month = request.GET.get('jalali_month', '')
+    stock_outs = filter_jalali_period(stock_outs, jalali_year, jalali_month)
     
-    # جستجو
+    # جستجو - نمایه تمام‌متن روی متن نرمال شده (پیشوندی)
     search = request.GET.get('search', '')
     if search:
-        stock_outs = stock_outs.filter(
-            Q(material_type__name__icontains=search) |
-            Q(customer__name__icontains=search) |
-            Q(invoice_number__icontains=search)
-        )
+        stock_outs = search_index(stock_outs, search)
     
-    # صفحه‌بندی
-    paginator = Paginator(stock_outs, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # صفحه‌بندی کلیدی - هزینه هر صفحه مستقل از عمق آن است
+    page_obj = paginate_keyset(stock_outs, request.GET.get('cursor'), 20)
+    page_obj.approximate_count = approximate_count(stock_outs)
     
     return render(request, 'inventory/stock_out_list.html', {
         'page_obj': page_obj,
         'search': search,
         'start_date': start_date,
-        'end_date': end_date
+        'end_date': end_date,
+        'date_basis': date_basis,
+        'jalali_year': jalali_year,
+        'jalali_month': jalali_month,
+        'jalali_years': jalali_years(StockOut.objects.all()),
+        'jalali_months': JALALI_MONTHS,
+    })
+
+def monthly_report_params(request):
+    """سال شمسی و انبار گزارش ماهانه از پارامترهای آدرس؛ مقدار نامعتبر نادیده گرفته می‌شود"""
+    try:
+        year = int(request.GET.get('year') or current_jalali_year())
+    except ValueError:
+        year = current_jalali_year()
+    warehouse_id = request.GET.get('warehouse', '')
+    return year, int(warehouse_id) if warehouse_id.isdigit() else None
+
+# گزارش ماهانه شمسی
+@login_required
+@ledger_conditional
+def monthly_report(request):
+    """گزارش ماهانه ورودی و خروجی هر کالا در یک سال شمسی"""
+    year, warehouse_id = monthly_report_params(request)
+    report = monthly_movements(year, warehouse_id)
+    
+    # صفحه فقط یک مقدار از چهار مقدار هر ماه را نشان می‌دهد؛ فایل Excel همه را دارد
+    field = request.GET.get('field', 'quantity_out')
+    if field not in REPORT_FIELDS:
+        field = 'quantity_out'
+    values = report['matrix'][:, :, REPORT_FIELDS.index(field)]
+    
+    # جمع‌ها روی کل سال؛ ردیف‌ها صفحه به صفحه (رندر ده‌ها هزار خانه جدول در قالب کند است)
+    page_obj = Paginator(range(len(report['rows'])), 200).get_page(request.GET.get('page'))
+    page = slice(page_obj.object_list.start, page_obj.object_list.stop)
+    rows = [
+        {**row, 'cells': cells, 'year_total': total}
+        for row, cells, total in zip(report['rows'][page], values[page].tolist(), values[page].sum(axis=1).tolist())
+    ]
+    
+    return render(request, 'inventory/monthly_report.html', {
+        'report': report,
+        'page_obj': page_obj,
+        'rows': rows,
+        'totals': values.sum(axis=0).tolist(),
+        'year_total': int(values.sum()),
+        'field': field,
+        'year': year,
+        'warehouse_id': warehouse_id,
+        'warehouses': Warehouse.objects.filter(is_active=True).order_by('name'),
+    })
+
+@login_required
+def download_monthly_report(request):
+    """دانلود گزارش ماهانه شمسی"""
+    try:
+        year, warehouse_id = monthly_report_params(request)
+        file_path = export_monthly_report_to_excel(monthly_movements(year, warehouse_id))
+        with open(file_path, 'rb') as f:
+            response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
+            return response
+    except Exception as e:
+        messages.error(request, f'خطا در ایجاد گزارش: {str(e)}')
+        return redirect('inventory:monthly_report')
+
+def counterparty_summary_page(request, kind, title, counterparty_label):
+    """صفحه خلاصه خرید یا فروش یک سال یا ماه شمسی"""
+    year, _ = monthly_report_params(request)
+    month = request.GET.get('month', '')
+    month = int(month) if month.isdigit() and 1 <= int(month) <= 12 else None
+    summary = counterparty_summary(kind, year, month)
+    
+    return render(request, 'inventory/counterparty_summary.html', {
+        'title': title,
+        'counterparty_label': counterparty_label,
+        'summary': summary,
+        'total_quantity': sum(row['quantity'] for row in summary),
+        'total_amount': sum(row['amount'] for row in summary),
+        'year': year,
+        'month': month,
+        'jalali_months': JALALI_MONTHS,
+    })
+
+# خلاصه خرید از هویت‌های کالا و فروش به مشتریان
+@login_required
+@ledger_conditional
+def purchase_summary(request):
+    """خلاصه خرید به ازای هویت کالا (Supplier)"""
+    return counterparty_summary_page(request, 'purchases', 'خلاصه خرید از هویت‌های کالا', 'هویت کالا')
+
+@login_required
+@ledger_conditional
+def sales_summary(request):
+    """خلاصه فروش به ازای مشتری"""
+    return counterparty_summary_page(request, 'sales', 'خلاصه فروش به مشتریان', 'مشتری')
+
+# سن موجودی لات‌ها
+@login_required
+@ledger_conditional
+def aging_report(request):
+    """موجودی هر لات به تفکیک سن ورود"""
+    warehouse_id = request.GET.get('warehouse', '')
+    warehouse_id = int(warehouse_id) if warehouse_id.isdigit() else None
+    material_type_id = request.GET.get('material_type', '')
+    material_type_id = int(material_type_id) if material_type_id.isdigit() else None
+    lots = stock_aging(warehouse_id=warehouse_id, material_type_id=material_type_id)
+    
+    return render(request, 'inventory/aging_report.html', {
+        'lots': lots,
+        'buckets': [label for _, label in AGING_BUCKETS],
+        'bucket_totals': [sum(lot['buckets'][i] for lot in lots) for i in range(len(AGING_BUCKETS))],
+        'unknown_total': sum(lot['unknown'] for lot in lots),
+        'on_hand_total': sum(lot['on_hand'] for lot in lots),
+        'warehouse_id': warehouse_id,
+        'warehouses': Warehouse.objects.filter(is_active=True).order_by('name'),
+    })
+
+def turnover_window(request):
+    """بازه گزارش گردش از پارامتر window؛ فقط بازه‌های TURNOVER_WINDOWS پذیرفته می‌شوند"""
+    window = request.GET.get('window', '')
+    if window.isdigit() and int(window) in settings.TURNOVER_WINDOWS:
+        return int(window)
+    return settings.TURNOVER_DEFAULT_WINDOW
+
+# گردش موجودی و روزهای پوشش
+@login_required
+@ledger_conditional
+def turnover_report(request):
+    """گردش موجودی و روزهای پوشش همه (انبار، کالا)ها، کمترین پوشش اول"""
+    window = turnover_window(request)
+    warehouse_id = request.GET.get('warehouse', '')
+    warehouse_id = int(warehouse_id) if warehouse_id.isdigit() else None
+    metrics = turnover_metrics(window, warehouse_id=warehouse_id)
+    
+    # ترتیب روزهای پوشش؛ فقط شاخص‌ها و نام‌های ردیف‌های صفحه جاری ساخته و خوانده می‌شوند
+    order = np.argsort(metrics['days_of_cover'], kind='stable')
+    page_obj = Paginator(order, 100).get_page(request.GET.get('page'))
+    rows = metric_rows(metrics, page_obj.object_list)
+    warehouses = dict(Warehouse.objects.filter(pk__in={row['warehouse_id'] for row in rows}).values_list('pk', 'name'))
+    materials = MaterialType.objects.in_bulk({row['material_type_id'] for row in rows})
+    for row in rows:
+        row['warehouse'] = warehouses.get(row['warehouse_id'], '')
+        row['material'] = materials.get(row['material_type_id'])
+    
+    return render(request, 'inventory/turnover_report.html', {
+        'page_obj': page_obj,
+        'rows': rows,
+        'window': window,
+        'turnover_windows': settings.TURNOVER_WINDOWS,
+        'warehouse_id': warehouse_id,
+        'warehouses': Warehouse.objects.filter(is_active=True).order_by('name'),
     })
 
 # Excel Upload Views
@@ -492,38 +691,157 @@ def upload_stock_transfer_excel(request):
     return redirect('inventory:excel_upload')
 
 # API Views for AJAX
+def autocomplete_response(request, source):
+    """
+    پاسخ تکمیل خودکار: ?q=پیشوند&limit=20&cursor=توکن
+    خروجی: {source: [...], 'next': توکن صفحه بعد یا null}
+    """
+    prefix, limit, cursor = request_params(request)
+    rows, next_token = lookup(source, prefix, limit, cursor)
+    response = JsonResponse({source: rows, 'next': next_token})
+    # پس از max-age مرورگر/پراکسی با If-None-Match اعتبارسنجی می‌کند (ETag از نسخه جدول)
+    patch_cache_control(response, max_age=settings.AUTOCOMPLETE_MAX_AGE)
+    return response
+
 @login_required
+@condition(etag_func=lambda request: autocomplete_etag('materials', request))
 def get_material_types(request):
-    """دریافت لیست نام‌های کالا برای AJAX"""
-    materials = MaterialType.objects.all().values('id', 'name')
-    return JsonResponse({'materials': list(materials)})
+    """تکمیل خودکار نام‌های کالا برای AJAX"""
+    return autocomplete_response(request, 'materials')
 
 @login_required
+@condition(etag_func=lambda request: autocomplete_etag('suppliers', request))
 def get_suppliers(request):
-    """دریافت لیست هویت‌های کالا برای AJAX"""
-    suppliers = Supplier.objects.all().values('id', 'name')
-    return JsonResponse({'suppliers': list(suppliers)})
+    """تکمیل خودکار هویت‌های کالا برای AJAX"""
+    return autocomplete_response(request, 'suppliers')
 
 @login_required
+@condition(etag_func=lambda request: autocomplete_etag('customers', request))
 def get_customers(request):
-    """دریافت لیست مشتریان برای AJAX"""
-    customers = Customer.objects.all().values('id', 'name')
-    return JsonResponse({'customers': list(customers)})
+    """تکمیل خودکار مشتریان برای AJAX"""
+    return autocomplete_response(request, 'customers')
 
 @login_required
+@condition(etag_func=lambda request: autocomplete_etag('warehouses', request))
 def get_warehouses(request):
-    """دریافت لیست انبارها برای AJAX"""
-    warehouses = Warehouse.objects.filter(is_active=True).values('id', 'name', 'code')
-    return JsonResponse({'warehouses': list(warehouses)})
+    """تکمیل خودکار انبارهای فعال برای AJAX"""
+    return autocomplete_response(request, 'warehouses')
 
 @login_required
+@ledger_conditional
 def get_inventory_quantity(request, material_id):
-    """دریافت موجودی کالا"""
+    """دریافت موجودی کالا (جمع همه انبارها و لات‌ها، یا یک انبار با ?warehouse=)"""
+    warehouse_id = request.GET.get('warehouse')
+    availability = stock_availability([material_id], warehouse_id if (warehouse_id or '').isdigit() else None)
+    return JsonResponse({'quantity': availability[material_id]['total']})
+
+def parse_id_list(value):
+    """شناسه‌های عددی جدا شده با ویرگول؛ مقادیر نامعتبر نادیده گرفته می‌شوند"""
+    return sorted({int(part) for part in (value or '').split(',') if part.strip().isdigit()})
+
+@login_required
+@ledger_conditional
+def get_stock_availability(request):
+    """
+    موجودی دسته‌ای کالاها برای فرم ثبت سفارش
+    ?materials=1,2,3&warehouse=ID&supplier=ID
+    خروجی: {'success': True, 'materials': {id: {'total', 'warehouses': [...], 'suppliers': [...]}}}
+    """
+    material_ids = parse_id_list(request.GET.get('materials'))
+    if not material_ids:
+        return JsonResponse({'success': False, 'message': 'شناسه کالا ارسال نشده است'}, status=400)
+    if len(material_ids) > settings.AVAILABILITY_MAX_MATERIALS:
+        return JsonResponse({
+            'success': False,
+            'message': f'حداکثر {settings.AVAILABILITY_MAX_MATERIALS} کالا در هر درخواست مجاز است'
+        }, status=400)
+    
+    warehouse_id = parse_id_list(request.GET.get('warehouse'))[:1]
+    supplier_id = parse_id_list(request.GET.get('supplier'))[:1]
+    warehouse_id = warehouse_id[0] if warehouse_id else None
+    supplier_id = supplier_id[0] if supplier_id else None
+    
+    # کلید کوتاه و یکتا برای هر ترکیب (کلید Memcached حداکثر ۲۵۰ نویسه است)
+    name = hashlib.sha1(f"{warehouse_id}:{supplier_id}:{material_ids}".encode()).hexdigest()
+    availability = get_or_compute(
+        AVAILABILITY, name,
+        lambda: stock_availability(material_ids, warehouse_id, supplier_id),
+        settings.AVAILABILITY_CACHE_TIMEOUT,
+    )
+    return JsonResponse({'success': True, 'materials': availability})
+
+@login_required
+@require_http_methods(["POST"])
+def post_movements_batch(request):
+    """
+    ثبت دسته‌ای حرکات انبار (ورودی، خروجی، انتقال) برای نرم‌افزار باسکول
+    بدنه: {"movements": [{"type": "in|out|transfer", ...}, ...]}
+    همه حرکات در یک تراکنش ثبت می‌شوند یا در صورت هر خطا هیچ‌کدام.
+    ورود با نشست است، پس کلاینت باید توکن CSRF (کوکی csrftoken) را در سرآیند X-CSRFToken بفرستد.
+    """
     try:
-        inventory = Inventory.objects.get(material_type_id=material_id)
-        return JsonResponse({'quantity': inventory.current_quantity or 0})
-    except Inventory.DoesNotExist:
-        return JsonResponse({'quantity': 0})
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'message': 'JSON نامعتبر'}, status=400)
+    
+    movements = payload.get('movements') if isinstance(payload, dict) else payload
+    try:
+        results = post_movement_batch(movements, request.user)
+    except BatchValidationError as e:
+        return JsonResponse({'success': False, 'errors': e.errors}, status=400)
+    
+    return JsonResponse({'success': True, 'results': results})
+
+@login_required
+def get_changes(request):
+    """
+    خوراک تغییرات برای همگام‌سازی پایانه‌ها: ?cursor=توکن&limit=200
+    بدون توکن (یا توکن منقضی) reset برابر True است: فهرست‌ها کامل گرفته شوند و از cursor ادامه یابد.
+    تا has_more برابر True است صفحه بعد بلافاصله درخواست شود.
+    """
+    try:
+        limit = int(request.GET.get('limit', settings.CHANGE_FEED_PAGE_SIZE))
+    except ValueError:
+        limit = settings.CHANGE_FEED_PAGE_SIZE
+    limit = min(max(limit, 1), settings.CHANGE_FEED_MAX_PAGE_SIZE)
+    return JsonResponse({'success': True, **changes_since(request.GET.get('cursor'), limit)})
+
+@login_required
+async def inventory_stream(request, warehouse_id=None):
+    """
+    پخش زنده تغییرات موجودی لات‌ها با Server-Sent Events (رویداد balance)
+    زیر ASGI اتصال باز می‌ماند و از پخش‌کننده مشترک پردازش تغذیه می‌شود. زیر WSGI پاسخ
+    جریانی worker را نگه می‌دارد و بافر می‌شود، پس فقط تغییرات بعد از Last-Event-ID با
+    یک دور خواندن برگردانده و پاسخ بسته می‌شود؛ EventSource پس از retry دوباره وصل می‌شود.
+    """
+    if not isinstance(request, ASGIRequest):
+        body = await sync_to_async(long_poll_body)(request.headers.get('Last-Event-ID'), warehouse_id)
+        response = HttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    heartbeat = settings.LIVE_HEARTBEAT_INTERVAL
+    
+    async def stream():
+        hub = broadcaster()
+        queue = hub.subscribe(warehouse_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield sse_event('balance', json.dumps(change), change['inventory'])
+        finally:
+            hub.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx نباید پاسخ را بافر کند
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Test Views for Warehouse Operations
 @login_required
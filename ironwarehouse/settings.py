@@ -132,6 +132,65 @@ ADMIN_SITE_HEADER = "سیستم انبارداری آهن"
 ADMIN_SITE_TITLE = "پنل مدیریت انبار"
 ADMIN_INDEX_TITLE = "خوش آمدید به سیستم انبارداری"
 
+# منطقه زمانی تاریخ‌های کاری (تبدیل بازه تاریخ شمسی به بازه زمانی)
+BUSINESS_TIME_ZONE = 'Asia/Tehran'
+
+# کش - در اجرا با چند پردازش از کش مشترک (Redis یا Memcached) استفاده کنید
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# مدت اعتبار آمار داشبورد در کش (ثانیه)؛ ثبت حرکات آن را زودتر باطل می‌کند
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# مدت نگهداری پاسخ‌های تکمیل خودکار در مرورگر/پراکسی پیش از اعتبارسنجی دوباره با ETag (ثانیه)
+AUTOCOMPLETE_MAX_AGE = 60
+
+# مدت اعتبار پاسخ موجودی دسته‌ای کالاها در کش (ثانیه)؛ ثبت حرکات آن را زودتر باطل می‌کند
+AVAILABILITY_CACHE_TIMEOUT = 10
+
+# مدت اعتبار خلاصه خرید و فروش هر ماه شمسی در کش (ثانیه)؛ ثبت حرکات همان ماه آن را زودتر باطل می‌کند
+SUMMARY_CACHE_TIMEOUT = 86400
+
+# بازه‌های قابل انتخاب گزارش گردش موجودی و روزهای پوشش (روز) و بازه پیش‌فرض
+TURNOVER_WINDOWS = (30, 90, 180, 365)
+TURNOVER_DEFAULT_WINDOW = 90
+
+# حداکثر تعداد کالا در هر درخواست موجودی دسته‌ای
+AVAILABILITY_MAX_MATERIALS = 200
+
+# خوراک تغییرات پایانه‌ها: اندازه پیش‌فرض و حداکثر صفحه، و مدت باز ماندن شکاف شماره‌های
+# commit نشده در توکن (ثانیه؛ بیشتر از طولانی‌ترین تراکنش)
+CHANGE_FEED_PAGE_SIZE = 200
+CHANGE_FEED_MAX_PAGE_SIZE = 1000
+CHANGE_FEED_GAP_SECONDS = 300
+
+# پخش زنده موجودی (SSE): فاصله خواندن تغییرات در هر پردازش (و فاصله اتصال دوباره زیر WSGI)،
+# فاصله پیام نگه‌داشتن اتصال بر حسب ثانیه و حداکثر رویداد در صف هر نمایشگر
+LIVE_POLL_INTERVAL = 2
+LIVE_HEARTBEAT_INTERVAL = 15
+LIVE_QUEUE_SIZE = 500
+
+# روش ارزش‌گذاری موجودی: 'average' (میانگین موزون متحرک) یا 'fifo' (لایه‌های بهای FIFO)
+INVENTORY_VALUATION_METHOD = 'average'
+
+# تعداد خانه‌های شمارنده هر ردیف موجودی پرتردد (is_hot)
+INVENTORY_COUNTER_STRIPES = 8
+
+# تعداد خانه‌های هر کلید جمع روزانه حرکات تا ثبت‌های هم‌زمان یک روز روی یک ردیف صف نکشند
+MOVEMENT_ROLLUP_STRIPES = 8
+
+# تعداد تلاش خروجی‌های خوش‌بینانه (ورود Excel) در تداخل با ثبت هم‌زمان
+INVENTORY_OPTIMISTIC_RETRIES = 5
+
+# حداکثر تعداد حرکت در هر درخواست ثبت دسته‌ای
+MOVEMENT_BATCH_MAX_SIZE = 5000
+
+# صفحه‌بندی ادمین: در جدول‌های بزرگ‌تر از این تعداد ردیف به جای COUNT(*) تعداد تخمینی نمایش داده می‌شود
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
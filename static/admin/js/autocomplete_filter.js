@@ -0,0 +1,13 @@
+/* Autocomplete list filters: go to the changelist filtered by the chosen option */
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(document).on('change', 'select.autocomplete-list-filter', function() {
+        const params = new URLSearchParams(this.dataset.queryString);
+        if (this.value) {
+            params.set(this.dataset.lookup, this.value);
+        }
+        window.location.search = params.toString();
+    });
+}